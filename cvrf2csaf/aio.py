@@ -0,0 +1,218 @@
+"""
+Module containing the asyncio conversion pipeline (--async-pipeline) and the async API of the
+converter. The pipeline overlaps the I/O of the documents with their conversion: the inputs are
+read and the outputs are written in threads while a pool of worker processes converts
+the documents, the three stages are connected by bounded queues.
+"""
+import asyncio
+import functools
+import logging
+import os
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .batch import (OutputCollision, claim_output, convert_data, init_worker, iter_inputs,
+                    log_summary, ndjson_record, open_ndjson_output)
+from .common.utils import CriticalExit, critical_exit, write_json
+from .document_handler import DocumentHandler
+from .document_handler import convert_and_validate as _convert_and_validate
+
+# Marks the end of the documents in the queues
+_DONE = object()
+
+
+class ConversionError(Exception):
+    """
+    Raised by the coroutines instead of CriticalExit, which is SystemExit stopping the event loop.
+    The message was already logged by critical_exit().
+    """
+
+    def __init__(self, msg):
+        super().__init__(msg)
+        self.msg = msg
+
+
+async def _run_in_executor(executor, function, *args):
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+    except CriticalExit as e:
+        raise ConversionError(e.msg) from None
+
+
+def _convert_file(config, pkg_version, path) -> dict:
+    return DocumentHandler(config, pkg_version).convert_file(path)
+
+
+async def convert_file(config, pkg_version, path, executor=None) -> dict:
+    """
+    Converts the CVRF document like DocumentHandler(config, pkg_version).convert_file(path)
+    without blocking the event loop. The document is converted by the executor, e.g.
+    a ProcessPoolExecutor converting documents on all cores, by the default thread pool
+    of the loop if None. Raises ConversionError if the document can't be converted.
+    return: CSAF document
+    """
+    return await _run_in_executor(executor, _convert_file, config, pkg_version, path)
+
+
+async def convert_and_validate(config, pkg_version, input_file, executor=None) -> tuple:
+    """
+    Converts and validates the CVRF document like document_handler.convert_and_validate()
+    without blocking the event loop, see convert_file(). input_file can be a file object
+    only with a thread pool executor.
+    return: tuple (CSAF document, True if valid)
+    """
+    return await _run_in_executor(executor, _convert_and_validate, config, pkg_version,
+                                  input_file)
+
+
+def _limits(config) -> tuple:
+    """ Returns tuple (number of worker processes, maximum number of documents in flight). """
+    jobs = config.get('jobs') or os.cpu_count() or 1
+    return jobs, config.get('max_in_flight') or 2 * jobs
+
+
+def _read_next(inputs):
+    """ Returns next tuple (name, bytes) of the inputs with the file read, _DONE at the end. """
+    member = next(inputs, _DONE)
+    if member is _DONE or member[1] is not None:
+        return member
+    try:
+        with open(member[0], 'rb') as f:
+            return member[0], f.read()
+    except OSError:
+        # the worker reports the error of the file
+        return member
+
+
+def _write_result(result, out, config, outputs):
+    """
+    Writes the output of the converted document returned by the worker, in a thread.
+    outputs are the output files written in the run, the results are written in the order
+    of the inputs, so the later one of the documents with the same output file fails.
+    """
+    if out is not None:
+        out.write(result.pop('record') + b'\n')
+        if result['error'] is None:
+            result['output_file'] = config['output_ndjson']
+        return
+
+    output = result.pop('output', None)
+    if output is not None:
+        try:
+            claim_output(result['input_file'], result['output_file'], outputs)
+            write_json(output, result['output_file'], config.get('output_compression', 'none'))
+        except CriticalExit as e:
+            result['error'] = e.msg
+            result['collision'] = isinstance(e, OutputCollision)
+
+
+async def _read(inputs, read_queue, in_flight):
+    while True:
+        # released when the document is written
+        await in_flight.acquire()
+        member = await _run_in_executor(None, _read_next, inputs)
+        await read_queue.put(member)
+        if member is _DONE:
+            return
+
+
+async def _convert_member(executor, member, config) -> dict:
+    """
+    Returns the result of the document converted by the worker. If a worker process terminated
+    abruptly, e.g. killed for lack of memory, the document fails and so do the rest of them,
+    the pool can't convert any more, but the run goes on to report them all.
+    """
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, functools.partial(convert_data, write=False), member)
+    except BrokenProcessPool as e:
+        logging.error('Worker process terminated abruptly when converting %s: %s', member[0], e)
+        result = {'input_file': member[0], 'output_file': None, 'valid': False,
+                  'error': 'Worker failed.', 'collision': False, 'profile': None, 'record': None}
+        if config.get('output_ndjson'):
+            result['record'] = ndjson_record(result, None)
+        return result
+
+
+async def _convert(read_queue, write_queue, executor, config):
+    while True:
+        member = await read_queue.get()
+        if member is _DONE:
+            await write_queue.put(_DONE)
+            return
+        # queued right away, so the results are written in the order of the inputs
+        await write_queue.put(asyncio.create_task(_convert_member(executor, member, config)))
+
+
+async def _write(write_queue, in_flight, out, config) -> list:
+    loop = asyncio.get_running_loop()
+    results = []
+    outputs = {}
+    while True:
+        converted = await write_queue.get()
+        if converted is _DONE:
+            return results
+        result = await converted
+        await loop.run_in_executor(None, _write_result, result, out, config, outputs)
+        results.append(result)
+        in_flight.release()
+
+
+async def pipeline(config, pkg_version, inputs=None) -> list:
+    """
+    Converts the documents of inputs, iterable of tuples (name, bytes or None if the document is
+    to be read from the file name), by default the batch mode inputs of config. The documents are
+    read, converted by config jobs worker processes and written into the output dir or as NDJSON
+    records (config output_ndjson) in the order of the inputs. At most config max_in_flight
+    documents (default is two per worker) are between being read and written, reading waits
+    for the slower stages instead of filling the memory.
+    Raises ConversionError if the inputs can't be read, e.g. a broken archive.
+    return: list of the results of the documents, dicts with the input file, output file,
+            validity and the critical error if the document failed
+    """
+    jobs, max_in_flight = _limits(config)
+    inputs = iter(iter_inputs(config) if inputs is None else inputs)
+    read_queue = asyncio.Queue(maxsize=max_in_flight)
+    write_queue = asyncio.Queue(maxsize=max_in_flight)
+    in_flight = asyncio.Semaphore(max_in_flight)
+
+    out = open_ndjson_output(config)
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                 initargs=(config, pkg_version)) as executor:
+            _, _, results = await asyncio.gather(
+                _read(inputs, read_queue, in_flight),
+                _convert(read_queue, write_queue, executor, config),
+                _write(write_queue, in_flight, out, config))
+    finally:
+        if out is sys.stdout.buffer:
+            out.flush()
+        elif out is not None:
+            out.close()
+
+    return results
+
+
+def run_pipeline(config, pkg_version) -> int:
+    """
+    Converts the batch mode inputs by the asyncio pipeline (--async-pipeline), see pipeline().
+    A failing document does not stop the run, it is reported in the final summary.
+    return: exit status, 0 if all the documents were converted, 1 otherwise
+    """
+    for key in ('print', 'streaming', 'profile', 'cache_dir'):
+        if config.get(key):
+            logging.warning('--%s is not supported with --async-pipeline, ignoring it.',
+                            key.replace('_', '-'))
+    logging.info('Converting documents using %s job(s), at most %s documents in flight.',
+                 *_limits(config))
+
+    try:
+        results = asyncio.run(pipeline(config, pkg_version))
+    except ConversionError as e:
+        raise CriticalExit(e.msg) from None
+    if not results:
+        critical_exit('No input files found for batch conversion.')
+    log_summary(results)
+    return 0 if all(result['error'] is None for result in results) else 1
@@ -0,0 +1,434 @@
+"""
+Module containing the batch mode, converting many CVRF documents in worker processes.
+The documents are read from files or from tar/zip archives, the results are written into
+the output dir or as NDJSON into a single file or stdout.
+"""
+import collections
+import functools
+import glob
+import io
+import itertools
+import logging
+import os
+import sys
+import tarfile
+import zipfile
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager
+
+from .common.cache import get_cache
+from .common.profiling import Profile, store_profile_reports
+from .common.serialization import dumps
+from .common.utils import INPUT_SUFFIXES, CriticalExit, critical_exit, open_input, open_output, \
+    store_json
+from .document_handler import VALIDATION_LEVELS, check_output_validity, convert_and_store, \
+    convert_and_validate, output_file_path, warm_up_checks
+
+# Set in each worker process by init_worker, so config is sent to the worker only once
+# pylint: disable=invalid-name
+_worker_config = None
+_worker_pkg_version = None
+# Output files of the run by path, shared by the workers, see claim_output
+_worker_outputs = None
+_worker_claims = itertools.count()
+
+
+def collect_input_files(config) -> list:
+    """ Returns list of input files given by --input-dir, --input-glob or --input-list. """
+    if config.get('input_dir'):
+        input_dir = config['input_dir']
+        if not os.path.isdir(input_dir):
+            critical_exit(f'Input directory not found, check the path: {input_dir}')
+        # the suffixes in any letter case, e.g. *.XML, like the members of the archives
+        try:
+            with os.scandir(input_dir) as entries:
+                files = sorted(entry.path for entry in entries
+                               if entry.name.lower().endswith(INPUT_SUFFIXES)
+                               and not entry.name.startswith('.') and entry.is_file())
+        except OSError as e:
+            critical_exit(f'Failed to read input directory {input_dir}: {e}.')
+    elif config.get('input_glob'):
+        files = sorted(path for path in glob.glob(config['input_glob'], recursive=True)
+                       if os.path.isfile(path))
+    else:
+        input_list = config['input_list']
+        try:
+            if input_list == '-':
+                lines = sys.stdin.read().splitlines()
+            else:
+                with open(input_list, encoding='utf-8') as f:
+                    lines = f.read().splitlines()
+        except OSError as e:
+            critical_exit(f'Failed to read input list {input_list}: {e}.')
+        # missing files from the list are reported as failed in the summary
+        files = [line.strip() for line in lines if line.strip()]
+
+    if not files:
+        critical_exit('No input files found for batch conversion.')
+
+    return files
+
+
+class OutputCollision(CriticalExit):
+    """ Raised if the output file of a document was already written by another one in the run. """
+
+
+def init_worker(config, pkg_version, outputs=None):
+    """
+    Initializes a worker process converting the documents with config, outputs are the output
+    files of the run shared by the workers, see claim_output().
+    """
+    # pylint: disable=global-statement
+    global _worker_config, _worker_pkg_version, _worker_outputs
+    _worker_config = config
+    _worker_pkg_version = pkg_version
+    _worker_outputs = outputs
+    # compile the schemata and load the mandatory tests before the first document arrives
+    warm_up_checks(VALIDATION_LEVELS[config.get('validate', 'full')])
+
+
+def claim_output(input_file, file_path, outputs=None):
+    """
+    Reserves the output file for the input file in outputs, the output files of the run
+    (by default the ones shared by the workers). Documents with the same tracking ID (and
+    validity) would overwrite each other's output. Each conversion claims the output on its own,
+    so the same input file listed twice is a collision as well.
+    Raises OutputCollision if the file was reserved by another conversion of the run before.
+    """
+    outputs = _worker_outputs if outputs is None else outputs
+    if outputs is None:
+        return
+    claim = (input_file, os.getpid(), next(_worker_claims))
+    # setdefault is atomic also on the dict shared by the manager process
+    owner = outputs.setdefault(os.path.abspath(file_path), claim)
+    if owner != claim:
+        msg = f'Output {file_path} was already written for {owner[0]}, not overwriting it.'
+        logging.error(msg)
+        raise OutputCollision(msg)
+
+
+def _convert_one(input_file) -> dict:
+    """
+    Converts a single document inside a worker. Critical errors are reported in the result
+    instead of terminating the worker.
+    """
+    result = {'input_file': input_file, 'output_file': None, 'valid': False, 'error': None,
+              'collision': False, 'profile': None}
+    profile = Profile() if _worker_config.get('profile') else None
+    try:
+        if not os.path.isfile(input_file):
+            critical_exit(f'Input file not found, check the path: {input_file}')
+        _, result['output_file'], result['valid'], _ = convert_and_store(
+            _worker_config, _worker_pkg_version, input_file, profile=profile,
+            claim_output=functools.partial(claim_output, input_file))
+    except CriticalExit as e:
+        result['error'] = e.msg
+        result['collision'] = isinstance(e, OutputCollision)
+    # pylint: disable=broad-except
+    except Exception as e:
+        logging.exception('Unexpected error when converting %s.', input_file)
+        result['error'] = f'Unexpected error: {e}'
+
+    if profile is not None:
+        result['profile'] = profile.report()
+    return result
+
+
+def log_summary(results):
+    """ Logs the result of each document of the run and the number of failed ones. """
+    failed = [result for result in results if result['error'] is not None]
+    invalid = [result for result in results if result['error'] is None and not result['valid']]
+
+    for result in results:
+        if result['error'] is not None:
+            logging.error('FAILED   %s: %s', result['input_file'], result['error'])
+        elif not result['valid']:
+            logging.warning('INVALID  %s -> %s', result['input_file'], result['output_file'])
+        else:
+            logging.info('OK       %s -> %s', result['input_file'], result['output_file'])
+
+    logging.info('Batch conversion finished: %s documents, %s converted, %s of them invalid'
+                 ' (--force), %s failed.', len(results), len(results) - len(failed),
+                 len(invalid), len(failed))
+    collisions = sum(1 for result in results if result.get('collision'))
+    if collisions:
+        logging.error('%s documents were not written, their output file was already written'
+                      ' for another document with the same tracking ID.', collisions)
+
+
+def run_batch(config, pkg_version, input_files) -> int:
+    """
+    Converts all input files, using a pool of worker processes if more jobs are requested.
+    A failing document does not stop the batch, it is reported in the final summary.
+    return: exit status, 0 if all the documents were converted, 1 otherwise
+    """
+    jobs = min(config.get('jobs') or os.cpu_count() or 1, len(input_files))
+    logging.info('Converting %s documents using %s job(s).', len(input_files), jobs)
+
+    if config.get('print', False):
+        logging.warning('--print is not supported in batch mode, ignoring it.')
+
+    if jobs == 1:
+        init_worker(config, pkg_version, {})
+        results = [_convert_one(input_file) for input_file in input_files]
+    else:
+        with Manager() as manager, \
+                ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                    initargs=(config, pkg_version, manager.dict())) as executor:
+            results = list(executor.map(_convert_one, input_files))
+
+    log_summary(results)
+    cache = get_cache(config)
+    if cache is not None:
+        cache.evict()
+    if config.get('profile'):
+        store_profile_reports([result['profile'] for result in results if result['profile']],
+                              config['profile'])
+
+    return 0 if all(result['error'] is None for result in results) else 1
+
+
+# Magic bytes of zip archives, a local file header or the end of an empty archive
+_ZIP_MAGIC = (b'PK\x03\x04', b'PK\x05\x06')
+# Enough to recognize the type of the input
+_HEAD_SIZE = 512
+
+
+class _PrefixedStream:
+    """ Readable stream of the already read head followed by the rest of the stream. """
+
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+
+    def read(self, size=-1):
+        """ Reads up to size bytes, all the remaining bytes if size is negative. """
+        if not self.head:
+            return self.stream.read(size)
+        if size is None or size < 0:
+            data, self.head = self.head + self.stream.read(), b''
+            return data
+        data, self.head = self.head[:size], self.head[size:]
+        return data
+
+    @staticmethod
+    def seekable():
+        """ The stream is read once, e.g. from stdin. """
+        return False
+
+    def peek(self, size):
+        """ Returns up to size bytes of the head without reading them. """
+        return self.head[:size]
+
+
+def _read_head(stream) -> bytes:
+    head = b''
+    while len(head) < _HEAD_SIZE:
+        chunk = stream.read(_HEAD_SIZE - len(head))
+        if not chunk:
+            break
+        head += chunk
+    return head
+
+
+def iter_archive_members(path):
+    """
+    Yields tuples (member name, document bytes) of the CVRF members (see INPUT_SUFFIXES,
+    compressed members are decompressed when they are parsed) of the tar or zip archive
+    at path, '-' reads the archive from stdin. Tar archives (also compressed ones) are read
+    as a stream member by member, without seeking and without temporary files, so they can be
+    piped. Zip archives have their directory at the end, from stdin they are read into memory.
+    A CVRF document on stdin instead of an archive is yielded as the only member <stdin>.
+    The archive or document itself may be compressed, see open_input.
+    """
+    try:
+        # pylint: disable=consider-using-with
+        stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    except OSError as e:
+        critical_exit(f'Failed to open input archive {path}: {e}.')
+
+    try:
+        prefixed = _PrefixedStream(_read_head(stream), stream)
+        # the type is recognized by the head of the decompressed input, e.g. a gzip compressed
+        # document is not taken for a compressed tar archive
+        # pylint: disable=contextmanager-generator-missing-cleanup
+        with open_input(prefixed) as source:
+            head = _read_head(source)
+            if head.startswith(_ZIP_MAGIC):
+                # only a plain zip file can be read by seeking
+                seekable = path != '-' and source is prefixed
+                with zipfile.ZipFile(path if seekable else io.BytesIO(head + source.read())) \
+                        as archive:
+                    for info in archive.infolist():
+                        if not info.is_dir() and info.filename.lower().endswith(INPUT_SUFFIXES):
+                            yield info.filename, archive.read(info)
+            elif head.lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'<'):
+                yield '<stdin>' if path == '-' else path, head + source.read()
+            else:
+                with tarfile.open(fileobj=_PrefixedStream(head, source), mode='r|*') as archive:
+                    for member in archive:
+                        if member.isfile() and member.name.lower().endswith(INPUT_SUFFIXES):
+                            yield member.name, archive.extractfile(member).read()
+    except (OSError, EOFError, tarfile.TarError, zipfile.BadZipFile) as e:
+        critical_exit(f'Failed to read input archive {path}: {e}.')
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+
+def convert_data(member, write=True) -> dict:
+    """
+    Converts a single document given as tuple (name, bytes) inside a worker, the document
+    is read from the file name if bytes are None. The result is written as NDJSON record
+    if config output_ndjson is set, into the output dir otherwise. If write is False,
+    the serialized document is returned in the result ('output') instead of being written.
+    """
+    input_file, data = member
+    result = {'input_file': input_file, 'output_file': None, 'valid': False, 'error': None,
+              'collision': False, 'profile': None, 'record': None}
+    final_csaf = None
+    try:
+        if data is None:
+            if not os.path.isfile(input_file):
+                critical_exit(f'Input file not found, check the path: {input_file}')
+            source = input_file
+        else:
+            source = io.BytesIO(data)
+            source.name = input_file
+        final_csaf, result['valid'] = convert_and_validate(_worker_config, _worker_pkg_version,
+                                                           source)
+        try:
+            check_output_validity(_worker_config, result['valid'], input_file)
+        except CriticalExit:
+            final_csaf = None
+            raise
+
+        if not _worker_config.get('output_ndjson'):
+            result['output_file'] = output_file_path(
+                _worker_config, final_csaf['document'].get('tracking', {}).get('id'),
+                result['valid'])
+            if write:
+                claim_output(input_file, result['output_file'])
+                store_json(json_dict=final_csaf, fpath=result['output_file'],
+                           output_format=_worker_config.get('output_format', 'json'),
+                           compression=_worker_config.get('output_compression', 'none'))
+            else:
+                result['output'] = dumps(final_csaf, _worker_config.get('output_format', 'json'))
+    except CriticalExit as e:
+        result['error'] = e.msg
+        result['collision'] = isinstance(e, OutputCollision)
+    # pylint: disable=broad-except
+    except Exception as e:
+        logging.exception('Unexpected error when converting %s.', input_file)
+        result['error'] = f'Unexpected error: {e}'
+
+    if _worker_config.get('output_ndjson'):
+        # serialized by the worker, the parent process only writes the line
+        result['record'] = ndjson_record(result, final_csaf)
+    return result
+
+
+def ndjson_record(result, final_csaf) -> bytes:
+    """ Returns NDJSON record (without the newline) of the result of the document. """
+    return dumps({'file_name': result['input_file'], 'valid': result['valid'],
+                  'error': result['error'], 'csaf': final_csaf}, 'compact')
+
+
+def _map_bounded(executor, function, items, max_in_flight):
+    """
+    Yields function(item) of each item computed by the executor, in the order of the items.
+    At most max_in_flight items are submitted at a time, so the items are consumed only as fast
+    as the results are, e.g. the members of a piped archive.
+    """
+    pending = collections.deque()
+    for item in items:
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+        pending.append(executor.submit(function, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+def iter_inputs(config):
+    """ Yields tuples (name, bytes or None if the document is to be read from the file). """
+    if config.get('input_archive'):
+        yield from iter_archive_members(config['input_archive'])
+    elif config.get('input_file'):
+        yield config['input_file'], None
+    else:
+        for input_file in collect_input_files(config):
+            yield input_file, None
+
+
+def run_bulk(config, pkg_version) -> int:
+    """
+    Converts documents of the archive (--input-archive) or the input files, writing them
+    into the output dir or as NDJSON records (--output-ndjson): one line per document
+    with its file name, validity, the critical error if it failed and the CSAF document.
+    The documents are converted by a pool of worker processes, each keeps at most two
+    documents in flight, so the inputs are streamed through and the output keeps their order.
+    A failing document does not stop the run, it is reported in the final summary.
+    return: exit status, 0 if all the documents were converted, 1 otherwise
+    """
+    for key in ('print', 'streaming', 'profile', 'cache_dir'):
+        if config.get(key):
+            logging.warning('--%s is not supported with archive input or NDJSON output,'
+                            ' ignoring it.', key.replace('_', '-'))
+    jobs = config.get('jobs') or os.cpu_count() or 1
+    logging.info('Converting documents using %s job(s).', jobs)
+
+    output_ndjson = config.get('output_ndjson')
+    out = open_ndjson_output(config)
+    results = []
+    try:
+        if jobs == 1:
+            init_worker(config, pkg_version, {})
+            converted = map(convert_data, iter_inputs(config))
+            results = _write_results(converted, out, output_ndjson)
+        else:
+            with Manager() as manager, \
+                    ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                        initargs=(config, pkg_version,
+                                                  manager.dict())) as executor:
+                converted = _map_bounded(executor, convert_data, iter_inputs(config), 2 * jobs)
+                results = _write_results(converted, out, output_ndjson)
+    finally:
+        if out is not None and out is not sys.stdout.buffer:
+            out.close()
+
+    if not results:
+        critical_exit('No input files found for batch conversion.')
+    log_summary(results)
+    return 0 if all(result['error'] is None for result in results) else 1
+
+
+# pylint: disable=inconsistent-return-statements
+def open_ndjson_output(config):
+    """ Returns binary file object of config output_ndjson, stdout if '-', None if not set. """
+    output_ndjson = config.get('output_ndjson')
+    if not output_ndjson:
+        return None
+    if output_ndjson == '-':
+        if config.get('output_compression', 'none') != 'none':
+            logging.warning('--output-compression is not supported with --output-ndjson -,'
+                            ' writing uncompressed records to stdout.')
+        return sys.stdout.buffer
+    try:
+        # pylint: disable=consider-using-with
+        return open_output(output_ndjson, config.get('output_compression', 'none'))
+    except OSError as e:
+        critical_exit(f'Failed to open NDJSON output {output_ndjson}: {e}.')
+
+
+def _write_results(converted, out, output_ndjson) -> list:
+    results = []
+    for result in converted:
+        if out is not None:
+            out.write(result.pop('record') + b'\n')
+            if result['error'] is None:
+                result['output_file'] = output_ndjson
+        results.append(result)
+    if out is sys.stdout.buffer:
+        out.flush()
+    return results
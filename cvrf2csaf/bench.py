@@ -0,0 +1,297 @@
+"""
+Module containing the benchmark suite (cvrf2csaf-bench). Converts a corpus of CVRF documents
+and times each stage of the conversion separately, optionally comparing the results
+with a stored baseline.
+"""
+# pylint: disable=c-extension-no-member
+import argparse
+import glob
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+from lxml import etree
+
+from .common.profiling import peak_rss_kb
+from .common.schemas import warm_up
+from .common.serialization import dumps
+from .common.utils import get_config_from_file, get_pkg_version, critical_exit
+from .document_handler import DocumentHandler, get_mandatory_tests, make_parser
+
+STAGES = ('parse', 'input_validation', 'conversion', 'output_validation', 'mandatory_tests',
+          'serialization')
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+DEFAULT_CORPUS = ('1.2/*.xml', '1.1/ms_cvrf.xml', '1.1/oracle_cvrf.xml',
+                  '1.1/mitre-allitems-cvrf-year-2018.xml')
+
+# Maximum allowed slowdown (or RSS growth) against the baseline, 0.1 means 10 %
+DEFAULT_THRESHOLD = 0.1
+
+
+def _default_corpus() -> list:
+    files = []
+    for pattern in DEFAULT_CORPUS:
+        files.extend(sorted(glob.glob(os.path.join(EXAMPLES_DIR, pattern))))
+    return [os.path.normpath(path) for path in files]
+
+
+def _cvrf_version(root) -> str:
+    # CVRF 1.1 documents use http://www.icasi.org/CVRF/schema/cvrf/1.1 namespace
+    return '1.1' if '/1.1' in (etree.QName(root).namespace or '') else '1.2'
+
+
+def _serialize(final_csaf) -> bytes:
+    # same serialization as store_json
+    return dumps(final_csaf)
+
+
+def _run_document(config, pkg_version, path) -> dict:
+    """
+    Converts a single document, timing each stage. A failing stage is recorded in errors,
+    the following stages run only if they have their input.
+    """
+    result = {'stages': {}, 'errors': {}, 'output_size': None}
+    handler = DocumentHandler(config, pkg_version)
+
+    def timed(stage, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        # pylint: disable=broad-except
+        except Exception as e:
+            result['errors'][stage] = f'{type(e).__name__}: {e}'
+            return None
+        finally:
+            result['stages'][stage] = time.perf_counter() - start
+
+    tree = timed('parse', etree.parse, path, make_parser(config.get('compact_parser', False)))
+    if tree is None:
+        return result
+    root = tree.getroot()
+
+    # each document is validated against the schema of its own CVRF version
+    errors = timed('input_validation', DocumentHandler.input_schema_errors, tree,
+                   _cvrf_version(root))
+    if errors:
+        result['errors']['input_validation'] = f'Input document not valid, {len(errors)} errors.'
+
+    final_csaf = timed('conversion', handler.convert_root, root)
+    if final_csaf is None:
+        return result
+
+    timed('output_validation', handler.validate_output_against_schema, final_csaf)
+    timed('mandatory_tests', handler.validate_mandatory_tests, final_csaf)
+    output = timed('serialization', _serialize, final_csaf)
+    if output is not None:
+        result['output_size'] = len(output)
+
+    return result
+
+
+def run_benchmark(input_files, repeat=3) -> dict:
+    """
+    Converts all input files repeat times. Time of each stage of each document is the best
+    of the rounds, so that the results are not skewed by other load on the machine.
+    return: report dict
+    """
+    config = get_config_from_file()
+    pkg_version = get_pkg_version()
+
+    # schema compilation and imports are a one-time cost, they are not part of any document
+    warm_up(cvrf_versions=('1.1', '1.2'))
+    get_mandatory_tests()
+
+    documents = []
+    for path in input_files:
+        rounds = [_run_document(config, pkg_version, path) for _ in range(repeat)]
+        documents.append({
+            'path': path,
+            'size': os.path.getsize(path),
+            'output_size': rounds[0]['output_size'],
+            'stages': {stage: min(r['stages'][stage] for r in rounds)
+                       for stage in STAGES if stage in rounds[0]['stages']},
+            'errors': rounds[0]['errors'],
+        })
+
+    stages = {stage: sum(document['stages'].get(stage, 0) for document in documents)
+              for stage in STAGES}
+    total = sum(stages.values())
+    size = sum(document['size'] for document in documents)
+
+    return {
+        'cvrf2csaf_version': pkg_version,
+        'python_version': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'documents': documents,
+        'stages': stages,
+        'total': total,
+        'docs_per_sec': len(documents) / total if total else None,
+        'mb_per_sec': size / (1024 * 1024) / total if total else None,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def corpus_difference(input_files, baseline):
+    """
+    Compares the documents to benchmark with the documents of the baseline report,
+    the times can be compared only on the same corpus.
+    return: description of the difference, None if the corpus is the same
+    """
+    current = {os.path.abspath(path): os.path.getsize(path) for path in input_files}
+    previous = {os.path.abspath(document['path']): document['size']
+                for document in baseline.get('documents', [])}
+    differences = []
+    for description, paths in (
+            ('missing in the baseline', sorted(current.keys() - previous.keys())),
+            ('only in the baseline', sorted(previous.keys() - current.keys())),
+            ('changed since the baseline', sorted(path for path in current.keys() & previous.keys()
+                                                  if current[path] != previous[path]))):
+        if paths:
+            differences.append(f'{len(paths)} documents {description} ({", ".join(paths[:3])}'
+                               f'{", ..." if len(paths) > 3 else ""})')
+    return '; '.join(differences) or None
+
+
+def compare_with_baseline(report, baseline, thresholds, default_threshold) -> list:
+    """
+    Compares stage times, total time, total time of each document and peak RSS with
+    the baseline report of the same corpus, see corpus_difference().
+    thresholds maps stage names, 'total' (used also for the documents) and 'peak_rss_kb'
+    to the maximum allowed relative growth, other names use default_threshold.
+    return: list of regression descriptions, empty if there is no regression
+    """
+    # tuples (name, name of the threshold, current value, baseline value)
+    metrics = [(stage, stage, report['stages'][stage], baseline.get('stages', {}).get(stage))
+               for stage in STAGES]
+    metrics.append(('total', 'total', report['total'], baseline.get('total')))
+    previous_documents = {os.path.abspath(document['path']): document
+                          for document in baseline.get('documents', [])}
+    for document in report['documents']:
+        previous = previous_documents.get(os.path.abspath(document['path']))
+        if previous is not None:
+            metrics.append((f'total of {document["path"]}', 'total',
+                            sum(document['stages'].values()), sum(previous['stages'].values())))
+    metrics.append(('peak_rss_kb', 'peak_rss_kb', report['peak_rss_kb'],
+                    baseline.get('peak_rss_kb')))
+
+    regressions = []
+    for name, threshold_name, current, previous in metrics:
+        if not current or not previous:
+            continue
+        threshold = thresholds.get(threshold_name, default_threshold)
+        change = current / previous - 1
+        if change > threshold:
+            regressions.append(f'{name}: {previous:.4f} -> {current:.4f}'
+                               f' (+{change:.1%}, threshold {threshold:.1%})')
+
+    return regressions
+
+
+def _print_report(report):
+    print(f'{"document":50} {"size [kB]":>10} ' + ' '.join(f'{stage[:12]:>12}' for stage in STAGES))
+    for document in report['documents']:
+        name = os.path.relpath(document['path'])[-50:]
+        times = ' '.join(f'{document["stages"][stage] * 1000:12.2f}'
+                         if stage in document['stages'] else f'{"-":>12}' for stage in STAGES)
+        print(f'{name:50} {document["size"] / 1024:10.1f} {times}')
+        for stage, error in document['errors'].items():
+            print(f'    {stage} failed: {error[:200]}')
+
+    print(f'{"total [ms]":61} ' + ' '.join(f'{report["stages"][stage] * 1000:12.2f}'
+                                           for stage in STAGES))
+    print(f'{len(report["documents"])} documents in {report["total"]:.3f} s:'
+          f' {report["docs_per_sec"]:.2f} docs/s, {report["mb_per_sec"]:.2f} MB/s,'
+          f' peak RSS {report["peak_rss_kb"]} kB')
+
+
+def _parse_threshold(value):
+    name, _, threshold = value.partition('=')
+    if name not in STAGES + ('total', 'peak_rss_kb'):
+        raise argparse.ArgumentTypeError(f'unknown metric {name}')
+    try:
+        return name, float(threshold)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f'invalid threshold {threshold}') from e
+
+
+def main():
+    """ Entry point of cvrf2csaf-bench. """
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the conversion stages over a corpus of CVRF documents.'
+                    ' Exits with status 1 if a regression against the baseline is found.')
+    parser.add_argument('input_files', nargs='*', metavar='PATH',
+                        help='CVRF documents to benchmark. Default is the examples of the source'
+                             f' checkout: {", ".join(DEFAULT_CORPUS)}, they are not installed'
+                             ' with the package.')
+    parser.add_argument('--repeat', dest='repeat', type=int, default=3, metavar='N',
+                        help='Number of rounds, the best time of each stage is taken.'
+                             ' Default is 3.')
+    parser.add_argument('--output', dest='output', type=str, metavar='PATH',
+                        help='Writes the JSON report into the file, it can be used as a baseline'
+                             ' for later runs.')
+    parser.add_argument('--baseline', dest='baseline', type=str, metavar='PATH',
+                        help='JSON report of a previous run on the same documents to compare'
+                             ' with.')
+    parser.add_argument('--default-threshold', dest='default_threshold', type=float,
+                        default=DEFAULT_THRESHOLD, metavar='FRACTION',
+                        help='Maximum allowed relative growth of a time or peak RSS against'
+                             f' the baseline. Default is {DEFAULT_THRESHOLD}.')
+    parser.add_argument('--threshold', dest='thresholds', type=_parse_threshold, action='append',
+                        default=[], metavar='NAME=FRACTION',
+                        help='Threshold for a single metric, one of: '
+                             f'{", ".join(STAGES + ("total", "peak_rss_kb"))}. Can be repeated.')
+    args = parser.parse_args()
+
+    if args.repeat < 1:
+        critical_exit('Number of rounds must be a positive integer.')
+    input_files = args.input_files or _default_corpus()
+    if not input_files:
+        critical_exit('No documents to benchmark, the default corpus is looked up in'
+                      f' {os.path.normpath(EXAMPLES_DIR)} which exists only in a source checkout.'
+                      ' Give the CVRF documents as arguments.')
+    for path in input_files:
+        if not os.path.isfile(path):
+            critical_exit(f'Input file not found, check the path: {path}')
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            critical_exit(f'Failed to read baseline {args.baseline}: {e}.')
+        difference = corpus_difference(input_files, baseline)
+        if difference:
+            critical_exit(f'Baseline {args.baseline} was measured on a different corpus,'
+                          f' the times are not comparable: {difference}.')
+
+    # the conversion logs would drown the results
+    logging.disable(logging.CRITICAL)
+    try:
+        report = run_benchmark(input_files, repeat=args.repeat)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    _print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logging.info('Report written to %s.', args.output)
+
+    if baseline is not None:
+        regressions = compare_with_baseline(report, baseline, dict(args.thresholds),
+                                            args.default_threshold)
+        for regression in regressions:
+            logging.error('Regression: %s', regression)
+        if regressions:
+            sys.exit(1)
+        logging.info('No regression against baseline %s.', args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+Module containing the on-disk cache of conversion results (--cache-dir). Feeds re-deliver
+mostly unchanged documents, so a document converted before with the same config by the same
+converter version is read from the cache instead of being parsed, converted and validated again.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+from .serialization import dumps
+from .utils import get_utc_timestamp
+
+# Config keys which change the converted document or its validity, only these are part of
+# the key. A new option changing the result must be added, otherwise results converted with
+# its other values would be served.
+_KEYS_AFFECTING_RESULT = frozenset({
+    'cvrf2csaf_name', 'validate', 'csaf_version', 'publisher_name', 'publisher_namespace',
+    'fix_insert_current_version_into_revision_history', 'force_insert_default_reference_category',
+    'remove_CVSS_values_without_vector', 'merge_CVSS_score_sets', 'compute_CVSS_scores',
+    'default_CVSS3_version'})
+
+_CHUNK_SIZE = 1024 * 1024
+_ENTRY_SUFFIX = '.json'
+
+
+def _generator(final_csaf) -> dict:
+    return final_csaf.get('document', {}).get('tracking', {}).get('generator', {})
+
+
+class ConversionCache:
+    """
+    Entries are JSON files named by the key, a SHA-256 hash of the input bytes, the config
+    affecting the conversion and the converter version. An entry holds the CSAF document and
+    its validity. The volatile tracking.generator.date is not stored, a hit gets the current
+    date just like a fresh conversion, so a hit is indistinguishable from a miss.
+    Modification time of an entry is its last use. Entries unused for max_age seconds expire,
+    the least recently used ones are evicted while the cache is larger than max_size bytes.
+    Entries are written atomically, so the cache can be shared by concurrent processes.
+    """
+
+    def __init__(self, directory, max_size=None, max_age=None):
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def key(self, config, pkg_version, input_file):
+        """ Returns the key of the input file converted with config, None if it can't be read. """
+        digest = hashlib.sha256(pkg_version.encode('utf-8'))
+        effective_config = {key: value for key, value in config.items()
+                            if key in _KEYS_AFFECTING_RESULT}
+        digest.update(json.dumps(effective_config, sort_keys=True, default=str).encode('utf-8'))
+        try:
+            with open(input_file, 'rb') as f:
+                for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+        except OSError:
+            # the conversion reports the error
+            return None
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + _ENTRY_SUFFIX)
+
+    def get(self, key):
+        """
+        Returns tuple (CSAF document, True if valid) stored under the key, None on a miss.
+        """
+        path = self._entry_path(key)
+        try:
+            if self.max_age is not None and time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                return None
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+            # the entry was used now
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning('Ignoring unreadable cache entry %s: %s.', path, e)
+            return None
+
+        final_csaf = entry['csaf']
+        generator = _generator(final_csaf)
+        if 'date' in generator:
+            generator['date'] = get_utc_timestamp(time_stamp='now')
+        return final_csaf, entry['valid']
+
+    def put(self, key, final_csaf, valid):
+        """ Stores the CSAF document and its validity under the key. """
+        generator = _generator(final_csaf)
+        date = generator.get('date')
+        if date is not None:
+            # kept in place (as null), so that the order of the keys is preserved
+            generator['date'] = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(dumps({'valid': valid, 'csaf': final_csaf}, 'compact'))
+                os.replace(tmp_path, self._entry_path(key))
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        except OSError as e:
+            logging.warning('Failed to store the result in the cache %s: %s.', self.directory, e)
+        finally:
+            if date is not None:
+                generator['date'] = date
+
+    def evict(self):
+        """ Removes the expired entries and the least recently used ones exceeding max_size. """
+        if self.max_size is None and self.max_age is None:
+            return
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith(_ENTRY_SUFFIX):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            return
+
+        # the most recently used first
+        entries.sort(reverse=True)
+        now = time.time()
+        total_size = 0
+        removed = 0
+        for mtime, size, path in entries:
+            total_size += size
+            if (self.max_age is not None and now - mtime > self.max_age) \
+                    or (self.max_size is not None and total_size > self.max_size):
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    # removed by a concurrent process
+                    pass
+                total_size -= size
+
+        if removed:
+            logging.info('Evicted %s entries from the cache %s.', removed, self.directory)
+
+
+def get_cache(config):
+    """ Returns ConversionCache set up by config, None if caching is disabled. """
+    if not config.get('cache_dir'):
+        return None
+
+    max_size = config.get('cache_max_size')
+    max_age = config.get('cache_max_age')
+    # config is in megabytes and days
+    return ConversionCache(config['cache_dir'],
+                           max_size=None if max_size is None else int(max_size * 1024 * 1024),
+                           max_age=None if max_age is None else max_age * 24 * 3600)
@@ -1,8 +1,143 @@
-"""Module containing SectionHandler parent class."""
+"""Module containing SectionHandler parent class and the per-conversion context."""
+import contextvars
 import logging
 
+from collections import Counter
+from contextlib import contextmanager
+
+from lxml import etree
+
+from .profiling import profiled
+
 
 # pylint: disable=too-few-public-methods
+class ConversionContext:
+    """
+    State of a single document conversion, holding the errors and warnings reported
+    by the section handlers. Each conversion has its own context, so conversions running
+    concurrently in threads or one after another do not see each other's errors.
+    """
+
+    def __init__(self, profile=None, product_index=None):
+        self.errors = []
+        self.warnings = []
+        # Profile of the conversion stages if --profile is used, see profiling.py
+        self.profile = profile
+        # Product and group IDs defined by ProductTree if the references are checked,
+        # see ProductIndex
+        self.product_index = product_index
+        # Counters of the conversion reported when it finishes, e.g. merged_score_sets
+        self.stats = Counter()
+
+    @property
+    def error_occurred(self) -> bool:
+        """ True if some error resulting in invalid output happened. """
+        return len(self.errors) > 0
+
+
+_current_context = contextvars.ContextVar('conversion_context')
+
+
+@contextmanager
+def conversion_context(context):
+    """ Makes context the current one (for the current thread or task) within the block. """
+    token = _current_context.set(context)
+    try:
+        yield context
+    finally:
+        _current_context.reset(token)
+
+
+def current_context() -> ConversionContext:
+    """
+    Returns context of the conversion running in the current thread or task.
+    Handlers used outside of any conversion get a new throwaway context on each call,
+    it is never installed, so nothing reported outside a conversion leaks into later ones.
+    """
+    context = _current_context.get(None)
+    if context is None:
+        return ConversionContext()
+    return context
+
+
+class ChildIndex:
+    """
+    Child elements of an element bucketed by their local name in a single pass.
+    Handlers look the children up here instead of probing objectify attributes, where each
+    hasattr() is a search of the children raising AttributeError if missing. The index works
+    with plain lxml.etree elements as well as with objectify ones.
+    """
+    __slots__ = ('_children',)
+
+    def __init__(self, element):
+        self._children = {}
+        # pylint: disable=c-extension-no-member
+        for child in element.iterchildren(etree.Element):
+            # tag is '{namespace}localname' or just 'localname'
+            self._children.setdefault(child.tag.rpartition('}')[2], []).append(child)
+
+    def __contains__(self, name):
+        return name in self._children
+
+    def get(self, name) -> list:
+        """ Returns all the children with the local name, empty list if there are none. """
+        return self._children.get(name, [])
+
+    def first(self, name):
+        """ Returns the first child with the local name, raises AttributeError if missing. """
+        try:
+            return self._children[name][0]
+        except KeyError:
+            raise AttributeError(f'no such child: {name}') from None
+
+
+class ProductIndex:
+    """
+    Product and group IDs defined by the ProductTree section (full product names, branches,
+    relationships and product groups), filled in while ProductTree is converted.
+    The references to them in ProductTree and Vulnerability sections are looked up in the sets
+    as the sections are converted, so a dangling reference is reported with its input line
+    instead of failing the defined product/group IDs mandatory tests on the whole output.
+    """
+
+    def __init__(self):
+        self.product_ids = set()
+        self.group_ids = set()
+
+    def define_product(self, product_id):
+        """ Records product_id defined by a FullProductName element. """
+        self.product_ids.add(product_id)
+
+    def define_group(self, group_id):
+        """ Records group_id defined by a Group element. """
+        self.group_ids.add(group_id)
+
+    def check_product(self, product_id, sourceline) -> bool:
+        """ Reports an error if product_id referenced on the input line is not defined. """
+        if product_id in self.product_ids:
+            return True
+        SectionHandler.report_error('Input line %s: ProductID %s is not defined in ProductTree.',
+                                    sourceline, product_id)
+        return False
+
+    def check_references(self, element) -> bool:
+        """
+        Checks all the ProductID and GroupID elements inside the element,
+        reports an error for each reference which is not defined.
+        """
+        valid = True
+        for ref in element.iter('{*}ProductID', '{*}GroupID'):
+            if ref.tag.endswith('ProductID'):
+                valid = self.check_product(ref.text, ref.sourceline) and valid
+            elif ref.text not in self.group_ids:
+                SectionHandler.report_error(
+                    'Input line %s: GroupID %s is not defined in ProductTree.',
+                    ref.sourceline, ref.text)
+                valid = False
+
+        return valid
+
+
 class SectionHandler:
     """
     A class encapsulating arbitrary XML element in the tree.
@@ -13,11 +148,21 @@ class SectionHandler:
          to be converted to JSON in the final composition step
     """
 
-    error_occurred = False
-
     def __init__(self):
         self.csaf = {}
 
+    @staticmethod
+    def report_error(msg, *args):
+        """ Logs error resulting in invalid output and records it in the current context. """
+        logging.error(msg, *args, stacklevel=2)
+        current_context().errors.append(msg % args if args else msg)
+
+    @staticmethod
+    def report_warning(msg, *args):
+        """ Logs warning and records it in the current context. """
+        logging.warning(msg, *args, stacklevel=2)
+        current_context().warnings.append(msg % args if args else msg)
+
     def _process_mandatory_elements(self, root_element):
         raise NotImplementedError('Subclasses must implement.')
 
@@ -28,6 +173,10 @@ class SectionHandler:
         """
         Parses XML element and stores in JSON structure (self.csaf variable).
         """
+        with profiled(current_context().profile, f'section.{type(self).__name__}', root_element):
+            self._create_csaf(root_element)
+
+    def _create_csaf(self, root_element):
         try:
             self._process_mandatory_elements(root_element)
         # pylint: disable=broad-except
@@ -0,0 +1,237 @@
+"""
+Module parsing CVSS v2, v3.0 and v3.1 vectors and computing their base, temporal and
+environmental scores according to the specifications:
+https://www.first.org/cvss/v2/guide, https://www.first.org/cvss/v3.0/specification-document,
+https://www.first.org/cvss/v3.1/specification-document
+Vendor documents reuse a few hundred vectors across thousands of score sets, so the scores
+are cached by the vector string.
+"""
+import functools
+import math
+
+from typing import NamedTuple, Optional
+
+
+class CvssScores(NamedTuple):
+    """ Scores of a CVSS vector, temporal/environmental are None without such metrics. """
+    version: str
+    base_score: float
+    temporal_score: Optional[float]
+    environmental_score: Optional[float]
+
+
+# Weights of the metric values, metrics missing in a vector are Not Defined (X or ND)
+_V2_METRICS = {
+    'AV': {'L': 0.395, 'A': 0.646, 'N': 1.0},
+    'AC': {'H': 0.35, 'M': 0.61, 'L': 0.71},
+    'Au': {'M': 0.45, 'S': 0.56, 'N': 0.704},
+    'C': {'N': 0.0, 'P': 0.275, 'C': 0.660},
+    'I': {'N': 0.0, 'P': 0.275, 'C': 0.660},
+    'A': {'N': 0.0, 'P': 0.275, 'C': 0.660},
+    'E': {'U': 0.85, 'POC': 0.9, 'F': 0.95, 'H': 1.0, 'ND': 1.0},
+    'RL': {'OF': 0.87, 'TF': 0.90, 'W': 0.95, 'U': 1.0, 'ND': 1.0},
+    'RC': {'UC': 0.90, 'UR': 0.95, 'C': 1.0, 'ND': 1.0},
+    'CDP': {'N': 0.0, 'L': 0.1, 'LM': 0.3, 'MH': 0.4, 'H': 0.5, 'ND': 0.0},
+    'TD': {'N': 0.0, 'L': 0.25, 'M': 0.75, 'H': 1.0, 'ND': 1.0},
+    'CR': {'L': 0.5, 'M': 1.0, 'H': 1.51, 'ND': 1.0},
+    'IR': {'L': 0.5, 'M': 1.0, 'H': 1.51, 'ND': 1.0},
+    'AR': {'L': 0.5, 'M': 1.0, 'H': 1.51, 'ND': 1.0},
+}
+_V2_BASE = ('AV', 'AC', 'Au', 'C', 'I', 'A')
+_V2_TEMPORAL = ('E', 'RL', 'RC')
+_V2_ENVIRONMENTAL = ('CDP', 'TD', 'CR', 'IR', 'AR')
+
+_V3_CIA = {'H': 0.56, 'L': 0.22, 'N': 0.0}
+_V3_REQUIREMENT = {'X': 1.0, 'H': 1.5, 'M': 1.0, 'L': 0.5}
+_V3_METRICS = {
+    'AV': {'N': 0.85, 'A': 0.62, 'L': 0.55, 'P': 0.2},
+    'AC': {'L': 0.77, 'H': 0.44},
+    # Privileges Required weighs more if the scope is changed, see _v3_privileges
+    'PR': {'N': (0.85, 0.85), 'L': (0.62, 0.68), 'H': (0.27, 0.5)},
+    'UI': {'N': 0.85, 'R': 0.62},
+    'S': {'U': 'U', 'C': 'C'},
+    'C': _V3_CIA,
+    'I': _V3_CIA,
+    'A': _V3_CIA,
+    'E': {'X': 1.0, 'H': 1.0, 'F': 0.97, 'P': 0.94, 'U': 0.91},
+    'RL': {'X': 1.0, 'U': 1.0, 'W': 0.97, 'T': 0.96, 'O': 0.95},
+    'RC': {'X': 1.0, 'C': 1.0, 'R': 0.96, 'U': 0.92},
+    'CR': _V3_REQUIREMENT,
+    'IR': _V3_REQUIREMENT,
+    'AR': _V3_REQUIREMENT,
+}
+_V3_BASE = ('AV', 'AC', 'PR', 'UI', 'S', 'C', 'I', 'A')
+_V3_TEMPORAL = ('E', 'RL', 'RC')
+# Modified base metrics (MAV, ...) take the values of the base metrics, X means not modified
+_V3_METRICS.update({f'M{metric}': {'X': None, **_V3_METRICS[metric]} for metric in _V3_BASE})
+_V3_ENVIRONMENTAL = ('CR', 'IR', 'AR') + tuple(f'M{metric}' for metric in _V3_BASE)
+
+
+def _parse_metrics(metrics, weights, mandatory, vector) -> dict:
+    """ Returns dict of the metric values of the vector parts, raises ValueError if invalid. """
+    values = {}
+    for part in metrics:
+        metric, _, value = part.partition(':')
+        if metric not in weights or value not in weights[metric]:
+            raise ValueError(f'invalid metric {part} in CVSS vector {vector}')
+        if metric in values:
+            raise ValueError(f'duplicate metric {metric} in CVSS vector {vector}')
+        values[metric] = value
+    missing = [metric for metric in mandatory if metric not in values]
+    if missing:
+        raise ValueError(f'missing base metrics {", ".join(missing)} in CVSS vector {vector}')
+    return values
+
+
+def _round_to_1_decimal(value) -> float:
+    # round half up, the round() builtin rounds half to even. The weights are decimal numbers,
+    # the inner round() drops the binary floating point error, e.g. 2.85 computed as 2.8499999
+    return math.floor(round(value * 10, 6) + 0.5) / 10
+
+
+def _v2_base_score(values, impact) -> float:
+    exploitability = 20 * _V2_METRICS['AV'][values['AV']] * _V2_METRICS['AC'][values['AC']] \
+        * _V2_METRICS['Au'][values['Au']]
+    f_impact = 0 if impact == 0 else 1.176
+    return _round_to_1_decimal(((0.6 * impact) + (0.4 * exploitability) - 1.5) * f_impact)
+
+
+def _score_v2(vector) -> CvssScores:
+    values = _parse_metrics(vector.split('/'), _V2_METRICS, _V2_BASE, vector)
+    weight = {metric: weights[values.get(metric, 'ND')] for metric, weights in _V2_METRICS.items()
+              if metric not in ('AV', 'AC', 'Au')}
+
+    impact = 10.41 * (1 - (1 - weight['C']) * (1 - weight['I']) * (1 - weight['A']))
+    # the equation is negative for the lowest impacts, the scores are not
+    base_score = max(0.0, _v2_base_score(values, impact))
+
+    temporal_factor = weight['E'] * weight['RL'] * weight['RC']
+    temporal_score = None
+    if any(values.get(metric, 'ND') != 'ND' for metric in _V2_TEMPORAL):
+        temporal_score = _round_to_1_decimal(base_score * temporal_factor)
+
+    environmental_score = None
+    if any(values.get(metric, 'ND') != 'ND' for metric in _V2_ENVIRONMENTAL):
+        adjusted_impact = min(10, 10.41 * (1 - (1 - weight['C'] * weight['CR'])
+                                           * (1 - weight['I'] * weight['IR'])
+                                           * (1 - weight['A'] * weight['AR'])))
+        adjusted_temporal = _round_to_1_decimal(_v2_base_score(values, adjusted_impact)
+                                                * temporal_factor)
+        environmental_score = max(0.0, _round_to_1_decimal(
+            (adjusted_temporal + (10 - adjusted_temporal) * weight['CDP']) * weight['TD']))
+
+    return CvssScores('2.0', base_score, temporal_score, environmental_score)
+
+
+def _v3_roundup(value, version) -> float:
+    """ Smallest number with 1 decimal place equal to or higher than value. """
+    if version == '3.0':
+        # like in _round_to_1_decimal, 4.6000000000000005 is 4.6 and not rounded up to 4.7
+        return math.ceil(round(value * 10, 6)) / 10
+    # v3.1 avoids the floating point errors of v3.0, e.g. Roundup(4.000002) is 4.1 in v3.0
+    # and 4.0 in v3.1
+    int_input = round(value * 100000)
+    if int_input % 10000 == 0:
+        return int_input / 100000.0
+    return (math.floor(int_input / 10000) + 1) / 10.0
+
+
+def _v3_privileges(value, scope) -> float:
+    return _V3_METRICS['PR'][value][scope == 'C']
+
+
+# pylint: disable=too-many-arguments,too-many-positional-arguments
+def _v3_sub_scores(version, values, scope, requirements=(1.0, 1.0, 1.0), modified=False):
+    """ Returns tuple (impact, exploitability) of the base or modified (environmental) metrics. """
+    def weight(metric):
+        return _V3_METRICS[metric][values[metric]]
+
+    confidentiality, integrity, availability = (
+        weight(metric) * requirement for metric, requirement in zip(('C', 'I', 'A'), requirements))
+    impact_sub_score = 1 - (1 - confidentiality) * (1 - integrity) * (1 - availability)
+    if modified:
+        impact_sub_score = min(impact_sub_score, 0.915)
+
+    if scope == 'U':
+        impact = 6.42 * impact_sub_score
+    elif modified and version == '3.1':
+        impact = 7.52 * (impact_sub_score - 0.029) \
+            - 3.25 * (impact_sub_score * 0.9731 - 0.02) ** 13
+    else:
+        impact = 7.52 * (impact_sub_score - 0.029) - 3.25 * (impact_sub_score - 0.02) ** 15
+
+    exploitability = 8.22 * weight('AV') * weight('AC') * _v3_privileges(values['PR'], scope) \
+        * weight('UI')
+    return impact, exploitability
+
+
+def _v3_score(version, impact, exploitability, scope, temporal_factor=None) -> float:
+    """ Returns base score, environmental score if temporal_factor is given. """
+    if impact <= 0:
+        return 0.0
+    score = impact + exploitability
+    if scope == 'C':
+        score *= 1.08
+    score = _v3_roundup(min(score, 10), version)
+    if temporal_factor is None:
+        return score
+    return _v3_roundup(score * temporal_factor, version)
+
+
+def _score_v3(vector) -> CvssScores:
+    prefix, *metrics = vector.split('/')
+    version = prefix[len('CVSS:'):]
+    values = _parse_metrics(metrics, _V3_METRICS, _V3_BASE, vector)
+    scope = values['S']
+
+    base_score = _v3_score(version, *_v3_sub_scores(version, values, scope), scope)
+
+    temporal_factor = 1.0
+    for metric in _V3_TEMPORAL:
+        temporal_factor *= _V3_METRICS[metric][values.get(metric, 'X')]
+    temporal_score = None
+    if any(values.get(metric, 'X') != 'X' for metric in _V3_TEMPORAL):
+        temporal_score = _v3_roundup(base_score * temporal_factor, version)
+
+    environmental_score = None
+    if any(values.get(metric, 'X') != 'X' for metric in _V3_ENVIRONMENTAL):
+        modified = {metric: values.get(f'M{metric}', 'X') for metric in _V3_BASE}
+        modified = {metric: values[metric] if value == 'X' else value
+                    for metric, value in modified.items()}
+        requirements = tuple(_V3_REQUIREMENT[values.get(metric, 'X')]
+                             for metric in ('CR', 'IR', 'AR'))
+        modified_scope = modified['S']
+        environmental_score = _v3_score(
+            version, *_v3_sub_scores(version, modified, modified_scope, requirements,
+                                     modified=True),
+            modified_scope, temporal_factor)
+
+    return CvssScores(version, base_score, temporal_score, environmental_score)
+
+
+@functools.lru_cache(maxsize=1024)
+def score_vector(vector) -> CvssScores:
+    """
+    Returns the scores of the CVSS v2, v3.0 or v3.1 vector (v3 vectors start with CVSS:3.x).
+    Raises ValueError if the vector is not valid. The results are cached by the vector.
+    """
+    if vector.startswith(('CVSS:3.0/', 'CVSS:3.1/')):
+        return _score_v3(vector)
+    if vector.startswith('CVSS:'):
+        raise ValueError(f'unsupported CVSS version of CVSS vector {vector}')
+    return _score_v2(vector)
+
+
+def score_vectors(vectors) -> tuple:
+    """
+    Scores all the unique vectors of the iterable at once, e.g. all vectors of a document.
+    return: tuple (dict of CvssScores by vector, dict of the errors of invalid vectors by vector)
+    """
+    scores = {}
+    errors = {}
+    for vector in set(vectors):
+        try:
+            scores[vector] = score_vector(vector)
+        except ValueError as e:
+            errors[vector] = str(e)
+    return scores, errors
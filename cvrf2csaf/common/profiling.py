@@ -0,0 +1,95 @@
+"""
+Module containing the instrumentation of the conversion stages, enabled by --profile.
+When profiling is disabled, the stages are wrapped in a shared no-op context manager,
+so the instrumentation costs just a function call.
+"""
+import json
+import sys
+import time
+import tracemalloc
+
+from contextlib import contextmanager, nullcontext
+
+from lxml import etree
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+_DISABLED = nullcontext()
+
+
+class Profile:
+    """
+    Wall and CPU time of the stages of a conversion. Stages nest (e.g. section handlers
+    reusing other handlers), so their times are inclusive. CPU time is of the converting thread.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.info = {}
+
+    @contextmanager
+    def stage(self, name, element=None):
+        """ Times the block as the stage name, counts XML elements of element if given. """
+        # pylint: disable=c-extension-no-member
+        elements = None if element is None else sum(1 for _ in element.iter(etree.Element))
+        wall_time, cpu_time = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            stats = self.stages.setdefault(name, {'calls': 0, 'wall_time': 0.0, 'cpu_time': 0.0})
+            stats['calls'] += 1
+            stats['wall_time'] += time.perf_counter() - wall_time
+            stats['cpu_time'] += time.thread_time() - cpu_time
+            if elements is not None:
+                stats['elements'] = stats.get('elements', 0) + elements
+
+    def report(self) -> dict:
+        """ Returns the profile as a JSON serializable dict. """
+        return {**self.info, 'stages': self.stages}
+
+
+def profiled(profile, name, element=None):
+    """ Returns context manager timing the stage in profile, no-op if profile is None. """
+    if profile is None:
+        return _DISABLED
+    return profile.stage(name, element)
+
+
+def peak_rss_kb():
+    """ Returns peak resident set size of the process in kilobytes, None if unknown. """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+    return peak_rss // 1024 if sys.platform == 'darwin' else peak_rss
+
+
+@contextmanager
+def memory_peaks():
+    """
+    Yields dict which is filled with the peak RSS of the process (peak_rss_kb) when the block
+    finishes, the peak of the whole process life. If tracemalloc is tracing (python -X
+    tracemalloc or PYTHONTRACEMALLOC=1), the peak of the Python allocations traced within
+    the block (tracemalloc_peak_kb) is added. Tracing is not started here, it slows down
+    the allocations and its own bookkeeping adds to the peak RSS.
+    Allocations of lxml (libxml2) are never traced, they show in the peak RSS only.
+    """
+    memory = {}
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    try:
+        yield memory
+    finally:
+        memory['peak_rss_kb'] = peak_rss_kb()
+        if tracing:
+            memory['tracemalloc_peak_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+
+
+def store_profile_reports(reports, fpath):
+    """ Writes the profile reports of the converted documents into the JSON file. """
+    with open(fpath, 'w', encoding='utf-8') as f:
+        json.dump({'documents': reports}, f, indent=2)
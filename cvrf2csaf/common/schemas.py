@@ -0,0 +1,185 @@
+"""
+Module containing the process-wide cache of compiled schemata.
+Compiling the CVRF XSD resolves every imported schema under schemata/, which is much more
+expensive than validating a small document, so each schema is compiled only once per process
+and thread.
+"""
+# pylint: disable=c-extension-no-member
+import functools
+import json
+import logging
+import os
+import threading
+
+from importlib.resources import files
+
+from lxml import etree
+
+PACKAGE_NAME = 'cvrf2csaf'
+
+# CVRF version -> (schema file, default XML catalog file), relative to the package
+CVRF_SCHEMATA = {
+    '1.1': ('schemata/cvrf/1.1/cvrf.xsd', 'schemata/catalog_1_1.xml'),
+    '1.2': ('schemata/cvrf/1.2/cvrf.xsd', 'schemata/catalog_1_2.xml'),
+}
+
+# Content copied from
+# https://github.com/secvisogram/secvisogram/blob/main/app/lib/app/shared/Core/csaf_2.0_strict.json
+CSAF_SCHEMA = 'schemata/csaf/2.0/csaf_json_schema_strict.json'
+
+
+def get_package_file(relative_path) -> str:
+    """ Returns absolute path of a file installed within the package. """
+    # the package is not zip safe, so its files are always on the file system
+    return str(files(PACKAGE_NAME).joinpath(relative_path))
+
+
+# Compilations are serialized, lxml swaps the process-wide loader of the imported schemata
+_compile_lock = threading.Lock()
+
+
+# pylint: disable=too-few-public-methods
+class CompiledXMLSchema:
+    """
+    Compiled XSD shared by all the conversions in the process.
+    lxml keeps the error log on the schema object, so each thread validates with its own copy.
+    The thread creating the schema (e.g. by warm_up) validates with the copy compiled right
+    away, the other threads compile their own copy by compile_schema on their first validation.
+    Concurrent validations neither wait for each other nor mix their errors.
+    lxml installs its loader of the imported schemata for the process only while a document
+    is parsed, so a compilation can fail to resolve the imports when a parse in another thread
+    ends meanwhile. The thread then validates with the shared copy under a lock from then on.
+    """
+
+    def __init__(self, compile_schema):
+        self._compile_schema = compile_schema
+        self._local = threading.local()
+        # compiled right away, so errors of the schema itself surface here
+        self._shared = self._local.schema = self._compile()
+        self._shared_lock = threading.Lock()
+
+    def _compile(self) -> etree.XMLSchema:
+        with _compile_lock:
+            return self._compile_schema()
+
+    def _validate(self, schema, xml) -> list:
+        if schema is self._shared:
+            with self._shared_lock:
+                return self._validate_with(schema, xml)
+        return self._validate_with(schema, xml)
+
+    @staticmethod
+    def _validate_with(schema, xml) -> list:
+        if schema.validate(xml):
+            return []
+        return list(schema.error_log)
+
+    def validate(self, xml) -> list:
+        """ Validates XML document or element, returns list of errors (empty if valid). """
+        schema = getattr(self._local, 'schema', None)
+        if schema is None:
+            try:
+                schema = self._compile()
+            except etree.XMLSchemaParseError as e:
+                logging.debug('Compiling schema of the thread failed, using the shared one: %s', e)
+                schema = self._shared
+            self._local.schema = schema
+        return self._validate(schema, xml)
+
+
+_cvrf_schemas = {}
+_cvrf_schemas_lock = threading.Lock()
+
+
+class _CatalogResolver(etree.Resolver):
+    """
+    Resolves the imported schemata using the uri entries of an XML catalog.
+    libxml2 reads XML_CATALOG_FILES only once per process, so the catalog is applied by lxml
+    instead, which allows compiling schemata of several CVRF versions in one process.
+    """
+
+    def __init__(self, catalog_file):
+        super().__init__()
+        catalog_dir = os.path.dirname(os.path.abspath(catalog_file))
+        self.uris = {uri.get('name'): os.path.join(catalog_dir, uri.get('uri'))
+                     for uri in etree.parse(catalog_file).iterfind(
+                         '{urn:oasis:names:tc:entity:xmlns:xml:catalog}uri')}
+
+    def resolve(self, system_url, public_id, context):
+        """ Returns the local copy of a schema listed in the catalog, None for others. """
+        # pylint: disable=unused-argument
+        if system_url in self.uris:
+            return self.resolve_filename(self.uris[system_url], context)
+        return None
+
+
+def _compile_cvrf_schema(version, catalog_file) -> etree.XMLSchema:
+    schema_file = get_package_file(CVRF_SCHEMATA[version][0])
+    logging.debug('Compiling CVRF %s schema %s using catalog %s.', version, schema_file,
+                  catalog_file)
+
+    parser = etree.XMLParser(no_network=True)
+    parser.resolvers.add(_CatalogResolver(catalog_file))
+    return etree.XMLSchema(etree.parse(schema_file, parser))
+
+
+def get_cvrf_schema(version='1.2', catalog_file=None) -> CompiledXMLSchema:
+    """
+    Returns compiled CVRF schema for the given version and XML catalog (default catalog
+    of the version if not given). The schema is compiled lazily on the first call.
+    """
+    key = (version, catalog_file)
+    schema = _cvrf_schemas.get(key)
+    if schema is None:
+        with _cvrf_schemas_lock:
+            # another thread might have compiled it while we were waiting for the lock
+            schema = _cvrf_schemas.get(key)
+            if schema is None:
+                schema = CompiledXMLSchema(functools.partial(
+                    _compile_cvrf_schema, version,
+                    catalog_file or get_package_file(CVRF_SCHEMATA[version][1])))
+                _cvrf_schemas[key] = schema
+
+    return schema
+
+
+# pylint: disable=invalid-name
+_csaf_validator = None
+_csaf_validator_lock = threading.Lock()
+
+
+def get_csaf_validator():
+    """
+    Returns validator (jsonschema Draft202012Validator) of the CSAF JSON schema. The schema is
+    loaded and checked against the meta-schema on the first call only, then the validator
+    is reused for every document. jsonschema is imported on the first call as well, it is slow
+    to import and not needed when the output is not validated.
+    raise: SchemaError if the CSAF schema itself is invalid
+    """
+    # pylint: disable=global-statement
+    global _csaf_validator
+    if _csaf_validator is None:
+        with _csaf_validator_lock:
+            if _csaf_validator is None:
+                # pylint: disable=import-outside-toplevel
+                from jsonschema import Draft202012Validator
+
+                with open(get_package_file(CSAF_SCHEMA), encoding='utf-8') as f:
+                    csaf_schema_content = json.load(f)
+
+                Draft202012Validator.check_schema(csaf_schema_content)
+                _csaf_validator = Draft202012Validator(
+                    csaf_schema_content, format_checker=Draft202012Validator.FORMAT_CHECKER)
+
+    return _csaf_validator
+
+
+def warm_up(cvrf_versions=('1.2',)):
+    """
+    Compiles the schemata in advance, so that long-running processes (e.g. batch workers)
+    pay the compilation cost once, before the first document arrives.
+    """
+    for version in cvrf_versions:
+        get_cvrf_schema(version)
+
+    get_csaf_validator()
@@ -0,0 +1,43 @@
+"""
+Module serializing CSAF documents into JSON bytes. The output is serialized once and the bytes
+are written to the output file, printed and sent by the server as they are.
+orjson is used if it is installed (pip install cvrf2csaf[fast]), it is several times faster than
+the json module, which is used otherwise. The backends produce byte-identical output for CSAF
+documents, whose only numbers are CVSS scores (floats written in exponent notation, i.e. below
+1e-4 or from 1e16 up, are formatted differently, e.g. 1e-05 by json and 1e-5 by orjson).
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_dumps(obj, output_format) -> bytes:
+    if output_format == 'compact':
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def _orjson_dumps(obj, output_format) -> bytes:
+    try:
+        # pylint: disable=no-member
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if output_format == 'json' else 0)
+    except TypeError:
+        # orjson.JSONEncodeError, e.g. integers over 64 bits, which the json module serializes
+        return _json_dumps(obj, output_format)
+
+
+# Serialization backends by name, each takes the object and the output format
+# ('json' indented by 2 spaces, 'compact' without whitespace) and returns UTF-8 encoded JSON
+BACKENDS = {'json': _json_dumps}
+if orjson is not None:
+    BACKENDS['orjson'] = _orjson_dumps
+
+DEFAULT_BACKEND = 'orjson' if 'orjson' in BACKENDS else 'json'
+
+
+def dumps(obj, output_format='json', backend=DEFAULT_BACKEND) -> bytes:
+    """ Returns obj serialized into JSON in the output format, see BACKENDS. """
+    return BACKENDS[backend](obj, output_format)
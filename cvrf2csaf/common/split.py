@@ -0,0 +1,169 @@
+"""
+Module splitting a converted CSAF document into one document per vulnerability
+(--split-vulnerabilities). Each document keeps the shared document metadata, gets a tracking ID
+derived from the original one and only the product tree entries its vulnerability references.
+"""
+from .utils import create_file_name
+
+
+def _collect_references(vulnerability):
+    """ Returns tuple (product IDs, group IDs) referenced by the CSAF vulnerability. """
+    product_ids = set()
+    group_ids = set()
+    for ids in vulnerability.get('product_status', {}).values():
+        product_ids.update(ids)
+    for score in vulnerability.get('scores', []):
+        product_ids.update(score.get('products', []))
+    for section in ('flags', 'remediations', 'threats'):
+        for item in vulnerability.get(section, []):
+            product_ids.update(item.get('product_ids', []))
+            group_ids.update(item.get('group_ids', []))
+    return product_ids, group_ids
+
+
+# pylint: disable=too-few-public-methods
+class ProductTreeIndex:
+    """
+    Index of the definitions in a CSAF product_tree by product and group ID, computed once
+    for the whole document. A product is located in the branches by the path of branch
+    indices leading to it, so a tree pruned to a few products is built without searching.
+    If an ID is defined more than once (reported by the conversion), the first one is used.
+    """
+
+    def __init__(self, product_tree):
+        self.product_tree = product_tree
+        self.branch_paths = {}
+        self.full_product_names = {}
+        self.relationships = {}
+        self.product_groups = {}
+
+        self._index_branches(product_tree.get('branches') or [], ())
+        for index, full_product_name in enumerate(product_tree.get('full_product_names', [])):
+            self.full_product_names.setdefault(full_product_name['product_id'], index)
+        for index, relationship in enumerate(product_tree.get('relationships', [])):
+            self.relationships.setdefault(relationship['full_product_name']['product_id'], index)
+        for index, product_group in enumerate(product_tree.get('product_groups', [])):
+            self.product_groups.setdefault(product_group['group_id'], index)
+
+    def _index_branches(self, branches, path):
+        for index, branch in enumerate(branches):
+            if 'product' in branch:
+                self.branch_paths.setdefault(branch['product']['product_id'], path + (index,))
+            elif branch.get('branches'):
+                self._index_branches(branch['branches'], path + (index,))
+
+    def _closure(self, product_ids, group_ids):
+        """
+        Adds the products of the referenced groups and the products referenced by the
+        relationships defining the referenced products, transitively.
+        """
+        product_ids = set(product_ids)
+        group_ids = {group_id for group_id in group_ids if group_id in self.product_groups}
+        for group_id in group_ids:
+            product_group = self.product_tree['product_groups'][self.product_groups[group_id]]
+            product_ids.update(product_group['product_ids'])
+
+        pending = list(product_ids)
+        while pending:
+            product_id = pending.pop()
+            if product_id not in self.relationships:
+                continue
+            relationship = self.product_tree['relationships'][self.relationships[product_id]]
+            for reference in (relationship['product_reference'],
+                              relationship['relates_to_product_reference']):
+                if reference not in product_ids:
+                    product_ids.add(reference)
+                    pending.append(reference)
+
+        return product_ids, group_ids
+
+    def prune(self, product_ids, group_ids) -> dict:
+        """
+        Returns product_tree with only the definitions of the products and groups
+        and of the products they depend on, in their original order. Undefined IDs are skipped.
+        """
+        product_ids, group_ids = self._closure(product_ids, group_ids)
+        pruned = {}
+        for key, value in self.product_tree.items():
+            if key == 'branches':
+                paths = sorted(self.branch_paths[product_id] for product_id in product_ids
+                               if product_id in self.branch_paths)
+                value = _prune_branches(value, paths)
+            elif key == 'full_product_names':
+                value = _pick(value, self.full_product_names, product_ids)
+            elif key == 'relationships':
+                value = _pick(value, self.relationships, product_ids)
+            elif key == 'product_groups':
+                value = _pick(value, self.product_groups, group_ids)
+            if value:
+                pruned[key] = value
+        return pruned
+
+
+def _pick(items, index, ids) -> list:
+    return [items[i] for i in sorted(index[item_id] for item_id in ids if item_id in index)]
+
+
+def _prune_branches(branches, paths) -> list:
+    """ Returns branches leading to the leaves at the sorted paths of branch indices. """
+    pruned = []
+    start = 0
+    while start < len(paths):
+        index = paths[start][0]
+        end = start
+        while end < len(paths) and paths[end][0] == index:
+            end += 1
+        branch = branches[index]
+        sub_paths = [path[1:] for path in paths[start:end] if len(path) > 1]
+        if sub_paths:
+            branch = {key: _prune_branches(value, sub_paths) if key == 'branches' else value
+                      for key, value in branch.items()}
+        pruned.append(branch)
+        start = end
+    return pruned
+
+
+def _derived_tracking_id(tracking_id, vulnerability, index, used_names) -> str:
+    """
+    Returns tracking ID of the document with the vulnerability at the index (from 0).
+    The IDs are unique by the names of the output files, which ignore e.g. the letter case.
+    """
+    suffix = vulnerability.get('cve') or f'vulnerability-{index + 1}'
+    base_id = f'{tracking_id}-{suffix}' if tracking_id else suffix
+    derived_id = base_id
+    number = index + 1
+    while create_file_name(derived_id, True) in used_names:
+        # e.g. the same CVE in more Vulnerability elements
+        derived_id = f'{base_id}-{number}'
+        number += 1
+    used_names.add(create_file_name(derived_id, True))
+    return derived_id
+
+
+def split_document(final_csaf) -> list:
+    """
+    Splits the CSAF document into one document per vulnerability. The documents share the
+    unchanged parts of final_csaf (document metadata, vulnerabilities, product tree entries),
+    they must not be modified in place.
+    return: list of the CSAF documents, in the order of the vulnerabilities
+    """
+    document = final_csaf['document']
+    tracking = document.get('tracking', {})
+    tracking_id = tracking.get('id')
+    index = ProductTreeIndex(final_csaf.get('product_tree', {}))
+
+    documents = []
+    used_names = set()
+    for i, vulnerability in enumerate(final_csaf.get('vulnerabilities', [])):
+        split_tracking = {**tracking,
+                          'id': _derived_tracking_id(tracking_id, vulnerability, i, used_names)}
+        split_csaf = {key: value for key, value in final_csaf.items()
+                      if key not in ('product_tree', 'vulnerabilities')}
+        split_csaf['document'] = {**document, 'tracking': split_tracking}
+        product_tree = index.prune(*_collect_references(vulnerability))
+        if product_tree:
+            split_csaf['product_tree'] = product_tree
+        split_csaf['vulnerabilities'] = [vulnerability]
+        documents.append(split_csaf)
+
+    return documents
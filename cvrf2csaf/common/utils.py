@@ -1,24 +1,65 @@
 """Module containing various helper functions."""
-import json
+import functools
+import importlib
 import logging
 import os
 import re
-import sys
 
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime, timezone
+from importlib import metadata
 
 import yaml
-import pkg_resources
 
 from .common import SectionHandler
+from .schemas import get_package_file
+from .serialization import dumps
+
+
+# Output formats (config output_format, --output-format): indented or compact JSON
+OUTPUT_FORMATS = ('json', 'compact')
+
+# Output compressions (config output_compression, --output-compression):
+# file suffix and module compressing the output, the module is imported when it is used
+OUTPUT_COMPRESSIONS = {
+    'none': ('', None),
+    'gzip': ('.gz', 'gzip'),
+    'bz2': ('.bz2', 'bz2'),
+    'xz': ('.xz', 'lzma'),
+}
+
+# Compressions of the input recognized by their magic bytes, see open_input
+INPUT_COMPRESSIONS = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+)
+_MAGIC_SIZE = max(len(magic) for magic, _ in INPUT_COMPRESSIONS)
+
+# Names of the input files converted in batch mode, plain or compressed CVRF documents
+INPUT_SUFFIXES = ('.xml', '.xml.gz', '.xml.bz2', '.xml.xz', '.xml.zst')
+
+
+class CriticalExit(SystemExit):
+    """ Raised by critical_exit(). Behaves like sys.exit(status_code), but keeps the message
+     so that callers converting multiple documents can report it and carry on. """
+
+    def __init__(self, msg, status_code=1):
+        super().__init__(status_code)
+        self.msg = msg
+
+    def __reduce__(self):
+        # keeps the message when raised in a worker process
+        return type(self), (self.msg, self.code)
 
 
 def critical_exit(msg, status_code=1):
     """ A critical error encountered, converter is not able to proceed and exits
      with a status code (default 1) """
     logging.critical(msg)
-    sys.exit(status_code)
+    raise CriticalExit(msg, status_code)
 
 
 # pylint: disable=inconsistent-return-statements
@@ -41,18 +82,25 @@ def handle_boolean_config_values(key, val):
                       f"Invalid value for config key {key}: {val} {e}.")
 
 
+@functools.lru_cache(maxsize=None)
+def get_pkg_version() -> str:
+    """ Returns version of the installed package, read from its metadata once. """
+    return metadata.version('cvrf2csaf')
+
+
 def get_config_from_file() -> dict:
     """ Loads configuration file. Parts of it can be overwritten by CLI arguments. """
     config = {}
     try:
         # pylint: disable=fixme
         # TODO: Workaround for now, config file placement is to be discussed
-        req = pkg_resources.Requirement.parse('cvrf2csaf')
-        path_to_conf = pkg_resources.resource_filename(req, 'cvrf2csaf/config/config.yaml')
+        path_to_conf = get_package_file('config/config.yaml')
         with open(path_to_conf, 'r', encoding='utf-8') as f:
             config = yaml.safe_load(f)
 
-        for key in ['force', 'fix_insert_current_version_into_revision_history']:
+        for key in ['force', 'fix_insert_current_version_into_revision_history',
+                    'mandatory_tests_fail_fast', 'compact_parser', 'merge_CVSS_score_sets',
+                    'low_memory', 'compute_CVSS_scores']:
             if key in config.keys():
                 config[key] = handle_boolean_config_values(key=key, val=config[key])
 
@@ -62,11 +110,12 @@ def get_config_from_file() -> dict:
     return config
 
 
-def create_file_name(document_tracking_id, valid_output):
+def create_file_name(document_tracking_id, valid_output, compression='none'):
     """
     Returns filename according to standard:
     https://docs.oasis-open.org/csaf/csaf/v2.0/csaf-v2.0.html#51-filename
     if valid_input is false, `_invalid ` is appended to filename.
+    Compressed output gets the suffix of the compression after `.json`, e.g. `.json.gz`.
     """
     if document_tracking_id is not None:
         file_name = re.sub(r"([^+\-a-z0-9]+)", '_', document_tracking_id.lower())
@@ -75,29 +124,192 @@ def create_file_name(document_tracking_id, valid_output):
 
     if not valid_output:
         file_name = f'{file_name}_invalid'
-    file_name = f'{file_name}.json'
+    file_name = f'{file_name}.json{OUTPUT_COMPRESSIONS[compression][0]}'
     return file_name
 
 
-def store_json(json_dict, fpath):
-    """ Saves json to file, creates directory if needed."""
+def open_output(fpath, compression='none', mode='wb'):
+    """
+    Opens the output file compressed by the compression, in binary mode by default.
+    Data written to the file object is compressed as it is written.
+    mode 'rb' opens the output for reading, 'w' and 'r' open it as UTF-8 text.
+    """
+    encoding = None if 'b' in mode else 'utf-8'
+    module_name = OUTPUT_COMPRESSIONS[compression][1]
+    if module_name is None:
+        # pylint: disable=unspecified-encoding
+        return open(fpath, mode, encoding=encoding)
+    if encoding is not None:
+        mode = f'{mode}t'
+    return importlib.import_module(module_name).open(fpath, mode, encoding=encoding)
+
+
+# pylint: disable=too-few-public-methods
+class _DecompressedInput:
+    """
+    Readable stream decompressing the compressed stream as it is read. Errors of the
+    decompression are raised as OSError, like the errors of reading the input itself.
+    """
+
+    def __init__(self, stream, compression):
+        self.stream = stream
+        self.compression = compression
+
+    def read(self, size=-1):
+        """ Reads up to size bytes of the decompressed input. """
+        try:
+            return self.stream.read(size)
+        except OSError:
+            raise
+        # pylint: disable=broad-except
+        except Exception as e:
+            # e.g. EOFError of a truncated input or zlib.error, lzma.LZMAError, ZstdError
+            raise OSError(f'{self.compression} decompression failed: {e}') from e
+
+
+def _input_compression(stream):
+    """ Returns the compression of the stream recognized by its first bytes, None if plain. """
+    if stream.seekable():
+        position = stream.tell()
+        head = stream.read(_MAGIC_SIZE)
+        stream.seek(position)
+    elif hasattr(stream, 'peek'):
+        head = stream.peek(_MAGIC_SIZE)
+    else:
+        return None
+    return next((compression for magic, compression in INPUT_COMPRESSIONS
+                 if head.startswith(magic)), None)
+
+
+def _open_decompressed(stream, compression):
+    if compression == 'zstd':
+        try:
+            # pylint: disable=import-outside-toplevel
+            import zstandard
+        except ImportError:
+            critical_exit('The input is zstd compressed, decompressing it needs the zstandard'
+                          ' package: pip install cvrf2csaf[zstd]')
+        return zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True,
+                                                          closefd=False)
+    return importlib.import_module(OUTPUT_COMPRESSIONS[compression][1]).open(stream, 'rb')
+
+
+@contextmanager
+def open_input(source):
+    """
+    Opens the input document given as path or binary file object for parsing.
+    Inputs compressed by gzip, bz2, xz or zstd (the latter needs the zstandard package) are
+    recognized by their magic bytes, not by the file name, and yielded as a stream decompressing
+    them as they are read, so the parser gets the document in chunks, never decompressed as
+    a whole in memory or on disk. Plain inputs are yielded as they are, so that lxml reads
+    the files by itself. File objects given by the caller are not closed.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            if _input_compression(f) is not None:
+                # pylint: disable=contextmanager-generator-missing-cleanup
+                with open_input(f) as decompressed:
+                    yield decompressed
+                return
+        yield source
+        return
+
+    compression = _input_compression(source)
+    if compression is None:
+        yield source
+        return
+    # closing the decompressor leaves the source open
+    with _open_decompressed(source, compression) as decompressed:
+        yield _DecompressedInput(decompressed, compression)
+
+
+def _prepare_output_file(fpath, compression='none'):
+    """ Creates output directory if needed, warns about overwriting and wrong suffix. """
+    path = Path(fpath)
+    base_dir = path.parent.absolute()
+
+    if not os.path.exists(base_dir):
+        os.mkdir(base_dir)
+        print(f"Created output folder {base_dir}.")
+
+    if os.path.exists(fpath):
+        logging.warning("Output %s already exists. Overwriting it.", fpath)
+
+    suffix = f'.json{OUTPUT_COMPRESSIONS[compression][0]}'
+    if not fpath.lower().endswith(suffix):
+        logging.warning("Given output file %s does not contain valid %s suffix.", fpath, suffix)
+
+
+def store_json(json_dict, fpath, output_format='json', compression='none') -> bytes:
+    """
+    Saves json to file, creates directory if needed.
+    output_format 'json' is indented, 'compact' has no whitespace, see OUTPUT_FORMATS.
+    The output is compressed as it is written if compression is given, see OUTPUT_COMPRESSIONS.
+    return: the serialized (uncompressed) JSON, e.g. to be printed without serializing it again
+    """
     try:
+        output = dumps(json_dict, output_format)
+    # pylint: disable=broad-except
+    except Exception as e:
+        critical_exit(f"Writing output file {fpath} failed. {e}")
 
-        path = Path(fpath)
-        base_dir = path.parent.absolute()
+    write_json(output, fpath, compression)
+    return output
 
-        if not os.path.exists(base_dir):
-            os.mkdir(base_dir)
-            print(f"Created output folder {base_dir}.")
 
-        if os.path.exists(fpath):
-            logging.warning("Output %s already exists. Overwriting it.", fpath)
+def write_json(output, fpath, compression='none'):
+    """ Saves JSON serialized by dumps() to file like store_json, e.g. by another process. """
+    try:
+        _prepare_output_file(fpath, compression)
 
-        if not fpath.lower().endswith('.json'):
-            logging.warning("Given output file %s does not contain valid .json suffix.", fpath)
+        with open_output(fpath, compression) as f:
+            f.write(output)
+            logging.info("Successfully wrote %s.", fpath)
+
+    # pylint: disable=broad-except
+    except Exception as e:
+        critical_exit(f"Writing output file {fpath} failed. {e}")
+
+
+_NO_ITEM = object()
+
+
+# pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+def store_json_incremental(json_dict, key, items, fpath, output_format='json', compression='none'):
+    """
+    Saves json to file like store_json, with json_dict[key] being a list which is written
+    item by item as the items iterable produces them, so the list is never held in memory.
+    The output is byte-identical to store_json({**json_dict, key: list(items)}), or to
+    store_json(json_dict) if there are no items, in the same output_format and compression.
+    """
+    indented = output_format != 'compact'
+    separator = b': ' if indented else b':'
+
+    def newline(level):
+        return b'\n' + b'  ' * level if indented else b''
+
+    def dumps_at(value, level):
+        # JSON strings never contain raw line breaks, so each line can be re-indented
+        return dumps(value, output_format).replace(b'\n', newline(level))
+
+    items = iter(items)
+    try:
+        _prepare_output_file(fpath, compression)
 
-        with open(fpath, 'w', encoding='utf-8') as f:
-            json.dump(json_dict, f, ensure_ascii=False, indent=2)
+        with open_output(fpath, compression) as f:
+            first_item = next(items, _NO_ITEM)
+            if first_item is _NO_ITEM:
+                f.write(dumps(json_dict, output_format))
+            else:
+                f.write(b'{')
+                for json_key, value in json_dict.items():
+                    f.write(newline(1) + dumps_at(json_key, 1) + separator + dumps_at(value, 1)
+                            + b',')
+                f.write(newline(1) + dumps_at(key, 1) + separator + b'[' + newline(2)
+                        + dumps_at(first_item, 2))
+                for item in items:
+                    f.write(b',' + newline(2) + dumps_at(item, 2))
+                f.write(newline(1) + b']' + newline(0) + b'}')
             logging.info("Successfully wrote %s.", fpath)
 
     # pylint: disable=broad-except
@@ -118,8 +330,7 @@ def get_utc_timestamp(time_stamp='now'):
         try:
             now = datetime.fromisoformat(time_stamp)
         except (ValueError, TypeError) as e:
-            logging.error('invalid time stamp provided %s: %s.', time_stamp, e)
-            SectionHandler.error_occurred = True
+            SectionHandler.report_error('invalid time stamp provided %s: %s.', time_stamp, e)
             return None
 
     if now.tzinfo is None:
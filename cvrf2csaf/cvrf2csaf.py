@@ -1,272 +1,54 @@
-""" Module containing DocumentHandler class taking care of conversion.
-    Program's top-level logic is done in main() function.
-"""
-# pylint: disable=c-extension-no-member
+""" Module containing the program's top-level logic, done in main() function. """
 import logging
 import argparse
-import json
 import os
-import re
-import turvallisuusneuvonta as mandatory_tests
-
-from lxml import etree
-from lxml import objectify
-from jsonschema import Draft202012Validator, ValidationError, SchemaError
-from pkg_resources import get_distribution, Requirement, resource_filename
-
-from .common.utils import get_config_from_file, store_json, critical_exit, create_file_name
-
-from .section_handlers.document_leaf_elements import DocumentLeafElements
-from .section_handlers.acknowledgments import Acknowledgments
-from .section_handlers.notes import Notes
-from .section_handlers.document_publisher import DocumentPublisher
-from .section_handlers.references import References
-from .section_handlers.document_tracking import DocumentTracking
-from .section_handlers.product_tree import ProductTree
-from .section_handlers.vulnerability import Vulnerability
-from .common.common import SectionHandler
+import shutil
+import sys
+
+from .common.cache import get_cache
+from .common.profiling import Profile, store_profile_reports
+from .common.utils import OUTPUT_COMPRESSIONS, OUTPUT_FORMATS, get_config_from_file, \
+    get_pkg_version, critical_exit, open_output
+from .document_handler import VALIDATION_LEVELS, DocumentHandler, convert_and_store, \
+    convert_and_store_split
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(module)s - %(levelname)s - %(message)s')
 
-
-# pylint: disable=too-many-instance-attributes
-class DocumentHandler:
-    """
-    Main Handler of the conversion:
-    1. Reads/Parses/Validates CVRF XML input
-    2. Iterates over each first-level XML section
-    3. Each first-level XML section has its class and its methods are responsible for
-       converting the content
-    4. Collecting the output of each mapper class, which consists of the CSAF2.0 JSON equivalent
-    5. Combining it to the final JSON and writing the result to a file
-    """
-
-    TOLERATED_ERRORS_SUBSTR = [
-        "}ScoreSetV3': This element is not expected. Expected is one of"
-        " ( {http://docs.oasis-open.org/csaf/ns/csaf-cvrf/v1.2/vuln}ScoreSetV2,"
-        " {http://docs.oasis-open.org/csaf/ns/csaf-cvrf/v1.2/vuln}ScoreSetV3 ).",
-        "}ScoreSetV3': This element is not expected. Expected is "
-        "( {http://docs.oasis-open.org/csaf/ns/csaf-cvrf/v1.2/vuln}ScoreSetV3 ).",
-        r"is not accepted by the pattern '[c][pP][eE]:/[AHOaho]?(:[A-Za-z0-9\._\-~%]*){0,6}'."]
-
-    PACKAGE_NAME = 'cvrf2csaf'
-
-    SCHEMA_FILE = resource_filename(Requirement.parse(PACKAGE_NAME),
-                                    f'{PACKAGE_NAME}/schemata/cvrf/1.2/cvrf.xsd')
-    CATALOG_FILE = resource_filename(Requirement.parse(PACKAGE_NAME),
-                                     f'{PACKAGE_NAME}/schemata/catalog_1_2.xml')
-
-    # Content copied from
-    # https://github.com/secvisogram/secvisogram/blob/main/app/lib/app/shared/Core/csaf_2.0_strict.json
-    CSAF_SCHEMA_FILE = resource_filename(Requirement.parse(PACKAGE_NAME),
-                                         f'{PACKAGE_NAME}'
-                                         f'/schemata/csaf/2.0/csaf_json_schema_strict.json')
-
-    def __init__(self, config, pkg_version):
-        self.document_leaf_elements = DocumentLeafElements(config)
-        self.document_acknowledgments = Acknowledgments()
-        self.document_notes = Notes()
-        self.document_publisher = DocumentPublisher(config)
-        self.document_references = References(config)
-        self.document_tracking = DocumentTracking(config, pkg_version)
-        self.product_tree = ProductTree()
-        self.vulnerability = Vulnerability(config)
-
-        self.sections_handlers = {
-            'Acknowledgments': self.document_acknowledgments,
-            'DocumentNotes': self.document_notes,
-            'DocumentPublisher': self.document_publisher,
-            'DocumentReferences': self.document_references,
-            'DocumentTracking': self.document_tracking,
-            'ProductTree': self.product_tree,
-            'Vulnerability': self.vulnerability,
-        }
-
-    def _update_cvssv3_version_from_schema(self, root_element):
-        """ Tries to update CVSS 3.x version from schema."""
-        cvss_3_regex = r'.*cvss-v(3\.[01]).*'
-
-        potential_cvss3 = None
-
-        # iterate over  namespaces
-        for name_space in root_element.nsmap.values():
-            match = re.match(cvss_3_regex, name_space)
-            if match:
-                cvss_version_matched = match.groups()[0]
-                # no potential cvss version found yet -> store it
-                if not potential_cvss3:
-                    potential_cvss3 = cvss_version_matched
-                # already have some version, but it's the same as currently matched -> ok, continue
-                elif potential_cvss3 == cvss_version_matched:
-                    continue
-                # else we have two different potential cvss versions -> skip this step completely
-                else:
-                    return
-
-        if potential_cvss3:
-            logging.info('Default CVSS v3.x version set to %s based on document XML schemas.',
-                         potential_cvss3)
-            self.vulnerability.default_cvss_version = potential_cvss3
-
-    def _parse(self, root):
-        self._update_cvssv3_version_from_schema(root)
-
-        # Document leaf elements are handled on the root itself
-        self.document_leaf_elements.create_csaf(root)
-
-        # For children of the root element with a deeper structure,
-        # dedicated section handlers are used
-        for elem in root.iterchildren():
-            # get tag name without its namespace, don't use elem.tag here
-            tag = etree.QName(elem).localname
-            tag_handler = self.sections_handlers.get(tag)
-
-            if tag_handler:
-                tag_handler.create_csaf(root_element=elem)
-
-    def _compose_final_csaf(self) -> dict:
-        # Merges first level leaves into final CSAF document.
-        # [mapping table](https://github.com/tschmidtb51/csaf/blob/csaf-2.0-what-is-new-table
-        # /notes/whats-new-csaf-v2.0-cn01.md#e4-mapped-elements)
-
-        final_csaf = {'document': {}}
-        final_csaf['document'] = self.document_leaf_elements.csaf
-
-        section_mappings = (
-            (final_csaf['document'], 'publisher', self.document_publisher.csaf),
-            (final_csaf['document'], 'tracking', self.document_tracking.csaf),
-            (final_csaf['document'], 'notes', self.document_notes.csaf),
-            (final_csaf['document'], 'references', self.document_references.csaf),
-            (final_csaf['document'], 'acknowledgments', self.document_acknowledgments.csaf),
-            (final_csaf, 'product_tree', self.product_tree.csaf),
-            (final_csaf, 'vulnerabilities', self.vulnerability.csaf),
-        )
-
-        for root, section, csaf_content in section_mappings:
-            if csaf_content:
-                root[section] = csaf_content
-
-        return final_csaf
-
-    @classmethod
-    def _tolerate_errors(cls, error_list):
-        tolerated_errors = [error for error in error_list if any(
-            error_substr in error.message for error_substr in
-            DocumentHandler.TOLERATED_ERRORS_SUBSTR)]
-        if len(tolerated_errors) > 0:
-            logging.warning('Tolerating errors: %s.', tolerated_errors)
-        return set(tolerated_errors) == set(error_list)
-
-    @classmethod
-    def _validate_input_against_schema(cls, xml_objectified):
-        with open(cls.SCHEMA_FILE, encoding='utf-8') as f:
-            os.environ.update(XML_CATALOG_FILES=cls.CATALOG_FILE)
-            schema = etree.XMLSchema(file=f)
-
-        try:
-            schema.assertValid(xml_objectified)
-            logging.info('Input XSD validation OK.')
-            return True
-        except etree.DocumentInvalid:
-            errors = list(schema.error_log)
-
-        if not DocumentHandler._tolerate_errors(errors):
-            logging.error('Errors during input validation occurred, reason(s): %s.', errors)
-            return False
-
-        return True
-
-    @classmethod
-    def _open_and_validate_file(cls, file_path):
-        try:
-            parser = objectify.makeparser(resolve_entities=False, no_network=True)
-            xml_objectified = objectify.parse(file_path, parser)
-        except (OSError, etree.LxmlError) as e:
-            critical_exit(f'Failed to open input file {file_path}: {e}.')
-
-        if not DocumentHandler._validate_input_against_schema(xml_objectified):
-            critical_exit('Input document not valid.')
-
-        return xml_objectified.getroot()
-
-    def convert_file(self, path) -> dict:
-        """Wrapper to read/parse CVRF and parse it to CSAF JSON structure"""
-        root = DocumentHandler._open_and_validate_file(path)
-
-        self._parse(root)
-
-        return self._compose_final_csaf()
-
-    def validate_output_against_schema(self, final_csaf) -> bool:
-        """
-        Validates the CSAF output against the CSAF JSON schema
-        return: True if valid, False if invalid
-        """
-        with open(self.CSAF_SCHEMA_FILE, encoding='utf-8') as f:
-            csaf_schema_content = json.loads(f.read())
-
-        try:
-            Draft202012Validator.check_schema(csaf_schema_content)
-            validator = Draft202012Validator(csaf_schema_content,
-                                             format_checker=Draft202012Validator.FORMAT_CHECKER)
-            validator.validate(final_csaf)
-        except SchemaError as e:
-            logging.error(
-                'CSAF schema validation error. Provided CSAF schema is invalid. Message: %s',
-                e.message)
-            return False
-        except ValidationError as e:
-            logging.error('CSAF schema validation error. Path: %s. Message: %s.', e.json_path,
-                          e.message)
-            return False
-
-        logging.info('CSAF schema validation OK.')
-        return True
-
-    @staticmethod
-    def validate_mandatory_tests(final_csaf):
-        """
-        Validates output against mandatory tests:
-        https://docs.oasis-open.org/csaf/csaf/v2.0/csaf-v2.0.html#61-mandatory-tests
-        """
-        # pylint: disable=fixme
-        # TODO: After the turvallisuusneuvonta package is complete and part of the csaf package,
-        #  replace the implementation
-        # For now we fetch the tests like this to see which failed
-        passed = True
-        for m_test_str in mandatory_tests.__all__:
-            # Skip translator function since translator value cannot appear on the input
-            # Skip is_valid which calls all the tests (but doesn't produce any output)
-            if m_test_str in ['is_valid', 'is_valid_translator']:
-                continue
-            m_test_call = getattr(mandatory_tests, m_test_str)
-            if not m_test_call(final_csaf):
-                passed = False
-                logging.error('Mandatory test %s failed.', m_test_str)
-
-        return passed
-
-
-# pylint: disable=missing-function-docstring
-def main():
-    # General args
-    parser = argparse.ArgumentParser(
-        description='Converts CVRF 1.2 XML input into CSAF 2.0 JSON output.')
-    parser.add_argument('-v', '--version', action='version',
-                        version=str(get_distribution('cvrf2csaf').version))
-    parser.add_argument('--input-file', dest='input_file', type=str, required=True,
-                        help="CVRF XML input file to parse", metavar='PATH')
-    parser.add_argument('--output-dir', dest='output_dir', type=str, default='./', metavar='PATH',
-                        help="CSAF output dir to write to."
-                             " Filename is derived from /document/tracking/id.")
-    parser.add_argument('--print', dest='print', action='store_true', default=False,
-                        help="Additionally prints CSAF JSON output on stdout.")
-    parser.add_argument('--force', action='store_const', const='cmd-arg-entered',
-                        help="If used, the converter produces output even if it is invalid "
-                             "(errors occurred during conversion). "
-                             "Target use case: best-effort conversion to JSON, "
-                             "fix the errors manually, e.g. in Secvisogram.")
+__all__ = ['DocumentHandler', 'main']
+
+
+def _add_conversion_arguments(parser):
+    """ Adds options of the conversion itself, shared by the CLI and the server. """
+    parser.add_argument('--validate', dest='validate', choices=list(VALIDATION_LEVELS),
+                        help="Checks to perform: input XSD validation only (input), output JSON"
+                             " schema validation only (output), mandatory tests only (mandatory),"
+                             " all of them (full) or none. Skipped checks are considered passed."
+                             " Default is full.")
+
+    parser.add_argument('--vulnerability-jobs', dest='vulnerability_jobs', type=int, metavar='N',
+                        help="Number of processes converting the Vulnerability elements of"
+                             " a document. Pays off only for documents with hundreds of"
+                             " vulnerabilities. Default is 1 (serially).")
+
+    parser.add_argument('--compact-parser', action='store_const', const='cmd-arg-entered',
+                        help="Parses the input into plain lxml.etree elements without blank text,"
+                             " comments and processing instructions instead of lxml.objectify"
+                             " ones. Faster, produces the same output.")
+    parser.add_argument('--low-memory', action='store_const', const='cmd-arg-entered',
+                        help="Parses the input incrementally and frees each section as soon as"
+                             " it is converted, so that the input and output are not held in"
+                             " memory together. Reports peak memory usage.")
+
+    # Mandatory tests args
+    parser.add_argument('--mandatory-tests-jobs', dest='mandatory_tests_jobs', type=int,
+                        metavar='N',
+                        help="Number of processes running the mandatory tests of a document."
+                             " Pays off only for large documents. Default is 1 (serially).")
+    parser.add_argument('--mandatory-tests-fail-fast', action='store_const',
+                        const='cmd-arg-entered',
+                        help="Stops the mandatory tests at the first failure, when only"
+                             " pass/fail verdict is needed.")
 
     # Document Publisher args
     parser.add_argument('--publisher-name', dest='publisher_name', type=str,
@@ -292,59 +74,260 @@ def main():
                         const='cmd-arg-entered',
                         help="If vector is not present in CVSS ScoreSet, the converter removes"
                              " the whole ScoreSet instead of producing an error.")
+    parser.add_argument('--merge-CVSS-score-sets', action='store_const', const='cmd-arg-entered',
+                        help="Merges CVSS score sets of a vulnerability with the same version,"
+                             " vector and scores into one listing all their products.")
+    parser.add_argument('--compute-CVSS-scores', action='store_const', const='cmd-arg-entered',
+                        help="Computes CVSS scores from the vectors, fills in the missing ones and"
+                             " warns about the given ones differing from them.")
 
     parser.add_argument('--default-CVSS3-version', dest='default_CVSS3_version',
                         help="Default version used for CVSS version 3, when the version cannot be"
                              " derived from other sources. Default value is '3.0'.")
 
-    args = {k: v for k, v in vars(parser.parse_args()).items() if v is not None}
 
-    config = get_config_from_file()
+def _get_config(args):
+    """ Returns config file values overwritten by command line arguments and package version. """
+    args = {k: v for k, v in vars(args).items() if v is not None}
 
+    config = get_config_from_file()
     # Update & rewrite config file values with the ones from command line arguments
     config.update(args)
 
     # Boolean optional arguments that are also present in config need special treatment
-    if config['fix_insert_current_version_into_revision_history'] == 'cmd-arg-entered':
-        config['fix_insert_current_version_into_revision_history'] = True
-    if config['force_insert_default_reference_category'] == 'cmd-arg-entered':
-        config['force_insert_default_reference_category'] = True
-    if config['remove_CVSS_values_without_vector'] == 'cmd-arg-entered':
-        config['remove_CVSS_values_without_vector'] = True
-    if config['force'] == 'cmd-arg-entered':
-        config['force'] = True
+    for key in ('fix_insert_current_version_into_revision_history',
+                'force_insert_default_reference_category', 'remove_CVSS_values_without_vector',
+                'force', 'mandatory_tests_fail_fast', 'compact_parser', 'merge_CVSS_score_sets',
+                'low_memory', 'compute_CVSS_scores'):
+        if config[key] == 'cmd-arg-entered':
+            config[key] = True
+
+    for key, choices in (('validate', VALIDATION_LEVELS), ('output_format', OUTPUT_FORMATS),
+                         ('output_compression', OUTPUT_COMPRESSIONS)):
+        if config.get(key) not in choices:
+            critical_exit(f'Invalid {key} {config.get(key)}, expected one of:'
+                          f' {", ".join(choices)}.')
+    for key in ('cache_max_size', 'cache_max_age'):
+        if config.get(key) is not None and config[key] < 0:
+            critical_exit(f'Invalid {key} {config[key]}, it must not be negative.')
+    if config['vulnerability_jobs'] < 1:
+        critical_exit('Number of vulnerability jobs must be a positive integer.')
+    if config['mandatory_tests_jobs'] < 1:
+        critical_exit('Number of mandatory tests jobs must be a positive integer.')
+
+    return config, get_pkg_version()
+
+
+def serve(argv):
+    """ Runs the conversion server, see cvrf2csaf serve -h. """
+    # the server modules are needed only here, they are not imported by the plain conversion
+    # pylint: disable=import-outside-toplevel
+    from .server import DEFAULT_MAX_REQUEST_SIZE, run_server
 
-    if not os.path.isfile(config.get('input_file')):
-        critical_exit(f'Input file not found, check the path: {config.get("input_file")}')
+    parser = argparse.ArgumentParser(
+        prog='cvrf2csaf serve',
+        description='Serves conversion of CVRF 1.2 XML documents into CSAF 2.0 JSON over HTTP.'
+                    ' POST / with the CVRF document as body returns JSON with the CSAF document'
+                    ' ("csaf"), its validity ("valid") and the warnings and errors'
+                    ' ("messages").')
+    address_group = parser.add_mutually_exclusive_group()
+    address_group.add_argument('--port', dest='port', type=int, default=8080,
+                               help="TCP port to listen on. Default is 8080.")
+    address_group.add_argument('--unix-socket', dest='unix_socket', type=str, metavar='PATH',
+                               help="Listens on the UNIX socket instead of TCP port.")
+    parser.add_argument('--host', dest='host', type=str, default='127.0.0.1',
+                        help="Address to listen on. Default is 127.0.0.1 (localhost only).")
+    parser.add_argument('--workers', dest='workers', type=int, metavar='N',
+                        help="Number of worker processes converting the documents, i.e. maximum"
+                             " number of concurrent conversions. Default is the number of CPUs.")
+    parser.add_argument('--max-request-size', dest='max_request_size', type=int,
+                        default=DEFAULT_MAX_REQUEST_SIZE, metavar='BYTES',
+                        help="Larger requests are rejected with 413."
+                             f" Default is {DEFAULT_MAX_REQUEST_SIZE} bytes.")
+    _add_conversion_arguments(parser)
+
+    config, pkg_version = _get_config(parser.parse_args(argv))
+    run_server(config, pkg_version)
+
+
+def batch(config, pkg_version) -> int:
+    """
+    Converts multiple documents (or a single one into NDJSON), see the batch mode options.
+    return: exit status, 0 if all the documents were converted, 1 otherwise
+    """
+    # pylint: disable=import-outside-toplevel
+    from .batch import collect_input_files, run_batch, run_bulk
+
+    if config.get('jobs', 1) < 1:
+        critical_exit('Number of jobs must be a positive integer.')
+    if config.get('max_in_flight', 1) < 1:
+        critical_exit('Number of documents in flight must be a positive integer.')
+    if config.get('async_pipeline'):
+        # pylint: disable=import-outside-toplevel
+        from .aio import run_pipeline
+        return run_pipeline(config, pkg_version)
+    if config.get('input_archive') or config.get('output_ndjson'):
+        return run_bulk(config, pkg_version)
+    return run_batch(config, pkg_version, collect_input_files(config))
+
+
+def split(config, pkg_version) -> int:
+    """
+    Converts the input file into one CSAF document per vulnerability, see
+    --split-vulnerabilities.
+    return: exit status, 0 if all the split documents were written, 1 otherwise
+    """
+    input_file = config.get('input_file')
+    if not input_file:
+        critical_exit('--split-vulnerabilities is supported only with --input-file.')
+    if config.get('streaming'):
+        critical_exit('--split-vulnerabilities can not be used with --streaming.')
+    if config.get('jobs', 1) < 1:
+        critical_exit('Number of jobs must be a positive integer.')
+    if not os.path.isfile(input_file):
+        critical_exit(f'Input file not found, check the path: {input_file}')
+    for key in ('print', 'cache_dir'):
+        if config.get(key):
+            logging.warning('--%s is not supported with --split-vulnerabilities, ignoring it.',
+                            key.replace('_', '-'))
+
+    profile = Profile() if config.get('profile') else None
+    try:
+        results = convert_and_store_split(config, pkg_version, input_file, profile=profile)
+    finally:
+        if profile is not None:
+            store_profile_reports([profile.report()], config['profile'])
+
+    written = [valid for file_path, valid in results if file_path is not None]
+    if not results:
+        logging.warning('The document contains no vulnerabilities, no output was written.')
+    logging.info('Split %s into %s documents: %s written, %s of them invalid (--force),'
+                 ' %s not written.', input_file, len(results), len(written),
+                 written.count(False), len(results) - len(written))
+
+    return 0 if len(written) == len(results) else 1
+
+
+# pylint: disable=missing-function-docstring,too-many-statements
+def main():
+    if sys.argv[1:2] == ['serve']:
+        serve(sys.argv[2:])
+        return
 
-    # Get the version of the installed package
-    pkg_version = get_distribution('cvrf2csaf').version
+    # General args
+    parser = argparse.ArgumentParser(
+        description='Converts CVRF 1.2 XML input into CSAF 2.0 JSON output.')
+    parser.add_argument('-v', '--version', action='version',
+                        version=get_pkg_version())
+    input_group = parser.add_mutually_exclusive_group(required=True)
+    input_group.add_argument('--input-file', dest='input_file', type=str,
+                             help="CVRF XML input file to parse", metavar='PATH')
+    input_group.add_argument('--input-dir', dest='input_dir', type=str, metavar='PATH',
+                             help="Batch mode: converts all *.xml files (also compressed ones, e.g."
+                                  " *.xml.gz) in the directory.")
+    input_group.add_argument('--input-glob', dest='input_glob', type=str, metavar='PATTERN',
+                             help="Batch mode: converts all files matching the glob pattern,"
+                                  " '**' matches subdirectories recursively.")
+    input_group.add_argument('--input-list', dest='input_list', type=str, metavar='PATH',
+                             help="Batch mode: converts all files listed in the file"
+                                  " (one path per line), '-' reads the list from stdin.")
+    input_group.add_argument('--input-archive', dest='input_archive', type=str, metavar='PATH',
+                             help="Batch mode: converts all *.xml (also compressed) members"
+                                  " of the tar (also compressed) or zip archive without"
+                                  " unpacking it, '-' reads the archive or a single document"
+                                  " from stdin.")
+    parser.add_argument('--jobs', dest='jobs', type=int, metavar='N',
+                        help="Batch mode: number of worker processes converting the documents."
+                             " Split mode: number of worker processes validating and writing"
+                             " the split documents. Default is the number of CPUs.")
+    parser.add_argument('--output-dir', dest='output_dir', type=str, default='./', metavar='PATH',
+                        help="CSAF output dir to write to."
+                             " Filename is derived from /document/tracking/id.")
+    parser.add_argument('--output-format', dest='output_format', choices=OUTPUT_FORMATS,
+                        help="Format of the output: indented JSON (json) or JSON without any"
+                             " whitespace (compact). Default is json.")
+    parser.add_argument('--output-compression', dest='output_compression',
+                        choices=list(OUTPUT_COMPRESSIONS),
+                        help="Compresses the output as it is written, the file name gets"
+                             " the suffix of the compression, e.g. .json.gz. Default is none.")
+    parser.add_argument('--output-ndjson', dest='output_ndjson', type=str, metavar='PATH',
+                        help="Writes the results into the single file as NDJSON, one line per"
+                             " document with its file name, validity, error and the CSAF"
+                             " document, '-' writes them to stdout.")
+    parser.add_argument('--print', dest='print', action='store_true', default=False,
+                        help="Additionally prints CSAF JSON output on stdout.")
+    parser.add_argument('--profile', dest='profile', type=str, metavar='PATH',
+                        help="Writes JSON report with wall and CPU time of each conversion stage"
+                             " and section handler into the file.")
+    parser.add_argument('--streaming', dest='streaming', action='store_true', default=False,
+                        help="Parses the input incrementally and converts, validates and writes"
+                             " each Vulnerability element as soon as it is read."
+                             " Keeps memory usage low for huge documents.")
+    parser.add_argument('--async-pipeline', dest='async_pipeline', action='store_true',
+                        default=False,
+                        help="Batch mode: reads the inputs, converts them in --jobs worker"
+                             " processes and writes the outputs concurrently, connected by"
+                             " bounded queues.")
+    parser.add_argument('--max-in-flight', dest='max_in_flight', type=int, metavar='N',
+                        help="Maximum number of documents read but not yet written by"
+                             " --async-pipeline. Default is two per job.")
+    parser.add_argument('--split-vulnerabilities', dest='split_vulnerabilities',
+                        action='store_true', default=False,
+                        help="Writes one CSAF document per Vulnerability element, each with"
+                             " the document metadata, tracking ID suffixed by the CVE and only"
+                             " the product tree entries the vulnerability references.")
+    parser.add_argument('--force', action='store_const', const='cmd-arg-entered',
+                        help="If used, the converter produces output even if it is invalid "
+                             "(errors occurred during conversion). "
+                             "Target use case: best-effort conversion to JSON, "
+                             "fix the errors manually, e.g. in Secvisogram.")
+    parser.add_argument('--cache-dir', dest='cache_dir', type=str, metavar='PATH',
+                        help="Caches conversion results in the directory. Unchanged documents"
+                             " converted with the same options are not converted again.")
+    parser.add_argument('--cache-max-size', dest='cache_max_size', type=float, metavar='MB',
+                        help="Maximum size of the cache, the least recently used results are"
+                             " evicted first. Unlimited by default.")
+    parser.add_argument('--cache-max-age', dest='cache_max_age', type=float, metavar='DAYS',
+                        help="Evicts results not used for the number of days."
+                             " Unlimited by default.")
+    _add_conversion_arguments(parser)
+
+    config, pkg_version = _get_config(parser.parse_args())
+    if config.get('cache_dir') and config.get('streaming'):
+        logging.warning('The cache is not used with --streaming.')
+
+    if config.get('split_vulnerabilities'):
+        sys.exit(split(config, pkg_version))
+
+    if not config.get('input_file') or config.get('output_ndjson') \
+            or config.get('async_pipeline'):
+        sys.exit(batch(config, pkg_version))
 
-    # DocumentHandler is iterating over each XML element within convert_file and
-    # return CSAF 2.0 JSON
-    handler = DocumentHandler(config, pkg_version)
-    final_csaf = handler.convert_file(path=config.get('input_file'))
+    if not os.path.isfile(config.get('input_file')):
+        critical_exit(f'Input file not found, check the path: {config.get("input_file")}')
 
-    valid_output = True
-    if not handler.validate_output_against_schema(final_csaf) \
-            or not handler.validate_mandatory_tests(final_csaf) \
-            or SectionHandler.error_occurred:
-        valid_output = False
+    profile = Profile() if config.get('profile') else None
+    try:
+        _, file_path, _, output = convert_and_store(config, pkg_version,
+                                                    config.get('input_file'), profile=profile)
+    finally:
+        # the profile is written also if the conversion failed
+        if profile is not None:
+            store_profile_reports([profile.report()], config['profile'])
+        cache = get_cache(config)
+        if cache is not None:
+            cache.evict()
 
-        if not config.get('force', False):
-            critical_exit("Some error occurred during conversion, can't produce output."
-                          " To override this, use --force.")
-        else:
-            logging.warning('Some errors occurred during conversion,'
-                            ' but producing output as --force option is used.')
-
-    # Output / Store results
-    file_name = create_file_name(final_csaf['document'].get('tracking', {}).get('id', None),
-                                 valid_output)
-    file_path = str(os.path.join(config.get('output_dir'), file_name))
-    store_json(json_dict=final_csaf, fpath=file_path)
     if config.get('print', False):
-        print(json.dumps(final_csaf, indent=2))
+        sys.stdout.flush()
+        if output is None:
+            # streamed output was never held in memory, print the written file
+            with open_output(file_path, config.get('output_compression', 'none'), 'rb') as f:
+                shutil.copyfileobj(f, sys.stdout.buffer)
+        else:
+            # the output is printed as it was written, without serializing it again
+            sys.stdout.buffer.write(output)
+        sys.stdout.buffer.write(b'\n')
 
 
 if __name__ == '__main__':
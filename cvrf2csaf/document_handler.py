@@ -0,0 +1,969 @@
+""" Module containing DocumentHandler class taking care of conversion. """
+# pylint: disable=c-extension-no-member
+import copy
+import functools
+import itertools
+import logging
+import multiprocessing
+import os
+import re
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from lxml import etree
+from lxml import objectify
+
+from .common.utils import store_json, store_json_incremental, critical_exit, create_file_name, \
+    open_input, CriticalExit
+
+from .section_handlers.document_leaf_elements import DocumentLeafElements
+from .section_handlers.acknowledgments import Acknowledgments
+from .section_handlers.notes import Notes
+from .section_handlers.document_publisher import DocumentPublisher
+from .section_handlers.references import References
+from .section_handlers.document_tracking import DocumentTracking
+from .section_handlers.product_tree import ProductTree
+from .section_handlers.vulnerability import Vulnerability
+from .common.cache import get_cache
+from .common.common import ConversionContext, ProductIndex, conversion_context, current_context
+from .common.profiling import memory_peaks, profiled
+from .common.schemas import get_cvrf_schema, get_csaf_validator
+from .common.split import split_document
+
+
+# Smaller documents are converted faster than the worker processes start
+MIN_PARALLEL_VULNERABILITIES = 100
+
+# Checks performed at each validation level (config validate, --validate)
+VALIDATION_LEVELS = {
+    'none': (),
+    'input': ('input',),
+    'output': ('output',),
+    'mandatory': ('mandatory_tests',),
+    'full': ('input', 'output', 'mandatory_tests'),
+}
+
+# Mandatory tests covered by the product and group references checked during the conversion,
+# see common.ProductIndex
+MANDATORY_TESTS_CHECKED_BY_CONVERSION = ('is_valid_defined_product_ids',
+                                         'is_valid_defined_group_ids')
+
+
+def make_parser(compact=False):
+    """
+    Returns parser of CVRF documents. The compact one (config compact_parser) builds plain
+    lxml.etree elements without blank text, comments and processing instructions, which are
+    cheaper to build and traverse than the objectify ones. Section handlers look the children
+    up by common.ChildIndex, so they work with both.
+    """
+    if compact:
+        # pylint: disable=c-extension-no-member
+        return etree.XMLParser(remove_blank_text=True, remove_comments=True, remove_pis=True,
+                               resolve_entities=False, no_network=True)
+    return objectify.makeparser(resolve_entities=False, no_network=True)
+
+
+@functools.lru_cache(maxsize=None)
+def get_mandatory_tests() -> dict:
+    """
+    Returns the mandatory tests by name, in the order of the tests. turvallisuusneuvonta is
+    imported on the first call, it is slow to import and not needed unless the output is tested.
+    """
+    # pylint: disable=import-outside-toplevel
+    import turvallisuusneuvonta as mandatory_tests
+
+    # pylint: disable=fixme
+    # TODO: After the turvallisuusneuvonta package is complete and part of the csaf package,
+    #  replace the implementation
+    # For now we fetch the tests like this to see which failed
+    # Skip translator function since translator value cannot appear on the input
+    # Skip is_valid which calls all the tests (but doesn't produce any output)
+    return {m_test_str: getattr(mandatory_tests, m_test_str)
+            for m_test_str in mandatory_tests.__all__
+            if m_test_str not in ['is_valid', 'is_valid_translator']}
+
+
+def warm_up_checks(checks):
+    """
+    Compiles the schemata and loads the mandatory tests of the checks (see VALIDATION_LEVELS)
+    in advance, e.g. in a worker before the first document arrives. The checks skipped by
+    the validation level are not loaded.
+    """
+    if 'input' in checks:
+        get_cvrf_schema(DocumentHandler.CVRF_VERSION)
+    if 'output' in checks:
+        get_csaf_validator()
+    if 'mandatory_tests' in checks:
+        get_mandatory_tests()
+
+
+# pylint: disable=too-many-instance-attributes
+class DocumentHandler:
+    """
+    Main Handler of the conversion:
+    1. Reads/Parses/Validates CVRF XML input
+    2. Iterates over each first-level XML section
+    3. Each first-level XML section has its class and its methods are responsible for
+       converting the content
+    4. Collecting the output of each mapper class, which consists of the CSAF2.0 JSON equivalent
+    5. Combining it to the final JSON and writing the result to a file
+    """
+
+    TOLERATED_ERRORS_SUBSTR = [
+        "}ScoreSetV3': This element is not expected. Expected is one of"
+        " ( {http://docs.oasis-open.org/csaf/ns/csaf-cvrf/v1.2/vuln}ScoreSetV2,"
+        " {http://docs.oasis-open.org/csaf/ns/csaf-cvrf/v1.2/vuln}ScoreSetV3 ).",
+        "}ScoreSetV3': This element is not expected. Expected is "
+        "( {http://docs.oasis-open.org/csaf/ns/csaf-cvrf/v1.2/vuln}ScoreSetV3 ).",
+        r"is not accepted by the pattern '[c][pP][eE]:/[AHOaho]?(:[A-Za-z0-9\._\-~%]*){0,6}'."]
+
+    # Input is validated against this version of the schema, see common/schemas.py
+    CVRF_VERSION = '1.2'
+
+    def __init__(self, config, pkg_version, profile=None):
+        self.config = config
+        self.pkg_version = pkg_version
+        self.profile = profile
+        # Checks skipped by the validation level are considered passed
+        self.checks = VALIDATION_LEVELS[config.get('validate', 'full')]
+        self._reset()
+
+    def _reset(self):
+        """
+        Creates fresh section handlers and conversion context, so that the same DocumentHandler
+        can convert another document.
+        """
+        # pylint: disable=attribute-defined-outside-init
+        config, pkg_version = self.config, self.pkg_version
+        # The references replace the defined product/group IDs mandatory tests,
+        # they are checked only if the tests would be run
+        self.context = ConversionContext(
+            profile=self.profile,
+            product_index=ProductIndex() if 'mandatory_tests' in self.checks else None)
+        self.references_checked = False
+        self.document_leaf_elements = DocumentLeafElements(config)
+        self.document_acknowledgments = Acknowledgments()
+        self.document_notes = Notes()
+        self.document_publisher = DocumentPublisher(config)
+        self.document_references = References(config)
+        self.document_tracking = DocumentTracking(config, pkg_version)
+        self.product_tree = ProductTree()
+        self.vulnerability = Vulnerability(config)
+
+        self.sections_handlers = {
+            'Acknowledgments': self.document_acknowledgments,
+            'DocumentNotes': self.document_notes,
+            'DocumentPublisher': self.document_publisher,
+            'DocumentReferences': self.document_references,
+            'DocumentTracking': self.document_tracking,
+            'ProductTree': self.product_tree,
+            'Vulnerability': self.vulnerability,
+        }
+
+    def _update_cvssv3_version_from_schema(self, root_element):
+        """ Tries to update CVSS 3.x version from schema."""
+        cvss_3_regex = r'.*cvss-v(3\.[01]).*'
+
+        potential_cvss3 = None
+
+        # iterate over  namespaces
+        for name_space in root_element.nsmap.values():
+            match = re.match(cvss_3_regex, name_space)
+            if match:
+                cvss_version_matched = match.groups()[0]
+                # no potential cvss version found yet -> store it
+                if not potential_cvss3:
+                    potential_cvss3 = cvss_version_matched
+                # already have some version, but it's the same as currently matched -> ok, continue
+                elif potential_cvss3 == cvss_version_matched:
+                    continue
+                # else we have two different potential cvss versions -> skip this step completely
+                else:
+                    return
+
+        if potential_cvss3:
+            logging.info('Default CVSS v3.x version set to %s based on document XML schemas.',
+                         potential_cvss3)
+            self.vulnerability.default_cvss_version = potential_cvss3
+
+    def _parse(self, root):
+        self._update_cvssv3_version_from_schema(root)
+
+        # Document leaf elements are handled on the root itself
+        self.document_leaf_elements.create_csaf(root)
+
+        jobs = 1 if _in_worker_process() else self.config.get('vulnerability_jobs', 1)
+        vulnerabilities = []
+        # For children of the root element with a deeper structure,
+        # dedicated section handlers are used
+        for elem in root.iterchildren():
+            if jobs > 1 and etree.QName(elem).localname == 'Vulnerability':
+                vulnerabilities.append(elem)
+            else:
+                self._convert_section(elem)
+
+        if len(vulnerabilities) >= MIN_PARALLEL_VULNERABILITIES:
+            self._convert_vulnerabilities_in_processes(vulnerabilities, jobs)
+        else:
+            for elem in vulnerabilities:
+                self._convert_section(elem)
+
+        self.references_checked = self.context.product_index is not None
+
+    def _convert_vulnerabilities_in_processes(self, vulnerabilities, jobs):
+        """
+        Converts the Vulnerability elements in a pool of processes. The elements are sent
+        serialized in chunks, the CSAF vulnerabilities come back in the original order together
+        with the errors and warnings reported by the workers.
+        The references are checked here, the serialized elements lose their input lines.
+        """
+        for elem in vulnerabilities:
+            Vulnerability.check_references(elem)
+
+        # a few chunks per worker balance the load without paying for many round trips
+        chunk_size = -(-len(vulnerabilities) // (jobs * 4))
+        chunks = [[etree.tostring(elem) for elem in vulnerabilities[i:i + chunk_size]]
+                  for i in range(0, len(vulnerabilities), chunk_size)]
+
+        context = current_context()
+        with profiled(context.profile, 'section.Vulnerability'), \
+                ProcessPoolExecutor(max_workers=min(jobs, len(chunks)),
+                                    initializer=_init_vulnerability_worker,
+                                    initargs=(self.config,
+                                              self.vulnerability.default_cvss_version)) as executor:
+            for csaf, errors, warnings, stats in executor.map(_convert_vulnerabilities, chunks):
+                self.vulnerability.csaf.extend(csaf)
+                context.errors.extend(errors)
+                context.warnings.extend(warnings)
+                context.stats.update(stats)
+
+    def _convert_section(self, elem):
+        # get tag name without its namespace, don't use elem.tag here
+        tag = etree.QName(elem).localname
+        tag_handler = self.sections_handlers.get(tag)
+
+        if tag_handler:
+            tag_handler.create_csaf(root_element=elem)
+
+    def _report_stats(self):
+        stats = self.context.stats
+        if stats['merged_score_sets']:
+            logging.info('Merged %s CVSS score sets into score sets with the same version, vector'
+                         ' and scores, the output is %s bytes smaller.',
+                         stats['merged_score_sets'], stats['merged_score_sets_bytes_saved'])
+        if stats['computed_CVSS_scores']:
+            logging.info('Filled in %s missing CVSS scores computed from the vectors.',
+                         stats['computed_CVSS_scores'])
+        if self.profile is not None and stats:
+            self.profile.info.update(stats)
+
+    def _compose_final_csaf(self) -> dict:
+        # Merges first level leaves into final CSAF document.
+        # [mapping table](https://github.com/tschmidtb51/csaf/blob/csaf-2.0-what-is-new-table
+        # /notes/whats-new-csaf-v2.0-cn01.md#e4-mapped-elements)
+
+        final_csaf = {'document': {}}
+        final_csaf['document'] = self.document_leaf_elements.csaf
+
+        section_mappings = (
+            (final_csaf['document'], 'publisher', self.document_publisher.csaf),
+            (final_csaf['document'], 'tracking', self.document_tracking.csaf),
+            (final_csaf['document'], 'notes', self.document_notes.csaf),
+            (final_csaf['document'], 'references', self.document_references.csaf),
+            (final_csaf['document'], 'acknowledgments', self.document_acknowledgments.csaf),
+            (final_csaf, 'product_tree', self.product_tree.csaf),
+            (final_csaf, 'vulnerabilities', self.vulnerability.csaf),
+        )
+
+        for root, section, csaf_content in section_mappings:
+            if csaf_content:
+                root[section] = csaf_content
+
+        return final_csaf
+
+    @classmethod
+    def _tolerate_errors(cls, error_list):
+        tolerated_errors = [error for error in error_list if any(
+            error_substr in error.message for error_substr in
+            DocumentHandler.TOLERATED_ERRORS_SUBSTR)]
+        if len(tolerated_errors) > 0:
+            logging.warning('Tolerating errors: %s.', tolerated_errors)
+        return set(tolerated_errors) == set(error_list)
+
+    @classmethod
+    def input_schema_errors(cls, xml, cvrf_version=None) -> list:
+        """
+        Validates parsed CVRF document or element against the CVRF schema of the version
+        (CVRF_VERSION by default).
+        return: list of the errors, empty if valid or if all the errors are tolerated
+        """
+        errors = get_cvrf_schema(cvrf_version or cls.CVRF_VERSION).validate(xml)
+        if errors and cls._tolerate_errors(errors):
+            return []
+        return errors
+
+    @classmethod
+    def _validate_input_against_schema(cls, xml_objectified, log_success=True):
+        with profiled(current_context().profile, 'input_validation'):
+            errors = cls.input_schema_errors(xml_objectified)
+        if errors:
+            logging.error('Errors during input validation occurred, reason(s): %s.', errors)
+            return False
+
+        if log_success:
+            logging.info('Input XSD validation OK.')
+        return True
+
+    @classmethod
+    def _open_and_validate_file(cls, file_path, validate=True, compact=False):
+        try:
+            with profiled(current_context().profile, 'parse'), open_input(file_path) as source:
+                xml_tree = etree.parse(source, make_parser(compact))
+        except (OSError, etree.LxmlError) as e:
+            # file_path can be also a file object, e.g. with a request body
+            critical_exit(f'Failed to open input file {getattr(file_path, "name", file_path)}:'
+                          f' {e}.')
+
+        if validate and not DocumentHandler._validate_input_against_schema(xml_tree):
+            critical_exit('Input document not valid.')
+
+        return xml_tree.getroot()
+
+    def convert_file(self, path) -> dict:
+        """
+        Wrapper to read/parse CVRF and parse it to CSAF JSON structure.
+        With config low_memory, the input is parsed incrementally, see convert_file_streaming.
+        """
+        if self.config.get('low_memory', False):
+            return self.convert_file_streaming(path)
+
+        self._reset()
+        with conversion_context(self.context):
+            root = DocumentHandler._open_and_validate_file(
+                path, validate='input' in self.checks,
+                compact=self.config.get('compact_parser', False))
+            return self._convert_root(root)
+
+    def convert_root(self, root) -> dict:
+        """
+        Converts the root element of a parsed CVRF document (see make_parser) to CSAF JSON
+        structure. The input is not validated, so that the stages can be timed separately,
+        e.g. by the benchmark.
+        """
+        self._reset()
+        with conversion_context(self.context):
+            return self._convert_root(root)
+
+    def _convert_root(self, root) -> dict:
+        self._parse(root)
+        self._report_stats()
+
+        return self._compose_final_csaf()
+
+    def convert_file_streaming(self, path) -> dict:
+        """
+        Streaming variant of convert_file for huge documents, see iter_file_streaming.
+        Only the input is streamed, the returned CSAF contains all the vulnerabilities.
+        """
+        final_csaf, vulnerabilities = self.iter_file_streaming(path)
+        vulnerabilities = list(vulnerabilities)
+        if vulnerabilities:
+            final_csaf['vulnerabilities'] = vulnerabilities
+
+        return final_csaf
+
+    def iter_file_streaming(self, path):
+        """
+        Converts the document incrementally. The header sections are converted and cleared as
+        soon as the first Vulnerability element starts, then each Vulnerability element is
+        validated, converted and removed from the tree as soon as it is parsed.
+        Peak memory is bounded by the largest Vulnerability element, not by the whole document.
+        return: tuple (CSAF document without vulnerabilities,
+                       iterator yielding CSAF vulnerabilities as they are converted)
+        """
+        self._reset()
+        vulnerabilities = self._iter_streamed_vulnerabilities(path)
+        # all the other sections are converted before the first vulnerability is yielded
+        pending = list(itertools.islice(vulnerabilities, 1))
+
+        return self._compose_final_csaf(), itertools.chain(pending, vulnerabilities)
+
+    def _iter_streamed_vulnerabilities(self, path):
+        with conversion_context(self.context):
+            yield from self._iter_streamed_vulnerabilities_in_context(path)
+
+    def _iter_streamed_vulnerabilities_in_context(self, path):
+        streamed_input = _StreamedInput()
+        root = None
+        depth = 0
+
+        compact = self.config.get('compact_parser', False)
+        try:
+            # the input is closed by the with statement also if the generator is closed early
+            # pylint: disable=contextmanager-generator-missing-cleanup
+            with open_input(path) as source:
+                events = etree.iterparse(source, events=('start', 'end'),
+                                         remove_blank_text=True, remove_comments=compact,
+                                         remove_pis=compact, resolve_entities=False,
+                                         no_network=True)
+                if not compact:
+                    events.set_element_class_lookup(objectify.ObjectifyElementClassLookup())
+
+                for event, elem in events:
+                    if event == 'start':
+                        depth += 1
+                        if depth == 1:
+                            root = elem
+                            self._update_cvssv3_version_from_schema(root)
+                        elif depth == 2 and not streamed_input.header_converted \
+                                and etree.QName(elem).localname == 'Vulnerability':
+                            # Header sections precede all Vulnerability elements, they are complete
+                            self._convert_streamed_header(root, streamed_input)
+                        continue
+
+                    depth -= 1
+                    if depth == 1 and etree.QName(elem).localname == 'Vulnerability':
+                        self._convert_streamed_vulnerability(elem, streamed_input)
+                        # hand over the converted vulnerability instead of collecting them
+                        converted, self.vulnerability.csaf = self.vulnerability.csaf, []
+                        yield from converted
+        except (OSError, etree.LxmlError) as e:
+            critical_exit(f'Failed to open input file {path}: {e}.')
+
+        if not streamed_input.header_converted:
+            # Document without any Vulnerability element
+            self._convert_streamed_header(root, streamed_input)
+        if 'input' in self.checks:
+            logging.info('Input XSD validation OK.')
+
+        self._report_stats()
+        if self.document_leaf_elements.update_xml_lang(streamed_input.xml_langs):
+            logging.warning('Vulnerability elements specify other languages than the rest of'
+                            ' the document, "lang" of the streamed output might be wrong.')
+
+    def _convert_streamed_header(self, root, streamed_input):
+        if 'input' in self.checks:
+            # Validate the header on its own, the Vulnerability element just started is left out
+            header = copy.deepcopy(root)
+            for vulnerability in header.findall('{*}Vulnerability'):
+                header.remove(vulnerability)
+
+            if not self._validate_input_against_schema(header, log_success=False):
+                critical_exit('Input document not valid.')
+            streamed_input.collect_keys(header)
+
+        self.document_leaf_elements.create_csaf(root)
+        for elem in root.iterchildren():
+            if etree.QName(elem).localname != 'Vulnerability':
+                self._convert_section(elem)
+                elem.clear()
+
+        streamed_input.header_converted = True
+        # the vulnerabilities are checked as they are converted
+        self.references_checked = self.context.product_index is not None
+
+    def _convert_streamed_vulnerability(self, elem, streamed_input):
+        # vuln:Vulnerability is a global element of the schema, it can be validated on its own.
+        # Identity constraints spanning the whole document are checked by streamed_input.
+        if 'input' in self.checks and (
+                not self._validate_input_against_schema(elem, log_success=False)
+                or not streamed_input.check_vulnerability(elem)):
+            critical_exit('Input document not valid.')
+
+        self._convert_section(elem)
+        streamed_input.xml_langs.update(elem.xpath('descendant-or-self::*/@xml:lang'))
+
+        # Converted and cleared Vulnerability elements before this one are not needed anymore
+        elem.clear()
+        previous = elem.getprevious()
+        while previous is not None and previous.tag == elem.tag:
+            elem.getparent().remove(previous)
+            previous = elem.getprevious()
+
+    def validate_output_against_schema(self, final_csaf) -> bool:
+        """
+        Validates the CSAF output against the CSAF JSON schema
+        return: True if valid, False if invalid
+        """
+        # pylint: disable=import-outside-toplevel
+        from jsonschema import ValidationError, SchemaError
+
+        try:
+            get_csaf_validator().validate(final_csaf)
+        except SchemaError as e:
+            logging.error(
+                'CSAF schema validation error. Provided CSAF schema is invalid. Message: %s',
+                e.message)
+            return False
+        except ValidationError as e:
+            logging.error('CSAF schema validation error. Path: %s. Message: %s.', e.json_path,
+                          e.message)
+            return False
+
+        logging.info('CSAF schema validation OK.')
+        return True
+
+    @staticmethod
+    def validate_vulnerability_against_schema(vulnerability, index) -> bool:
+        """
+        Validates a single CSAF vulnerability against the CSAF JSON schema, used when
+        the vulnerabilities are streamed and the complete document is never composed.
+        return: True if valid, False if invalid
+        """
+        validator = get_csaf_validator()
+        errors = list(validator.descend(vulnerability,
+                                        validator.schema['properties']['vulnerabilities']['items'],
+                                        path=index, schema_path='items'))
+        for error in errors:
+            logging.error('CSAF schema validation error. Path: $.vulnerabilities%s. Message: %s.',
+                          error.json_path[1:], error.message)
+
+        return not errors
+
+    def validate_mandatory_tests(self, final_csaf, jobs=None) -> bool:
+        """
+        Validates output against mandatory tests:
+        https://docs.oasis-open.org/csaf/csaf/v2.0/csaf-v2.0.html#61-mandatory-tests
+        The tests run in jobs processes (config mandatory_tests_jobs by default), serially if 1.
+        With config mandatory_tests_fail_fast, the tests stop at the first failure.
+        Failed tests are logged in the order of the tests.
+        Tests covered by the references checked while this handler converted final_csaf
+        are skipped, dangling references were already reported as conversion errors.
+        """
+        fail_fast = self.config.get('mandatory_tests_fail_fast', False)
+        tests = get_mandatory_tests()
+        if self.references_checked:
+            tests = {m_test_str: m_test for m_test_str, m_test in tests.items()
+                     if m_test_str not in MANDATORY_TESTS_CHECKED_BY_CONVERSION}
+        if not tests:
+            return True
+        if jobs is None:
+            jobs = self.config.get('mandatory_tests_jobs', 1)
+        jobs = min(jobs, len(tests))
+        if jobs > 1 and _in_worker_process():
+            # e.g. a batch or server worker, the pool of the run already uses the CPUs
+            logging.debug('Running the mandatory tests serially inside a worker process.')
+            jobs = 1
+
+        if jobs > 1:
+            failed = _run_mandatory_tests_in_processes(final_csaf, list(tests), jobs, fail_fast)
+        else:
+            failed = []
+            for m_test_str, m_test in tests.items():
+                if not m_test(final_csaf):
+                    failed.append(m_test_str)
+                    if fail_fast:
+                        break
+
+        for m_test_str in failed:
+            logging.error('Mandatory test %s failed.', m_test_str)
+        if failed and fail_fast:
+            logging.info('Skipping the rest of mandatory tests as'
+                         ' --mandatory-tests-fail-fast option is used.')
+
+        return not failed
+
+
+# Vulnerability handler of a vulnerabilities worker process
+# pylint: disable=invalid-name
+_worker_vulnerability = None
+_worker_compact_parser = False
+
+
+def _init_vulnerability_worker(config, default_cvss_version):
+    # pylint: disable=global-statement
+    global _worker_vulnerability, _worker_compact_parser
+    _worker_compact_parser = config.get('compact_parser', False)
+    _worker_vulnerability = Vulnerability(config)
+    _worker_vulnerability.default_cvss_version = default_cvss_version
+
+
+def _convert_vulnerabilities(chunk) -> tuple:
+    """
+    Converts serialized Vulnerability elements inside a worker.
+    return: tuple (CSAF vulnerabilities, errors, warnings, stats)
+    """
+    _worker_vulnerability.csaf = []
+    context = ConversionContext()
+    parser = make_parser(_worker_compact_parser)
+    with conversion_context(context):
+        for data in chunk:
+            # pylint: disable=c-extension-no-member
+            _worker_vulnerability.create_csaf(etree.fromstring(data, parser))
+
+    return _worker_vulnerability.csaf, context.errors, context.warnings, context.stats
+
+
+# CSAF document tested by a mandatory tests worker process
+_worker_csaf = None
+
+
+def _init_mandatory_tests_worker(final_csaf):
+    # pylint: disable=global-statement
+    global _worker_csaf
+    _worker_csaf = final_csaf
+
+
+def _run_mandatory_test(m_test_str) -> tuple:
+    return m_test_str, get_mandatory_tests()[m_test_str](_worker_csaf)
+
+
+def _in_worker_process() -> bool:
+    """ True inside a worker process of a pool, which should not start a pool of its own. """
+    return multiprocessing.parent_process() is not None
+
+
+def _run_mandatory_tests_in_processes(final_csaf, test_names, jobs, fail_fast) -> list:
+    """
+    Runs the mandatory tests test_names in a pool of processes. The document is handed over to each
+    worker once by the pool initializer (inherited without pickling where processes are
+    forked), only the test names and results are sent per test.
+    return: names of the failed tests, in the order of the tests
+    """
+    results = {}
+    # unlike ProcessPoolExecutor, the pool terminates its workers when the block is left,
+    # so with fail-fast the tests still running are stopped as well
+    with multiprocessing.Pool(jobs, initializer=_init_mandatory_tests_worker,
+                              initargs=(final_csaf,)) as pool:
+        for m_test_str, result in pool.imap_unordered(_run_mandatory_test, test_names):
+            results[m_test_str] = result
+            if fail_fast and not result:
+                break
+
+    return [m_test_str for m_test_str in test_names
+            if results.get(m_test_str) is False]
+
+
+class _StreamedInput:
+    """
+    State of a streamed conversion. Checks the identity constraints of the cvrfdoc element
+    which can't be validated when each Vulnerability element is validated on its own.
+    """
+
+    def __init__(self):
+        self.header_converted = False
+        self.xml_langs = set()
+        self.product_ids = set()
+        self.group_ids = set()
+        self.ordinals = set()
+
+    def collect_keys(self, header):
+        """ Collects ProductKey and GroupKey values defined in the header. """
+        self.product_ids = {elem.get('ProductID') for elem in
+                            header.iterfind('.//{*}FullProductName')}
+        self.group_ids = {elem.get('GroupID') for elem in
+                          header.iterfind('.//{*}ProductGroups/{*}Group')}
+
+    def check_vulnerability(self, elem) -> bool:
+        """ Checks UniqueOrdinal and the ProductID/GroupID keyrefs of a Vulnerability. """
+        valid = True
+
+        ordinal = elem.get('Ordinal')
+        if ordinal in self.ordinals:
+            logging.error('Input line %s: duplicate Vulnerability Ordinal %s.', elem.sourceline,
+                          ordinal)
+            valid = False
+        self.ordinals.add(ordinal)
+
+        vuln_ns = etree.QName(elem).namespace
+        keyrefs = (
+            ('.//{ns}ProductStatuses/{ns}Status/{ns}ProductID', self.product_ids),
+            ('.//{ns}CVSSScoreSets/{ns}ScoreSetV3/{ns}ProductID', self.product_ids),
+            ('.//{ns}Threats/{ns}Threat/{ns}ProductID', self.product_ids),
+            ('.//{ns}Remediations/{ns}Remediation/{ns}ProductID', self.product_ids),
+            ('.//{ns}Threats/{ns}Threat/{ns}GroupID', self.group_ids),
+            ('.//{ns}Remediations/{ns}Remediation/{ns}GroupID', self.group_ids),
+        )
+        for path, keys in keyrefs:
+            for ref in elem.iterfind(path.format(ns=f'{{{vuln_ns}}}')):
+                if ref.text not in keys:
+                    logging.error('Input line %s: %s %s is not defined.', ref.sourceline,
+                                  etree.QName(ref).localname, ref.text)
+                    valid = False
+
+        return valid
+
+
+def _convert_and_store_streaming(handler, config, input_file, claim_output=None):
+    """
+    Streamed variant of convert_and_store. Vulnerabilities are validated and written one by one
+    as they are converted. The output is written into a hidden file first and renamed when
+    its validity, and hence its name, is known.
+    """
+    profile = handler.profile
+    final_csaf, vulnerabilities = handler.iter_file_streaming(path=input_file)
+    tracking_id = final_csaf['document'].get('tracking', {}).get('id', None)
+    compression = config.get('output_compression', 'none')
+    partial_path = os.path.join(config.get('output_dir'),
+                                f'.{create_file_name(tracking_id, True, compression)}')
+
+    valid_output = [True]
+    if 'output' in handler.checks:
+        with profiled(profile, 'output_validation'):
+            valid_output[0] = handler.validate_output_against_schema(final_csaf)
+
+    # Mandatory tests need the complete document, they are run once for the document without
+    # the vulnerabilities. The product and group references of the vulnerabilities are checked
+    # by the conversion, the other tests of the vulnerabilities are not run.
+    if 'mandatory_tests' in handler.checks:
+        logging.info('Mandatory tests of the vulnerabilities are skipped when streaming, only'
+                     ' their product and group references are checked by the conversion.')
+        with profiled(profile, 'mandatory_tests'):
+            valid_output[0] = handler.validate_mandatory_tests(final_csaf) and valid_output[0]
+
+    def validated(vulnerabilities):
+        for index, vulnerability in enumerate(vulnerabilities):
+            if 'output' in handler.checks:
+                with profiled(profile, 'output_validation'):
+                    if not handler.validate_vulnerability_against_schema(vulnerability, index):
+                        valid_output[0] = False
+            yield vulnerability
+
+    try:
+        # the vulnerabilities are converted and validated as they are written,
+        # so store_json includes the time of these stages
+        with profiled(profile, 'store_json'):
+            store_json_incremental(json_dict=final_csaf, key='vulnerabilities',
+                                   items=validated(vulnerabilities), fpath=partial_path,
+                                   output_format=config.get('output_format', 'json'),
+                                   compression=compression)
+
+        valid_output[0] = valid_output[0] and not handler.context.error_occurred
+        check_output_validity(config, valid_output[0])
+
+        file_path = output_file_path(config, tracking_id, valid_output[0])
+        if claim_output is not None:
+            claim_output(file_path)
+        if os.path.exists(file_path):
+            logging.warning("Output %s already exists. Overwriting it.", file_path)
+        os.replace(partial_path, file_path)
+        logging.info("Output renamed to %s.", file_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+    return None, file_path, valid_output[0], None
+
+
+def check_output_validity(config, valid_output, name=None):
+    """
+    Exits via critical_exit() if the output is not valid and --force is not used, warns that
+    the invalid output is produced otherwise. name of the document (e.g. the input file
+    of a batch) is included in the messages if given.
+    """
+    if valid_output:
+        return
+    of_name = f' of {name}' if name else ''
+    if not config.get('force', False):
+        critical_exit(f"Some error occurred during conversion{of_name}, can't produce output."
+                      " To override this, use --force.")
+    logging.warning('Some errors occurred during conversion%s,'
+                    ' but producing output as --force option is used.', of_name)
+
+
+def output_file_path(config, tracking_id, valid_output) -> str:
+    """ Returns path of the output file in the output dir, named by create_file_name(). """
+    return str(os.path.join(config.get('output_dir'),
+                            create_file_name(tracking_id, valid_output,
+                                             config.get('output_compression', 'none'))))
+
+
+def convert_and_store(config, pkg_version, input_file, profile=None, claim_output=None):
+    """
+    Converts a single CVRF document, validates the result and writes it into the output dir.
+    Exits via critical_exit() if the document can't be converted or the output is invalid
+    and --force is not used.
+    If profile is given, the stages of the conversion are timed in it.
+    If claim_output is given, it is called with the path of the output file before the file
+    is written, e.g. to stop documents of a batch from overwriting each other's output.
+    If config cache_dir is set, results are looked up in the cache before the input is parsed.
+    Only the checks of config validate level are performed, the skipped ones are considered
+    passed, so the output is valid unless a performed check or the conversion itself failed.
+    return: tuple (final CSAF dict or None if the output was streamed,
+                   path of the written file, True if the output is valid,
+                   serialized JSON written to the file or None if it was written incrementally)
+    """
+    checks = VALIDATION_LEVELS[config.get('validate', 'full')]
+    if profile is not None:
+        profile.info.update(input_file=input_file, input_size=os.path.getsize(input_file),
+                            validation=list(checks))
+    if checks != VALIDATION_LEVELS['full']:
+        logging.info('Validation level %s, performed checks: %s.', config.get('validate'),
+                     ', '.join(checks) or 'none')
+
+    cache = None if config.get('streaming', False) else get_cache(config)
+    low_memory = config.get('low_memory', False)
+    with profiled(profile, 'total'), (memory_peaks() if low_memory else nullcontext()) as memory:
+        result = _convert_and_store(config, pkg_version, input_file, profile, cache,
+                                    claim_output)
+
+    if low_memory:
+        logging.info('Peak RSS of the process: %s kB.', memory['peak_rss_kb'])
+        if 'tracemalloc_peak_kb' in memory:
+            logging.info('Peak of the traced Python allocations: %s kB.',
+                         memory['tracemalloc_peak_kb'])
+    if profile is not None:
+        profile.info.update(output_file=result[1], output_size=os.path.getsize(result[1]))
+        if low_memory:
+            profile.info.update(memory)
+    return result
+
+
+def convert_and_validate(config, pkg_version, input_file, profile=None):
+    """
+    Converts a single CVRF document and validates the result, without writing it.
+    input_file can be also a file object, e.g. with an archive member.
+    return: tuple (final CSAF dict, True if the output is valid)
+    """
+    # DocumentHandler is iterating over each XML element within convert_file and
+    # return CSAF 2.0 JSON
+    handler = DocumentHandler(config, pkg_version, profile=profile)
+    final_csaf = handler.convert_file(path=input_file)
+
+    valid_schema = valid_mandatory_tests = True
+    if 'output' in handler.checks:
+        with profiled(profile, 'output_validation'):
+            valid_schema = handler.validate_output_against_schema(final_csaf)
+    if 'mandatory_tests' in handler.checks:
+        with profiled(profile, 'mandatory_tests'):
+            valid_mandatory_tests = handler.validate_mandatory_tests(final_csaf)
+
+    valid_output = valid_schema and valid_mandatory_tests and not handler.context.error_occurred
+    return final_csaf, valid_output
+
+
+# pylint: disable=too-many-arguments,too-many-positional-arguments
+def _convert_and_store(config, pkg_version, input_file, profile, cache, claim_output):
+    if config.get('streaming', False):
+        return _convert_and_store_streaming(DocumentHandler(config, pkg_version, profile=profile),
+                                            config, input_file, claim_output)
+
+    key = cached = None
+    if cache is not None:
+        with profiled(profile, 'cache_lookup'):
+            key = cache.key(config, pkg_version, input_file)
+            cached = None if key is None else cache.get(key)
+        if profile is not None:
+            profile.info['cache'] = 'miss' if cached is None else 'hit'
+
+    if cached is not None:
+        final_csaf, valid_output = cached
+        logging.info('Result of %s found in the cache (%s), skipping conversion and validation.',
+                     input_file, 'valid' if valid_output else 'invalid')
+    else:
+        final_csaf, valid_output = convert_and_validate(config, pkg_version, input_file,
+                                                         profile)
+        if key is not None:
+            with profiled(profile, 'cache_store'):
+                cache.put(key, final_csaf, valid_output)
+
+    check_output_validity(config, valid_output)
+
+    # Output / Store results
+    compression = config.get('output_compression', 'none')
+    file_path = output_file_path(config, final_csaf['document'].get('tracking', {}).get('id'),
+                                 valid_output)
+    if claim_output is not None:
+        claim_output(file_path)
+    with profiled(profile, 'store_json'):
+        if config.get('low_memory', False) and final_csaf.get('vulnerabilities'):
+            # the serialized document is never held in memory as a whole, vulnerabilities
+            # are the last key of the document, so the output is the same
+            header = {key: value for key, value in final_csaf.items()
+                      if key != 'vulnerabilities'}
+            store_json_incremental(json_dict=header, key='vulnerabilities',
+                                   items=final_csaf['vulnerabilities'], fpath=file_path,
+                                   output_format=config.get('output_format', 'json'),
+                                   compression=compression)
+            output = None
+        else:
+            output = store_json(json_dict=final_csaf, fpath=file_path,
+                                output_format=config.get('output_format', 'json'),
+                                compression=compression)
+
+    return final_csaf, file_path, valid_output, output
+
+
+# Handler validating the split documents in a split worker process
+_worker_split_handler = None
+_worker_split_converted_valid = True
+
+
+def _init_split_worker(config, pkg_version, references_checked, converted_valid):
+    # pylint: disable=global-statement
+    global _worker_split_handler, _worker_split_converted_valid
+    _worker_split_handler = DocumentHandler(config, pkg_version)
+    _worker_split_handler.references_checked = references_checked
+    _worker_split_converted_valid = converted_valid
+    # the input is already converted, only the checks of the split documents are warmed up
+    warm_up_checks(tuple(check for check in _worker_split_handler.checks if check != 'input'))
+
+
+def _validate_and_store_split(split_csaf) -> tuple:
+    """
+    Validates a split document and writes it into the output dir, invalid documents only
+    with --force.
+    return: tuple (path of the written file or None if not written, True if valid)
+    """
+    handler, config = _worker_split_handler, _worker_split_handler.config
+    tracking_id = split_csaf['document']['tracking']['id']
+
+    valid = _worker_split_converted_valid
+    if 'output' in handler.checks and not handler.validate_output_against_schema(split_csaf):
+        valid = False
+    if 'mandatory_tests' in handler.checks \
+            and not handler.validate_mandatory_tests(split_csaf, jobs=1):
+        valid = False
+    try:
+        check_output_validity(config, valid, f'split document {tracking_id}')
+    except CriticalExit:
+        # the other split documents are written
+        return None, False
+
+    file_path = output_file_path(config, tracking_id, valid)
+    store_json(json_dict=split_csaf, fpath=file_path,
+               output_format=config.get('output_format', 'json'),
+               compression=config.get('output_compression', 'none'))
+    return file_path, valid
+
+
+def convert_and_store_split(config, pkg_version, input_file, profile=None):
+    """
+    Converts a single CVRF document, splits it into one CSAF document per vulnerability
+    (see common.split) and writes those into the output dir. The split documents are validated
+    and written by config jobs processes (number of CPUs by default).
+    Exits via critical_exit() if the document can't be converted and --force is not used,
+    split documents failing the validation are not written unless --force is used.
+    return: list of tuples (path of the written file or None if not written,
+                            True if the split document is valid), one per vulnerability
+    """
+    handler = DocumentHandler(config, pkg_version, profile=profile)
+    with profiled(profile, 'total'):
+        final_csaf = handler.convert_file(path=input_file)
+        check_output_validity(config, not handler.context.error_occurred)
+
+        with profiled(profile, 'split'):
+            documents = split_document(final_csaf)
+        del final_csaf
+
+        initargs = (config, pkg_version, handler.references_checked,
+                    not handler.context.error_occurred)
+        jobs = min(config.get('jobs') or os.cpu_count() or 1, len(documents))
+        logging.info('Validating and writing %s split documents using %s job(s).',
+                     len(documents), jobs)
+        # output validation and the mandatory tests are timed as a whole
+        with profiled(profile, 'store_json'):
+            if jobs <= 1:
+                _init_split_worker(*initargs)
+                results = [_validate_and_store_split(split_csaf) for split_csaf in documents]
+            else:
+                with ProcessPoolExecutor(max_workers=jobs, initializer=_init_split_worker,
+                                         initargs=initargs) as executor:
+                    results = list(executor.map(_validate_and_store_split, documents,
+                                                chunksize=-(-len(documents) // (jobs * 4))))
+
+    if profile is not None:
+        profile.info.update(input_file=input_file, input_size=os.path.getsize(input_file),
+                            validation=list(handler.checks), split_documents=len(documents))
+    return results
@@ -1,7 +1,6 @@
 """ Module containing DocumentLeafElements class """
-import logging
 
-from ..common.common import SectionHandler
+from ..common.common import ChildIndex, SectionHandler
 
 
 # pylint: disable=too-few-public-methods
@@ -14,32 +13,40 @@ class DocumentLeafElements(SectionHandler):
     def __init__(self, config):
         super().__init__()
         self.csaf_version = config.get('csaf_version')
+        self.xml_langs = set()
 
     def _process_mandatory_elements(self, root_element):
         # This element is new in CSAF, not present in CVRF
         self.csaf['csaf_version'] = self.csaf_version
 
-        self.csaf['category'] = root_element.DocumentType.text
-        self.csaf['title'] = root_element.DocumentTitle.text
+        children = ChildIndex(root_element)
+        self.csaf['category'] = children.first('DocumentType').text
+        self.csaf['title'] = children.first('DocumentTitle').text
 
     def _process_optional_elements(self, root_element):
-        if hasattr(root_element, 'DocumentDistribution'):
+        children = ChildIndex(root_element)
+        if 'DocumentDistribution' in children:
             self.csaf['distribution'] = {
-                'text': root_element.DocumentDistribution.text
+                'text': children.first('DocumentDistribution').text
             }
 
-        if hasattr(root_element, 'AggregateSeverity'):
+        if 'AggregateSeverity' in children:
+            aggregate_severity = children.first('AggregateSeverity')
             self.csaf['aggregate_severity'] = {
-                'text': root_element.AggregateSeverity.text
+                'text': aggregate_severity.text
             }
-            if root_element.AggregateSeverity.attrib.get('Namespace'):
+            if aggregate_severity.attrib.get('Namespace'):
                 self.csaf['aggregate_severity']['namespace'] = \
-                    root_element.AggregateSeverity.attrib['Namespace']
+                    aggregate_severity.attrib['Namespace']
 
         self._process_xml_lang(root_element)
 
     def _process_xml_lang(self, root_element):
-        langs = list(set(root_element.xpath("//@xml:lang")))
+        self.xml_langs = set(root_element.xpath("//@xml:lang"))
+        self._set_lang()
+
+    def _set_lang(self):
+        langs = list(self.xml_langs)
         if len(langs) == 1:
             self.csaf['lang'] = langs[0]
             return
@@ -49,4 +56,17 @@ class DocumentLeafElements(SectionHandler):
                       ' A document with multiple languages might have been produced')
         else:
             reason = "no language specified in XML"
-        logging.warning("could not determine value for 'lang': %s", reason)
+        SectionHandler.report_warning("could not determine value for 'lang': %s", reason)
+
+    def update_xml_lang(self, xml_langs) -> bool:
+        """
+        Takes into account xml:lang values of elements which were not part of the tree
+        given to create_csaf (streamed conversion). Returns True if 'lang' had to be changed.
+        """
+        if set(xml_langs) <= self.xml_langs:
+            return False
+
+        self.xml_langs.update(xml_langs)
+        self.csaf.pop('lang', None)
+        self._set_lang()
+        return True
@@ -1,5 +1,5 @@
 """ Module containing DocumentPublisher class """
-from ..common.common import SectionHandler
+from ..common.common import ChildIndex, SectionHandler
 
 
 # pylint: disable=too-few-public-methods
@@ -27,7 +27,8 @@ class DocumentPublisher(SectionHandler):
 
     def _process_optional_elements(self, root_element):
         # optional values
-        if hasattr(root_element, 'ContactDetails'):
-            self.csaf['contact_details'] = root_element.ContactDetails.text
-        if hasattr(root_element, 'IssuingAuthority'):
-            self.csaf['issuing_authority'] = root_element.IssuingAuthority.text
+        children = ChildIndex(root_element)
+        if 'ContactDetails' in children:
+            self.csaf['contact_details'] = children.first('ContactDetails').text
+        if 'IssuingAuthority' in children:
+            self.csaf['issuing_authority'] = children.first('IssuingAuthority').text
@@ -1,10 +1,9 @@
 """ Module containing DocumentTracking class """
-import logging
 import re
 import sys
 from operator import itemgetter
 from typing import Tuple
-from ..common.common import SectionHandler
+from ..common.common import ChildIndex, SectionHandler
 from ..common.utils import get_utc_timestamp
 
 
@@ -27,10 +26,14 @@ class DocumentTracking(SectionHandler):
             = config.get('fix_insert_current_version_into_revision_history')
 
     def _process_mandatory_elements(self, root_element):
-        self.csaf['id'] = self._remove_id_whitespace(root_element.Identification.ID.text)
-        self.csaf['current_release_date'] = get_utc_timestamp(root_element.CurrentReleaseDate.text)
-        self.csaf['initial_release_date'] = get_utc_timestamp(root_element.InitialReleaseDate.text)
-        self.csaf['status'] = self.tracking_status_mapping[root_element.Status.text]
+        children = ChildIndex(root_element)
+        self.csaf['id'] = self._remove_id_whitespace(
+            ChildIndex(children.first('Identification')).first('ID').text)
+        self.csaf['current_release_date'] = get_utc_timestamp(
+            children.first('CurrentReleaseDate').text)
+        self.csaf['initial_release_date'] = get_utc_timestamp(
+            children.first('InitialReleaseDate').text)
+        self.csaf['status'] = self.tracking_status_mapping[children.first('Status').text]
 
         revision_history, version = self._handle_revision_history_and_version(root_element)
         self.csaf['revision_history'] = revision_history
@@ -44,9 +47,10 @@ class DocumentTracking(SectionHandler):
         self.csaf['generator']['engine']['version'] = self.cvrf2csaf_version
 
     def _process_optional_elements(self, root_element):
-        if hasattr(root_element.Identification, 'Alias'):
+        identification = ChildIndex(ChildIndex(root_element).first('Identification'))
+        if 'Alias' in identification:
             aliases = []
-            for alias in root_element.Identification.Alias:
+            for alias in identification.get('Alias'):
                 aliases.append(alias.text)
 
             self.csaf['aliases'] = aliases
@@ -59,7 +63,7 @@ class DocumentTracking(SectionHandler):
         """
         id_string_clean = id_string.strip().replace("\r", "").replace("\n", "")
         if id_string_clean != id_string:
-            logging.warning(
+            SectionHandler.report_warning(
                 'The ID string contained leading/trailing whitespace or linebreaks. '
                 'These were removed.'
             )
@@ -97,21 +101,23 @@ class DocumentTracking(SectionHandler):
         the current version is added to the history.
         """
 
+        children = ChildIndex(root_element)
+        version = children.first('Version').text
         revision_history.append(
             {
-                'date': get_utc_timestamp(root_element.CurrentReleaseDate.text),
-                'number': root_element.Version.text,
+                'date': get_utc_timestamp(children.first('CurrentReleaseDate').text),
+                'number': version,
                 'summary': f'Added by {self.cvrf2csaf_name} as the value was missing in the '
                            f'original CVRF.',
                 # Extra vars
-                'number_cvrf': root_element.Version.text,
-                'version_as_int_tuple': self._as_int_tuple(root_element.Version.text),
+                'number_cvrf': version,
+                'version_as_int_tuple': self._as_int_tuple(version),
             }
         )
 
     @staticmethod
     def _reindex_versions_to_integers(root_element, revision_history):
-        logging.warning(
+        SectionHandler.report_warning(
             'Some version numbers in revision_history do not match semantic versioning. '
             'Reindexing to integers.')
 
@@ -124,45 +130,50 @@ class DocumentTracking(SectionHandler):
             revision['legacy_version'] = revision['number_cvrf']
 
         # after reindexing, match document version to corresponding one in revision history
+        cvrf_version = ChildIndex(root_element).first('Version').text
         version = next(rev for rev in revision_history_sorted if
-                       rev['number_cvrf'] == root_element.Version.text)['number']
+                       rev['number_cvrf'] == cvrf_version)['number']
 
         return revision_history_sorted, version
 
     def _handle_revision_history_and_version(self, root_element):
         # preprocess the data
+        children = ChildIndex(root_element)
         revision_history = []
-        for revision in root_element.RevisionHistory.Revision:
+        for revision in ChildIndex(children.first('RevisionHistory')).get('Revision'):
+            revision_children = ChildIndex(revision)
+            number = revision_children.first('Number').text
             # number_cvrf: keep original value in this variable for matching later
             # number: this value might be overwritten later if some version numbers doesn't match
             # semantic versioning
             revision_history.append(
                 {
-                    'date': get_utc_timestamp(revision.Date.text),
-                    'number': revision.Number.text,
-                    'summary': revision.Description.text,
+                    'date': get_utc_timestamp(revision_children.first('Date').text),
+                    'number': number,
+                    'summary': revision_children.first('Description').text,
                     # Extra vars
-                    'number_cvrf': revision.Number.text,
-                    'version_as_int_tuple': self._as_int_tuple(revision.Number.text),
+                    'number_cvrf': number,
+                    'version_as_int_tuple': self._as_int_tuple(number),
                 }
             )
 
         # Just copy over the version
-        version = root_element.Version.text
+        version = children.first('Version').text
 
         missing_latest_version_in_history = False
         # Do we miss the current version in the revision history?
         if not [rev for rev in revision_history if rev['number'] == version]:
             if self.fix_insert_current_version_into_revision_history:
-                logging.warning('Trying to fix the revision history by adding the current version. '
-                                'This may lead to inconsistent history. This happens because '
-                                '--fix-insert-current-version-into-revision-history is used. ')
+                SectionHandler.report_warning(
+                    'Trying to fix the revision history by adding the current version. '
+                    'This may lead to inconsistent history. This happens because '
+                    '--fix-insert-current-version-into-revision-history is used. ')
                 self._add_current_revision_to_history(root_element, revision_history)
             else:
-                logging.error('Current version is missing in revision history. This can be fixed by'
-                              ' using --fix-insert-current-version-into-revision-history.')
+                SectionHandler.report_error(
+                    'Current version is missing in revision history. This can be fixed by'
+                    ' using --fix-insert-current-version-into-revision-history.')
                 missing_latest_version_in_history = True
-                self.error_occurred = True
 
         # handle corresponding part of Conformance Clause 5: CVRF CSAF converter
         # that is: some version numbers in revision_history don't match semantic versioning
@@ -171,10 +182,10 @@ class DocumentTracking(SectionHandler):
                 revision_history, version = self._reindex_versions_to_integers(root_element,
                                                                                revision_history)
             else:
-                logging.error('Can not reindex revision history to integers because of missing'
-                              ' the current version. This can be fixed with'
-                              ' --fix-insert-current-version-into-revision-history')
-                self.error_occurred = True
+                SectionHandler.report_error(
+                    'Can not reindex revision history to integers because of missing'
+                    ' the current version. This can be fixed with'
+                    ' --fix-insert-current-version-into-revision-history')
 
         # cleanup extra vars
         for revision in revision_history:
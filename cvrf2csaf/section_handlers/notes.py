@@ -1,6 +1,5 @@
 """ Module containing Notes class """
-import logging
-from ..common.common import SectionHandler
+from ..common.common import ChildIndex, SectionHandler
 
 
 # pylint: disable=too-few-public-methods
@@ -26,7 +25,7 @@ class Notes(SectionHandler):
     def _process_mandatory_and_optional(self, root_element):
         notes = []
 
-        for elem_note in root_element.Note:
+        for elem_note in ChildIndex(root_element).get('Note'):
 
             # mandatory
             new_note = {
@@ -37,8 +36,7 @@ class Notes(SectionHandler):
             if new_note['category'] not in self.enum_categories:
                 log_msg = f'Invalid document notes category {new_note["category"]}. Should be' \
                           f' one of: {",".join(str(x) for x in sorted(self.enum_categories))}!'
-                logging.error(log_msg)
-                SectionHandler.error_occurred = True
+                SectionHandler.report_error(log_msg)
 
             # optional
             if elem_note.get('Audience'):
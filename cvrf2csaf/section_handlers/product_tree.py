@@ -1,6 +1,5 @@
 """ Module containing ProductTree class """
-import logging
-from ..common.common import SectionHandler
+from ..common.common import ChildIndex, SectionHandler, current_context
 
 
 # pylint: disable=too-few-public-methods
@@ -43,14 +42,32 @@ class ProductTree(SectionHandler):
         """ There are no mandatory elements in the ProductTree section """
 
     def _process_optional_elements(self, root_element):
-        self._handle_full_product_names(root_element)
-        self._handle_relationships(root_element)
-        self._handle_product_groups(root_element)
+        children = ChildIndex(root_element)
+        self._handle_full_product_names(children)
+        self._handle_relationships(children)
+        self._handle_product_groups(children)
 
-        branches = self._handle_branches_recursive(root_element)
+        branches = self._handle_branches_recursive(root_element, children)
         if branches is not None:
             self.csaf['branches'] = branches
 
+        self._check_references(root_element, children)
+
+    @staticmethod
+    def _check_references(root_element, children):
+        """
+        Checks the products referenced by product groups and relationships, all the products
+        of the tree are defined at this point.
+        """
+        product_index = current_context().product_index
+        if product_index is None:
+            return
+
+        product_index.check_references(root_element)
+        for rel_elem in children.get('Relationship'):
+            for attribute in ('ProductReference', 'RelatesToProductReference'):
+                product_index.check_product(rel_elem.attrib[attribute], rel_elem.sourceline)
+
     @staticmethod
     def _get_full_product_name(fpn_elem) -> dict:
         fpn = {
@@ -58,6 +75,10 @@ class ProductTree(SectionHandler):
             'name': fpn_elem.text
         }
 
+        product_index = current_context().product_index
+        if product_index is not None:
+            product_index.define_product(fpn['product_id'])
+
         if fpn_elem.attrib.get('CPE'):
             fpn['product_identification_helper'] = {'cpe': fpn_elem.attrib['CPE']}
 
@@ -66,35 +87,36 @@ class ProductTree(SectionHandler):
     @classmethod
     def _get_branch_type(cls, branch_type: str):
         if branch_type in ['Realm', 'Resource']:
-            logging.warning('Input branch type %s is no longer supported in CSAF. '
-                            'Converting to product_name', branch_type)
+            SectionHandler.report_warning('Input branch type %s is no longer supported in CSAF. '
+                                          'Converting to product_name', branch_type)
 
         return cls.branch_type_mapping[branch_type]
 
-    def _handle_full_product_names(self, root_element):
-        if not hasattr(root_element, 'FullProductName'):
+    def _handle_full_product_names(self, children):
+        if 'FullProductName' not in children:
             return
 
         full_product_names = []
-        for fpn_elem in root_element.FullProductName:
+        for fpn_elem in children.get('FullProductName'):
             full_product_names.append(self._get_full_product_name(fpn_elem))
 
         self.csaf['full_product_names'] = full_product_names
 
-    def _handle_relationships(self, root_element):
-        if not hasattr(root_element, 'Relationship'):
+    def _handle_relationships(self, children):
+        if 'Relationship' not in children:
             return
 
         relationships = []
-        for rel_elem in root_element.Relationship:
-            first_prod_name = rel_elem.FullProductName[0]
+        for rel_elem in children.get('Relationship'):
+            full_product_names = ChildIndex(rel_elem).get('FullProductName')
+            first_prod_name = full_product_names[0]
 
-            if len(rel_elem.FullProductName) > 1:
+            if len(full_product_names) > 1:
                 # To be compliant with 9.1.5 Conformance Clause 5: CVRF CSAF converter
                 # https://docs.oasis-open.org/csaf/csaf/v2.0/csaf-v2.0.html
-                logging.warning('Input line %s: Relationship contains more '
-                                'FullProductNames. Taking only the first one, since CSAF expects '
-                                'only 1 value here', rel_elem.sourceline)
+                SectionHandler.report_warning(
+                    'Input line %s: Relationship contains more FullProductNames. Taking only'
+                    ' the first one, since CSAF expects only 1 value here', rel_elem.sourceline)
 
             rel_to_add = {
                 'category': self.relation_type_mapping[rel_elem.attrib['RelationType']],
@@ -107,55 +129,62 @@ class ProductTree(SectionHandler):
 
         self.csaf['relationships'] = relationships
 
-    def _handle_product_groups(self, root_element):
-        if not hasattr(root_element, 'ProductGroups'):
+    def _handle_product_groups(self, children):
+        if 'ProductGroups' not in children:
             return
 
         product_groups = []
-        for pg_elem in root_element.ProductGroups.Group:
-            product_ids = [x.text for x in pg_elem.ProductID]
+        for pg_elem in ChildIndex(children.first('ProductGroups')).get('Group'):
+            group_children = ChildIndex(pg_elem)
+            product_ids = [x.text for x in group_children.get('ProductID')]
             pg_to_add = {
                 'group_id': pg_elem.attrib['GroupID'],
                 'product_ids': product_ids,
             }
 
-            if hasattr(pg_elem, 'Description'):
-                pg_to_add['summary'] = pg_elem.Description.text
+            product_index = current_context().product_index
+            if product_index is not None:
+                product_index.define_group(pg_to_add['group_id'])
+
+            if 'Description' in group_children:
+                pg_to_add['summary'] = group_children.first('Description').text
 
             product_groups.append(pg_to_add)
 
         self.csaf['product_groups'] = product_groups
 
-    def _handle_branches_recursive(self, root_element):
+    def _handle_branches_recursive(self, root_element, children):
         """ Recursive method for handling the branches,
-         branch can have either list of another branches, or a single FullProductName inside
+         branch can have either list of another branches, or a single FullProductName inside.
+         children is the ChildIndex of root_element.
         """
-        if not hasattr(root_element, 'Branch') and not hasattr(root_element, 'FullProductName'):
+        if 'Branch' not in children and 'FullProductName' not in children:
             # The ProductTree section doesn't contain Branches at all
             return None
 
-        if 'Branch' in root_element.tag and hasattr(root_element, 'FullProductName'):
+        if 'Branch' in root_element.tag and 'FullProductName' in children:
             # Make sure we are inside a Branch (and not in the top ProductTree element,
             # where FullProductName can occur) then root_element is the leaf branch
 
             leaf_branch = {
                 'name': root_element.attrib['Name'],
                 'category': self._get_branch_type(root_element.attrib['Type']),
-                'product': self._get_full_product_name(root_element.FullProductName)
+                'product': self._get_full_product_name(children.first('FullProductName'))
             }
 
             return leaf_branch
 
-        if hasattr(root_element, 'Branch'):
+        if 'Branch' in children:
             branches = []
-            for branch_elem in root_element.Branch:
-                if hasattr(branch_elem, 'FullProductName'):
-                    branches.append(self._handle_branches_recursive(branch_elem))
+            for branch_elem in children.get('Branch'):
+                branch_children = ChildIndex(branch_elem)
+                if 'FullProductName' in branch_children:
+                    branches.append(self._handle_branches_recursive(branch_elem, branch_children))
                 else:
                     branches.append({
                         'name': branch_elem.attrib['Name'],
                         'category': self._get_branch_type(branch_elem.attrib['Type']),
-                        'branches': self._handle_branches_recursive(branch_elem)
+                        'branches': self._handle_branches_recursive(branch_elem, branch_children)
                     })
 
             return branches
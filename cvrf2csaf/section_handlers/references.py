@@ -1,6 +1,6 @@
 """ Module containing References class """
 import logging
-from ..common.common import SectionHandler
+from ..common.common import ChildIndex, SectionHandler
 
 
 # pylint: disable=too-few-public-methods
@@ -18,9 +18,10 @@ class References(SectionHandler):
 
         references = []
 
-        for reference in root_element.Reference:
-            ref_csaf = {'summary': reference.Description.text,
-                        'url': reference.URL.text}
+        for reference in ChildIndex(root_element).get('Reference'):
+            children = ChildIndex(reference)
+            ref_csaf = {'summary': children.first('Description').text,
+                        'url': children.first('URL').text}
 
             if reference.attrib.get('Type'):
                 ref_csaf['category'] = reference.attrib['Type'].lower()
@@ -1,17 +1,21 @@
 """ Module containing Vulnerability class """
-import logging
 import bisect
+import json
 import re
 
 from collections import defaultdict
-from itertools import chain
 
-from ..common.common import SectionHandler
+from ..common.common import ChildIndex, SectionHandler, current_context
+from ..common.cvss import score_vectors
 from ..section_handlers.acknowledgments import Acknowledgments
 from ..section_handlers.references import References
 from ..section_handlers.notes import Notes
 from ..common.utils import get_utc_timestamp
 
+_VECTOR_ELEMENTS = {'cvss_v2': 'VectorV2', 'cvss_v3': 'VectorV3'}
+# CvssScores fields of the CSAF scores
+_COMPUTED_SCORE_FIELDS = {'baseScore': 'base_score', 'temporalScore': 'temporal_score',
+                          'environmentalScore': 'environmental_score'}
 
 # pylint: disable=too-few-public-methods
 class Vulnerability(SectionHandler):
@@ -35,6 +39,8 @@ class Vulnerability(SectionHandler):
         self.config = config
         self.remove_cvss_values_without_vector = config['remove_CVSS_values_without_vector']
         self.default_cvss_version = config['default_CVSS3_version']
+        self.merge_cvss_score_sets = config.get('merge_CVSS_score_sets', False)
+        self.compute_cvss_scores = config.get('compute_CVSS_scores', False)
 
     def _process_mandatory_elements(self, root_element):
         pass
@@ -42,12 +48,13 @@ class Vulnerability(SectionHandler):
     @staticmethod
     def _handle_involvements(root_element):
         involvements = []
-        for involvement_elem in root_element.Involvement:
+        for involvement_elem in ChildIndex(root_element).get('Involvement'):
             involvement = {'party': involvement_elem.attrib['Party'].lower(),
                            'status': involvement_elem.attrib['Status'].lower().replace(' ', '_')}
 
-            if hasattr(involvement_elem, 'Description'):
-                involvement['summary'] = involvement_elem.Description.text
+            children = ChildIndex(involvement_elem)
+            if 'Description' in children:
+                involvement['summary'] = children.first('Description').text
             involvements.append(involvement)
 
         return involvements
@@ -55,9 +62,10 @@ class Vulnerability(SectionHandler):
     @staticmethod
     def _handle_product_statuses(root_element):
         statuses = defaultdict(list)
-        for status_elem in root_element.Status:
+        for status_elem in ChildIndex(root_element).get('Status'):
             status_type = status_elem.attrib['Type'].lower().replace(' ', '_')
-            product_ids = [product_id.text for product_id in status_elem.ProductID]
+            product_ids = [product_id.text for product_id
+                           in ChildIndex(status_elem).get('ProductID')]
             statuses[status_type].extend(product_ids)
 
         return statuses
@@ -65,15 +73,17 @@ class Vulnerability(SectionHandler):
     @staticmethod
     def _handle_threats(root_element):
         threats = []
-        for threat_elem in root_element.Threat:
-            threat = {'details': threat_elem.Description.text,
+        for threat_elem in ChildIndex(root_element).get('Threat'):
+            children = ChildIndex(threat_elem)
+            threat = {'details': children.first('Description').text,
                       'category': threat_elem.attrib['Type'].lower().replace(' ', '_')}
 
-            if hasattr(threat_elem, 'ProductID'):
-                threat['product_ids'] = [product_id.text for product_id in threat_elem.ProductID]
+            if 'ProductID' in children:
+                threat['product_ids'] = [product_id.text for product_id
+                                         in children.get('ProductID')]
 
-            if hasattr(threat_elem, 'GroupID'):
-                threat['group_ids'] = [group_id.text for group_id in threat_elem.GroupID]
+            if 'GroupID' in children:
+                threat['group_ids'] = [group_id.text for group_id in children.get('GroupID')]
 
             if 'Date' in threat_elem.attrib:
                 threat['date'] = get_utc_timestamp(threat_elem.attrib['Date'])
@@ -92,23 +102,24 @@ class Vulnerability(SectionHandler):
                             'Will Not Fix': 'no_fix_planned'}
 
         remediations = []
-        for remediation_elem in root_element.Remediation:
+        for remediation_elem in ChildIndex(root_element).get('Remediation'):
+            children = ChildIndex(remediation_elem)
             remediation = {'category': category_mapping[remediation_elem.attrib['Type']],
-                           'details': remediation_elem.Description.text}
+                           'details': children.first('Description').text}
 
-            if hasattr(remediation_elem, 'Entitlement'):
+            if 'Entitlement' in children:
                 remediation['entitlements'] = [entitlement.text for entitlement in
-                                               remediation_elem.Entitlement]
+                                               children.get('Entitlement')]
 
-            if hasattr(remediation_elem, 'URL'):
-                remediation['url'] = remediation_elem.URL.text
+            if 'URL' in children:
+                remediation['url'] = children.first('URL').text
 
-            if hasattr(remediation_elem, 'ProductID'):
+            if 'ProductID' in children:
                 remediation['product_ids'] = [product_id.text for product_id in
-                                              remediation_elem.ProductID]
+                                              children.get('ProductID')]
 
-            if hasattr(remediation_elem, 'GroupID'):
-                remediation['group_ids'] = [group_id.text for group_id in remediation_elem.GroupID]
+            if 'GroupID' in children:
+                remediation['group_ids'] = [group_id.text for group_id in children.get('GroupID')]
 
             # The remediation object must contain at least one of
             # product_ids and group_ids (see 3.2.3.12 Vulnerabilities
@@ -126,8 +137,8 @@ class Vulnerability(SectionHandler):
                 if 'product_ids' not in remediation:
                     # If product_status did not contain product_ids,
                     # print an error
-                    SectionHandler.error_occurred = True
-                    logging.error('No product_ids or group_ids entries for remediation.')
+                    SectionHandler.report_error(
+                        'No product_ids or group_ids entries for remediation.')
 
             if 'Date' in remediation_elem.attrib:
                 remediation['date'] = get_utc_timestamp(remediation_elem.attrib['Date'])
@@ -152,14 +163,57 @@ class Vulnerability(SectionHandler):
             set(affected_product_id for state in states for affected_product_id
                 in product_status.get(state, [])))
 
-    # pylint: disable=too-many-arguments,too-many-positional-arguments
-    def _parse_score_set(self, score_set_element, mapping, version, json_property, product_status):
-        """Parses ScoreSetV2 or ScoreSetV3 element."""
+    @staticmethod
+    def _check_cvss_scores(cvss_score, mapping, json_property, computed_scores, sourceline):
+        """
+        Compares the scores of the score set with the ones computed from its vector,
+        the missing ones are filled in. The given scores are kept, mismatches are reported.
+        """
+        vector = cvss_score['vectorString']
+        scores, errors = computed_scores
+        if vector in errors:
+            SectionHandler.report_warning('Input line %s: %s, the CVSS scores are not verified.',
+                                          sourceline, errors[vector])
+            return cvss_score
+
+        computed = scores[vector]
+        if (computed.version == '2.0') != (json_property == 'cvss_v2'):
+            SectionHandler.report_warning('Input line %s: CVSS vector %s is not a %s vector, the'
+                                          ' CVSS scores are not verified.', sourceline, vector,
+                                          json_property)
+            return cvss_score
+
+        filled = {}
+        for score in ('baseScore', 'temporalScore', 'environmentalScore'):
+            value = getattr(computed, _COMPUTED_SCORE_FIELDS[score])
+            if score not in cvss_score:
+                if value is not None:
+                    filled[score] = value
+            elif value is not None and cvss_score[score] != value:
+                SectionHandler.report_warning('Input line %s: %s %s differs from %s computed from'
+                                              ' CVSS vector %s.', sourceline, score,
+                                              cvss_score[score], value, vector)
+        if not filled:
+            return cvss_score
+
+        current_context().stats['computed_CVSS_scores'] += len(filled)
+        # rebuilt to keep the order of the keys
+        return {csaf: cvss_score[csaf] if csaf in cvss_score else filled[csaf]
+                for csaf in mapping.values() if csaf in cvss_score or csaf in filled}
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-branches
+    def _parse_score_set(self, score_set_element, mapping, version, json_property, product_status,
+                         computed_scores=None):
+        """
+        Parses ScoreSetV2 or ScoreSetV3 element. The scores are checked against computed_scores,
+        tuple (CvssScores by vector, errors by vector) of score_vectors, if given.
+        """
 
-        # Parse all input elements except ProductID
+        children = ChildIndex(score_set_element)
+        # Parse all input elements except ProductID, empty elements are skipped
         # note: baseScore is always present since it's mandatory for the input
-        cvss_score = {csaf: score_set_element.find(f'{{*}}{cvrf}').text for cvrf, csaf
-                      in mapping.items() if score_set_element.find(f'{{*}}{cvrf}')}
+        cvss_score = {csaf: children.first(cvrf).text for cvrf, csaf in mapping.items()
+                      if cvrf in children and children.first(cvrf).text}
 
         # Convert all possible scores to float
         scores = ['baseScore', 'temporalScore', 'environmentalScore']
@@ -167,6 +221,10 @@ class Vulnerability(SectionHandler):
             if cvss_score.get(score):
                 cvss_score[score] = float(cvss_score[score])
 
+        if computed_scores is not None and 'vectorString' in cvss_score:
+            cvss_score = self._check_cvss_scores(cvss_score, mapping, json_property,
+                                                 computed_scores, score_set_element.sourceline)
+
         # Only cvss_v3 has baseSeverity
         if json_property == 'cvss_v3':
             cvss_score['baseSeverity'] = self._base_score_to_severity(cvss_score['baseScore'])
@@ -174,29 +232,27 @@ class Vulnerability(SectionHandler):
         # HANDLE product_ids
         product_ids = []
         # if we have ProductID element(s), parse and use
-        if hasattr(score_set_element, 'ProductID'):
-            product_ids = [product_id.text for product_id in score_set_element.ProductID]
+        if 'ProductID' in children:
+            product_ids = [product_id.text for product_id in children.get('ProductID')]
         # one of the conversion rules specifies what to do in case of missing ProductID element
         elif product_status:
             product_ids = self._parse_affected_product_ids(
                 product_status)
 
         if len(product_ids) == 0:
-            SectionHandler.error_occurred = True
-            logging.error('No product_id entry for CVSS score set.')
+            SectionHandler.report_error('No product_id entry for CVSS score set.')
 
         # HANDLE vectorString
         # if missing, conversion fails unless remove_CVSS_values_without_vector is true
         # if remove_CVSS_values_without_vector is true, we just ignore the score_set
         if 'vectorString' not in cvss_score:
             if self.remove_cvss_values_without_vector:
-                logging.warning(
+                SectionHandler.report_warning(
                     'No CVSS vector string found on the input, ignoring ScoreSet element due to'
                     ' "remove_CVSS_values_without_vector" option.')
                 return None
 
-            SectionHandler.error_occurred = True
-            logging.error('No CVSS vector string found on the input.')
+            SectionHandler.report_error('No CVSS vector string found on the input.')
 
         # DETERMINE CVSS v 3.x from namespace
         cvss_3_regex = r'.*cvss-v(3\.[01]).*'
@@ -210,8 +266,8 @@ class Vulnerability(SectionHandler):
             regex = r"CVSS:(3\.[01]).*"
             match = re.match(regex, cvss_score['vectorString'])
             if not match:
-                SectionHandler.error_occurred = True
-                logging.error('CVSS vector %s is not valid.', cvss_score["vectorString"])
+                SectionHandler.report_error('CVSS vector %s is not valid.',
+                                            cvss_score["vectorString"])
             else:
                 version = match.groups()[0]
 
@@ -226,32 +282,59 @@ class Vulnerability(SectionHandler):
     def _remove_cvssv3_duplicates(scores):
         """
         Removes products/cvssv3.x score sets for products having both v3.0 and v3.1 score.
-        Three-step approach:
-         - find products having both versions specified
-         - remove those products from score set with version 3.0
-         - removes score sets with no products
+        Two passes over the score sets:
+         - collect products having v3.1 score
+         - remove those products from score sets with version 3.0,
+           dropping score sets with no products left
         """
-        # STEP 1
-        products_v3_1 = set(chain.from_iterable([score_set['products'] for score_set in scores if
-                                                 'cvss_v3' in score_set and score_set['cvss_v3'][
-                                                     'version'] == '3.1']))
-        products_v3_0 = set(chain.from_iterable([score_set['products'] for score_set in scores if
-                                                 'cvss_v3' in score_set and score_set['cvss_v3'][
-                                                     'version'] == '3.0']))
-
-        both_versions = products_v3_0.intersection(products_v3_1)
+        products_v3_1 = set()
+        for score_set in scores:
+            if 'cvss_v3' in score_set and score_set['cvss_v3']['version'] == '3.1':
+                products_v3_1.update(score_set['products'])
 
-        # STEP 2
+        deduplicated = []
         for score_set in scores:
-            if 'cvss_v3' in score_set and score_set['cvss_v3']['version'] == '3.0':
+            if products_v3_1 and 'cvss_v3' in score_set \
+                    and score_set['cvss_v3']['version'] == '3.0':
                 score_set['products'] = [product for product in score_set['products'] if
-                                         product not in both_versions]
+                                         product not in products_v3_1]
+            if len(score_set['products']) > 0:
+                deduplicated.append(score_set)
 
-        # STEP 3
-        scores = [score_set for score_set in scores if len(score_set['products']) > 0]
+        return deduplicated
 
-        return scores
+    @staticmethod
+    def _merge_score_sets(scores):
+        """
+        Merges score sets with the same CVSS version, vector and scores into the first of them,
+        their products are concatenated without duplicates. Score sets are grouped by hashing
+        their CVSS values, so the merge is linear in the number of score sets.
+        """
+        merged = {}
+        for score_set in scores:
+            cvss_property = 'cvss_v3' if 'cvss_v3' in score_set else 'cvss_v2'
+            key = (cvss_property, frozenset(score_set[cvss_property].items()))
+            if key in merged:
+                merged[key]['products'].extend(score_set['products'])
+            else:
+                # copied, the given score sets are left intact
+                merged[key] = {**score_set, 'products': list(score_set['products'])}
+
+        for score_set in merged.values():
+            score_set['products'] = list(dict.fromkeys(score_set['products']))
 
+        return list(merged.values())
+
+    @staticmethod
+    def _score_vectors(children, score_variants):
+        """ Scores all vectors of the score sets at once, repeated ones are scored once. """
+        vector_elements = (
+            vector for score_variant, _, _, target in score_variants
+            for score_set in children.get(score_variant)
+            for vector in ChildIndex(score_set).get(_VECTOR_ELEMENTS[target])[:1])
+        return score_vectors(vector.text for vector in vector_elements if vector.text)
+
+    # pylint: disable=too-many-locals
     def _handle_scores(self, root_element, product_status):
         scores = []
 
@@ -259,86 +342,117 @@ class Vulnerability(SectionHandler):
             ('ScoreSetV2', self.cvss_v2_mapping, '2.0', 'cvss_v2'),
             ('ScoreSetV3', self.cvss_v3_mapping, self.default_cvss_version, 'cvss_v3'),
         )
+        children = ChildIndex(root_element)
+        computed_scores = None
+        if self.compute_cvss_scores:
+            computed_scores = self._score_vectors(children, score_variants)
+
         for score_variant, mapping, score_version, target in score_variants:
-            for score_set in root_element.findall(f'{{*}}{score_variant}'):
+            for score_set in children.get(score_variant):
                 score = self._parse_score_set(score_set, mapping, score_version, target,
-                                              product_status)
+                                              product_status, computed_scores)
                 if score is not None:
                     scores.append(score)
 
         scores = self._remove_cvssv3_duplicates(scores)
 
+        if self.merge_cvss_score_sets and len(scores) > 1:
+            merged = self._merge_score_sets(scores)
+            if len(merged) < len(scores):
+                # size of the compact JSON, the indented output saves even more
+                size_before = len(json.dumps(scores))
+                stats = current_context().stats
+                stats['merged_score_sets'] += len(scores) - len(merged)
+                stats['merged_score_sets_bytes_saved'] += size_before - len(json.dumps(merged))
+            scores = merged
+
         return scores
 
+    @staticmethod
+    def check_references(root_element):
+        """
+        Checks that the products and groups referenced by product statuses, threats,
+        remediations and score sets of the Vulnerability element are defined in ProductTree.
+        Does nothing unless the references are checked in the current conversion.
+        """
+        product_index = current_context().product_index
+        if product_index is not None:
+            product_index.check_references(root_element)
+
     # pylint: disable=too-many-branches
     def _process_optional_elements(self, root_element):
         vulnerability = {}
+        children = ChildIndex(root_element)
+        self.check_references(root_element)
 
-        if hasattr(root_element, 'Acknowledgments'):
+        if 'Acknowledgments' in children:
             # reuse Acknowledgments handler
             acknowledgments_handler = Acknowledgments()
-            acknowledgments_handler.create_csaf(root_element.Acknowledgments)
+            acknowledgments_handler.create_csaf(children.first('Acknowledgments'))
             vulnerability['acknowledgments'] = acknowledgments_handler.csaf
 
-        if hasattr(root_element, 'CVE'):
+        if 'CVE' in children:
             # "^CVE-[0-9]{4}-[0-9]{4,}$" differs from the CVRF regex.
             # Will be checked by json schema validation.
-            vulnerability['cve'] = root_element.CVE.text
+            vulnerability['cve'] = children.first('CVE').text
 
-        if hasattr(root_element, 'CWE'):
-            cwe_elements = root_element.CWE
+        if 'CWE' in children:
+            cwe_elements = children.get('CWE')
             if len(cwe_elements) > 1:
-                logging.warning('%s CWE elements found, using only the first one.',
-                                len(cwe_elements))
+                SectionHandler.report_warning('%s CWE elements found, using only the first one.',
+                                              len(cwe_elements))
             vulnerability['cwe'] = {'id': cwe_elements[0].attrib['ID'],
                                     'name': cwe_elements[0].text}
 
-        if hasattr(root_element, 'DiscoveryDate'):
-            vulnerability['discovery_date'] = get_utc_timestamp(root_element.DiscoveryDate.text)
+        if 'DiscoveryDate' in children:
+            vulnerability['discovery_date'] = get_utc_timestamp(
+                children.first('DiscoveryDate').text)
 
-        if hasattr(root_element, 'ID'):
-            vulnerability['ids'] = [{'system_name': root_element.ID.attrib['SystemName'],
-                                     'text': root_element.ID.text}]
+        if 'ID' in children:
+            id_elem = children.first('ID')
+            vulnerability['ids'] = [{'system_name': id_elem.attrib['SystemName'],
+                                     'text': id_elem.text}]
 
-        if hasattr(root_element, 'Involvements'):
-            vulnerability['involvements'] = self._handle_involvements(root_element.Involvements)
+        if 'Involvements' in children:
+            vulnerability['involvements'] = self._handle_involvements(
+                children.first('Involvements'))
 
-        if hasattr(root_element, 'Notes'):
+        if 'Notes' in children:
             # reuse Notes handler
             notes_handler = Notes()
-            notes_handler.create_csaf(root_element.Notes)
+            notes_handler.create_csaf(children.first('Notes'))
             vulnerability['notes'] = notes_handler.csaf
 
-        if hasattr(root_element, 'ProductStatuses'):
+        if 'ProductStatuses' in children:
             vulnerability['product_status'] = self._handle_product_statuses(
-                root_element.ProductStatuses)
+                children.first('ProductStatuses'))
 
-        if hasattr(root_element, 'References'):
+        if 'References' in children:
             # reuse References handler
             references_handler = References(config=self.config)
-            references_handler.create_csaf(root_element.References)
+            references_handler.create_csaf(children.first('References'))
             vulnerability['references'] = references_handler.csaf
 
-        if hasattr(root_element, 'ReleaseDate'):
-            vulnerability['release_date'] = get_utc_timestamp(root_element.ReleaseDate.text)
+        if 'ReleaseDate' in children:
+            vulnerability['release_date'] = get_utc_timestamp(children.first('ReleaseDate').text)
 
-        if hasattr(root_element, 'Remediations'):
+        if 'Remediations' in children:
             vulnerability['remediations'] = self._handle_remediations(
-                root_element.Remediations, vulnerability.get('product_status'))
+                children.first('Remediations'), vulnerability.get('product_status'))
 
-        if hasattr(root_element, 'CVSSScoreSets'):
-            scores = self._handle_scores(root_element.CVSSScoreSets,
+        if 'CVSSScoreSets' in children:
+            scores = self._handle_scores(children.first('CVSSScoreSets'),
                                          vulnerability.get('product_status'))
             if len(scores) == 0:
-                logging.warning('None of the ScoreSet elements parsed,'
-                                ' removing "scores" entry from the output.')
+                SectionHandler.report_warning('None of the ScoreSet elements parsed,'
+                                              ' removing "scores" entry from the output.')
             else:
                 vulnerability['scores'] = scores
 
-        if hasattr(root_element, 'Threats'):
-            vulnerability['threats'] = self._handle_threats(root_element.Threats)
+        if 'Threats' in children:
+            vulnerability['threats'] = self._handle_threats(children.first('Threats'))
 
-        if hasattr(root_element, 'Title'):
-            vulnerability['title'] = root_element.Title.text
+        if 'Title' in children:
+            vulnerability['title'] = children.first('Title').text
 
         self.csaf.append(vulnerability)
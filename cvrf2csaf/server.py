@@ -0,0 +1,213 @@
+"""
+Module containing the conversion server (cvrf2csaf serve). Documents are converted by
+a pool of worker processes which are started and warmed up once, so a request costs
+only the conversion itself.
+"""
+import io
+import logging
+import os
+import signal
+import socketserver
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .common.serialization import dumps
+from .common.utils import CriticalExit, critical_exit
+from .document_handler import VALIDATION_LEVELS, DocumentHandler, warm_up_checks
+
+DEFAULT_MAX_REQUEST_SIZE = 10 * 1024 * 1024
+
+# Set in each worker process by _init_worker, so config is sent to the worker only once
+# pylint: disable=invalid-name
+_worker_config = None
+_worker_pkg_version = None
+_worker_log = None
+
+
+class _ListLogHandler(logging.Handler):
+    """ Collects the log messages of the request being converted by the worker. """
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append({'level': record.levelname, 'message': record.getMessage()})
+
+
+def _init_worker(config, pkg_version):
+    # pylint: disable=global-statement
+    global _worker_config, _worker_pkg_version, _worker_log
+    _worker_config = config
+    _worker_pkg_version = pkg_version
+    _worker_log = _ListLogHandler()
+    logging.getLogger().addHandler(_worker_log)
+    # compile the schemata and load the mandatory tests before the first request arrives
+    warm_up_checks(VALIDATION_LEVELS[config.get('validate', 'full')])
+
+
+def _convert_request(data) -> tuple:
+    """
+    Converts CVRF document given as bytes inside a worker.
+    return: tuple (HTTP status, response dict)
+    """
+    _worker_log.messages = []
+    handler = DocumentHandler(_worker_config, _worker_pkg_version)
+    response = {'valid': False, 'csaf': None, 'validation': list(handler.checks),
+                'messages': _worker_log.messages}
+
+    try:
+        source = io.BytesIO(data)
+        source.name = '<request>'
+        response['csaf'] = handler.convert_file(path=source)
+    except CriticalExit:
+        # invalid input, the reason is in the messages
+        return HTTPStatus.UNPROCESSABLE_ENTITY, response
+    # pylint: disable=broad-except
+    except Exception as e:
+        logging.exception('Unexpected error when converting the request.')
+        response['messages'].append({'level': 'CRITICAL', 'message': f'Unexpected error: {e}'})
+        return HTTPStatus.INTERNAL_SERVER_ERROR, response
+
+    try:
+        valid_schema = 'output' not in handler.checks \
+            or handler.validate_output_against_schema(response['csaf'])
+        valid_mandatory_tests = 'mandatory_tests' not in handler.checks \
+            or handler.validate_mandatory_tests(response['csaf'])
+    # pylint: disable=broad-except
+    except Exception as e:
+        logging.exception('Unexpected error when validating the output.')
+        response['messages'].append({'level': 'CRITICAL', 'message': f'Unexpected error: {e}'})
+        return HTTPStatus.INTERNAL_SERVER_ERROR, response
+
+    response['valid'] = valid_schema and valid_mandatory_tests \
+        and not handler.context.error_occurred
+    return HTTPStatus.OK, response
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """
+    POST / with CVRF XML in the body returns JSON with the converted CSAF document,
+    validity of the output and the warnings/errors logged during the conversion.
+    GET /health returns 200 when the server is up.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        # pylint: disable=invalid-name,missing-function-docstring
+        if self.path != '/health':
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': 'Not found.'})
+            return
+        self._send_json(HTTPStatus.OK, {'status': 'ok'})
+
+    def do_POST(self):
+        # pylint: disable=invalid-name,missing-function-docstring
+        if self.path != '/':
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': 'Not found.'})
+            return
+
+        try:
+            length = int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            self.close_connection = True
+            self._send_json(HTTPStatus.LENGTH_REQUIRED, {'error': 'Content-Length is required.'})
+            return
+
+        if length < 0:
+            # rfile.read() of a negative length would read until EOF, past the size limit
+            self.close_connection = True
+            self._send_json(HTTPStatus.BAD_REQUEST, {'error': 'Invalid Content-Length.'})
+            return
+
+        if length > self.server.max_request_size:
+            # the body is not read, so the connection can't be reused
+            self.close_connection = True
+            self._send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            {'error': f'Request exceeds {self.server.max_request_size} bytes.'})
+            return
+
+        data = self.rfile.read(length)
+        try:
+            status, response = self.server.executor.submit(_convert_request, data).result()
+        except BrokenProcessPool as e:
+            logging.error('Worker process terminated abruptly: %s', e)
+            status, response = HTTPStatus.SERVICE_UNAVAILABLE, {'error': 'Worker failed.'}
+        self._send_json(status, response)
+
+    def _send_json(self, status, content):
+        body = dumps(content)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # client address of a UNIX socket is empty
+        return self.client_address[0] if self.client_address else 'unix-socket'
+
+    # pylint: disable=redefined-builtin
+    def log_message(self, format, *args):
+        logging.info('%s - %s', self.address_string(), format % args)
+
+
+class _ServerMixin:
+    """ Settings of the server shared by the request handler threads. """
+    # pylint: disable=too-few-public-methods
+    daemon_threads = True
+    max_request_size = DEFAULT_MAX_REQUEST_SIZE
+    executor = None
+
+
+class _HTTPServer(_ServerMixin, ThreadingHTTPServer):
+    pass
+
+
+class _UnixHTTPServer(_ServerMixin, socketserver.ThreadingUnixStreamServer):
+    pass
+
+
+def run_server(config, pkg_version):
+    """
+    Serves conversion requests until interrupted, on config['unix_socket'] if set,
+    otherwise over HTTP on config['host']:config['port'].
+    """
+    workers = config.get('workers') or os.cpu_count() or 1
+    if workers < 1:
+        critical_exit('Number of workers must be a positive integer.')
+
+    unix_socket = config.get('unix_socket')
+    try:
+        if unix_socket:
+            if os.path.exists(unix_socket):
+                os.remove(unix_socket)
+            server = _UnixHTTPServer(unix_socket, _RequestHandler)
+            address = unix_socket
+        else:
+            server = _HTTPServer((config.get('host'), config.get('port')), _RequestHandler)
+            address = f'http://{config.get("host")}:{server.server_address[1]}'
+    except OSError as e:
+        critical_exit(f'Failed to start the server: {e}.')
+
+    server.max_request_size = config.get('max_request_size') or DEFAULT_MAX_REQUEST_SIZE
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(config, pkg_version)) as server.executor:
+        # start the workers now instead of on the first request. Unless the workers are forked,
+        # they are started on demand, one for each task submitted while none of them is idle.
+        for future in [server.executor.submit(int) for _ in range(workers)]:
+            future.result()
+        # stop gracefully on SIGTERM as well, the workers keep the default handler
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        logging.info('Serving on %s using %s worker(s).', address, workers)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logging.info('Shutting down.')
+        finally:
+            server.server_close()
+            if unix_socket and os.path.exists(unix_socket):
+                os.remove(unix_socket)
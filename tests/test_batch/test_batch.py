@@ -0,0 +1,226 @@
+"""File containing tests of the conversion of archives and the NDJSON output."""
+import bz2
+import glob
+import gzip
+import asyncio
+import io
+import json
+import lzma
+import os
+import subprocess
+import sys
+import tarfile
+import zipfile
+
+import pytest
+
+from cvrf2csaf import aio, batch
+from cvrf2csaf.aio import pipeline, run_pipeline
+from cvrf2csaf.batch import collect_input_files, open_ndjson_output, run_batch, run_bulk
+from cvrf2csaf.common.utils import get_config_from_file, get_pkg_version
+from cvrf2csaf.document_handler import convert_and_validate
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+INPUT_FILES = sorted(glob.glob(os.path.join(ROOT_DIR, 'examples', '1.2', '*.xml')))
+# the examples with unique tracking IDs
+UNIQUE_INPUT_FILES = [path for path in INPUT_FILES
+                      if os.path.basename(path) in ('cvrf_example_a.xml', 'cvrf_example_b.xml',
+                                                    'cvrf_example_c.xml', 'cvrf_example_d.xml',
+                                                    'cvrf_example_e.xml')]
+
+# the examples can't be validated offline against the schema, the CVSS schemata are remote
+config = {**get_config_from_file(), 'validate': 'mandatory', 'force': True, 'jobs': 1}
+# the version of the generator, the same as in a subprocess
+PKG_VERSION = get_pkg_version()
+
+
+# pylint: disable=missing-function-docstring
+def without_date(csaf):
+    csaf['document']['tracking']['generator'].pop('date')
+    return csaf
+
+
+def expected_record(input_file, name):
+    csaf, valid = convert_and_validate(config, PKG_VERSION, input_file)
+    return {'file_name': name, 'valid': valid, 'error': None, 'csaf': without_date(csaf)}
+
+
+def read_records(data):
+    records = [json.loads(line) for line in data.splitlines()]
+    for record in records:
+        if record['csaf'] is not None:
+            without_date(record['csaf'])
+    return records
+
+
+def make_archive(path, kind, input_files):
+    """ Writes the tar or zip archive of the input files under docs/, with a non-CVRF member. """
+    if kind == 'zip':
+        with zipfile.ZipFile(path, 'w') as archive:
+            archive.writestr('docs/README.txt', 'not a CVRF document')
+            for input_file in input_files:
+                archive.write(input_file, f'docs/{os.path.basename(input_file)}')
+    else:
+        with tarfile.open(path, f'w:{kind}') as archive:
+            readme = b'not a CVRF document'
+            info = tarfile.TarInfo('docs/README.txt')
+            info.size = len(readme)
+            archive.addfile(info, io.BytesIO(readme))
+            for input_file in input_files:
+                archive.add(input_file, f'docs/{os.path.basename(input_file)}')
+
+
+@pytest.mark.parametrize('kind', ['', 'gz', 'xz', 'zip'])
+def test_archive_to_ndjson(tmp_path, kind):
+    """ Each CVRF member of the archive is one NDJSON line, in the order of the members. """
+    archive_path = str(tmp_path / f'docs.{kind or "tar"}')
+    make_archive(archive_path, kind, INPUT_FILES)
+    output = tmp_path / 'out.ndjson'
+
+    status = run_bulk({**config, 'input_archive': archive_path, 'output_ndjson': str(output)},
+                      PKG_VERSION)
+
+    assert status == 0
+    assert read_records(output.read_bytes()) == [
+        expected_record(input_file, f'docs/{os.path.basename(input_file)}')
+        for input_file in INPUT_FILES]
+
+
+def test_archive_to_output_dir(tmp_path):
+    archive_path = str(tmp_path / 'docs.tar.gz')
+    make_archive(archive_path, 'gz', UNIQUE_INPUT_FILES)
+    output_dir = tmp_path / 'out'
+
+    status = run_bulk({**config, 'input_archive': archive_path, 'output_dir': str(output_dir)},
+                      PKG_VERSION)
+
+    assert status == 0
+    assert sorted(os.listdir(output_dir)) == [
+        'acme-2017-42.json', 'cisco-sa-20170310-struts2_invalid.json', 'id0_invalid.json',
+        'rhsa-2017_0435_invalid.json', 'vendorix-sa-20170301-abc_invalid.json']
+
+
+def test_failed_member(tmp_path):
+    """ A broken document fails on its own NDJSON line, the other ones are converted. """
+    archive_path = str(tmp_path / 'docs.zip')
+    with zipfile.ZipFile(archive_path, 'w') as archive:
+        archive.writestr('broken.xml', '<cvrfdoc')
+        archive.write(INPUT_FILES[0], 'a.xml')
+    output = tmp_path / 'out.ndjson'
+
+    status = run_bulk({**config, 'input_archive': archive_path, 'output_ndjson': str(output)},
+                      PKG_VERSION)
+
+    assert status == 1
+    broken, converted = read_records(output.read_bytes())
+    assert broken['file_name'] == 'broken.xml'
+    assert broken['csaf'] is None and not broken['valid'] and broken['error']
+    assert converted == expected_record(INPUT_FILES[0], 'a.xml')
+
+
+def run_stdin(data):
+    """ Runs the converter reading --input-archive from stdin and writing NDJSON to stdout. """
+    return subprocess.run(
+        [sys.executable, '-m', 'cvrf2csaf', '--input-archive', '-', '--output-ndjson', '-',
+         '--validate', 'mandatory', '--force', '--jobs', '1'],
+        input=data, capture_output=True, check=True).stdout
+
+
+@pytest.mark.parametrize('kind', ['gz', 'zip'])
+def test_stdin_archive(tmp_path, kind):
+    archive_path = tmp_path / f'docs.{kind}'
+    make_archive(str(archive_path), kind, UNIQUE_INPUT_FILES)
+
+    assert read_records(run_stdin(archive_path.read_bytes())) == [
+        expected_record(input_file, f'docs/{os.path.basename(input_file)}')
+        for input_file in UNIQUE_INPUT_FILES]
+
+
+def test_stdin_document():
+    """ A single CVRF document piped instead of an archive is converted as <stdin>. """
+    with open(INPUT_FILES[0], 'rb') as f:
+        data = f.read()
+
+    assert read_records(run_stdin(data)) == [expected_record(INPUT_FILES[0], '<stdin>')]
+
+
+@pytest.mark.parametrize('module', [gzip, bz2, lzma], ids=['gzip', 'bz2', 'xz'])
+def test_stdin_compressed_document(module):
+    """ A compressed CVRF document is not taken for a compressed tar archive. """
+    with open(INPUT_FILES[0], 'rb') as f:
+        data = module.compress(f.read())
+
+    assert read_records(run_stdin(data)) == [expected_record(INPUT_FILES[0], '<stdin>')]
+
+
+def test_stdin_truncated_archive(tmp_path):
+    archive_path = tmp_path / 'docs.tar.gz'
+    make_archive(str(archive_path), 'gz', UNIQUE_INPUT_FILES)
+
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        run_stdin(archive_path.read_bytes()[:-100])
+    assert b'Failed to read input archive -' in e.value.stderr
+
+
+@pytest.mark.parametrize('run', [
+    lambda config: run_batch(config, PKG_VERSION, INPUT_FILES),
+    lambda config: run_bulk(config, PKG_VERSION),
+    lambda config: run_pipeline(config, PKG_VERSION)], ids=['batch', 'bulk', 'pipeline'])
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_output_collision(tmp_path, caplog, run, jobs):
+    """ Documents with the same tracking ID fail instead of overwriting the first one's output. """
+    output_dir = tmp_path / 'out'
+
+    status = run({**config, 'input_dir': os.path.join(ROOT_DIR, 'examples', '1.2'),
+                  'output_dir': str(output_dir), 'jobs': jobs})
+
+    assert status == 1
+    # three of the examples share the tracking ID vendorix-sa-20170301-abc
+    assert len(os.listdir(output_dir)) == len(INPUT_FILES) - 2
+    assert sum(message.startswith('FAILED') and 'was already written for' in message
+               for message in caplog.messages) == 2
+    assert '2 documents were not written, their output file was already written for another' \
+           ' document with the same tracking ID.' in caplog.messages
+
+
+def convert_or_crash(member, write=True):
+    """ Converts the member in the worker, terminates the worker on crash.xml. """
+    if member[0] == 'crash.xml':
+        os._exit(1)
+    return batch.convert_data(member, write)
+
+
+def test_pipeline_broken_worker(tmp_path, monkeypatch):
+    """ A terminated worker fails the documents left in the pool, the run goes on. """
+    monkeypatch.setattr(aio, 'convert_data', convert_or_crash)
+    inputs = [(UNIQUE_INPUT_FILES[0], None), ('crash.xml', None), (UNIQUE_INPUT_FILES[1], None)]
+    output_path = tmp_path / 'out.ndjson'
+
+    results = asyncio.run(pipeline({**config, 'output_ndjson': str(output_path)}, PKG_VERSION,
+                                   inputs))
+
+    assert [result['input_file'] for result in results] == [name for name, _ in inputs]
+    assert results[1]['error'] == results[2]['error'] == 'Worker failed.'
+    # a record of each document, also of the failed ones
+    records = read_records(output_path.read_bytes())
+    assert [record['file_name'] for record in records] == [name for name, _ in inputs]
+    assert records[2] == {'file_name': UNIQUE_INPUT_FILES[1], 'valid': False,
+                          'error': 'Worker failed.', 'csaf': None}
+
+
+def test_input_dir_suffixes_any_case(tmp_path):
+    for name in ('a.xml', 'b.XML', 'c.Xml.gz', 'd.xml.ZST', 'e.json', 'f.xml.txt', '.g.xml'):
+        (tmp_path / name).touch()
+    (tmp_path / 'h.xml').mkdir()
+
+    assert collect_input_files({'input_dir': str(tmp_path)}) == [
+        str(tmp_path / name) for name in ('a.xml', 'b.XML', 'c.Xml.gz', 'd.xml.ZST')]
+
+
+@pytest.mark.parametrize('compression', ['none', 'gzip'])
+def test_stdout_output_uncompressed(caplog, compression):
+    out = open_ndjson_output({'output_ndjson': '-', 'output_compression': compression})
+
+    assert out is sys.stdout.buffer
+    assert ('--output-compression is not supported with --output-ndjson -, writing uncompressed'
+            ' records to stdout.' in caplog.messages) == (compression != 'none')
@@ -0,0 +1,161 @@
+"""File containing tests of the benchmark suite (cvrf2csaf-bench)."""
+import json
+import os
+import sys
+
+import pytest
+
+from cvrf2csaf import bench
+from cvrf2csaf.bench import STAGES, compare_with_baseline, corpus_difference, run_benchmark
+from cvrf2csaf.common.utils import CriticalExit
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+INPUT_FILES = [os.path.join(ROOT_DIR, 'examples', '1.2', name)
+               for name in ('cvrf_example_a.xml', 'cvrf_example_e.xml')]
+
+
+# pylint: disable=missing-function-docstring
+def make_report(stage_time=1.0, peak_rss_kb=1000, input_files=None):
+    """ Returns report of the input files, each stage of each document taking stage_time. """
+    input_files = INPUT_FILES if input_files is None else input_files
+    documents = [{'path': path, 'size': os.path.getsize(path), 'output_size': 1,
+                  'stages': dict.fromkeys(STAGES, stage_time), 'errors': {}}
+                 for path in input_files]
+    stages = dict.fromkeys(STAGES, stage_time * len(documents))
+    return {'documents': documents, 'stages': stages, 'total': sum(stages.values()),
+            'peak_rss_kb': peak_rss_kb}
+
+
+def slower(report, stage, factor, path=None):
+    """ Returns copy of the report with the stage slower by the factor, in one document if path. """
+    report = json.loads(json.dumps(report))
+    for document in report['documents']:
+        if path is None or document['path'] == path:
+            document['stages'][stage] *= factor
+    report['stages'][stage] = sum(document['stages'][stage] for document in report['documents'])
+    report['total'] = sum(report['stages'].values())
+    return report
+
+
+def names(regressions):
+    return [regression.partition(':')[0] for regression in regressions]
+
+
+def test_no_regression():
+    assert not compare_with_baseline(make_report(), make_report(), {}, 0.1)
+    # faster is not a regression
+    assert not compare_with_baseline(make_report(0.5, 500), make_report(), {}, 0.1)
+
+
+def test_default_threshold():
+    baseline = make_report()
+
+    # the stage, the total and both documents are slower
+    assert names(compare_with_baseline(slower(baseline, 'parse', 2), baseline, {}, 0.1)) == [
+        'parse', 'total', f'total of {INPUT_FILES[0]}', f'total of {INPUT_FILES[1]}']
+    assert not compare_with_baseline(slower(baseline, 'parse', 2), baseline, {}, 1.5)
+
+
+def test_threshold_of_stage():
+    baseline = make_report()
+    report = slower(baseline, 'mandatory_tests', 1.3)
+
+    # a slower stage within its own threshold, the totals within the default one
+    assert not compare_with_baseline(report, baseline, {'mandatory_tests': 0.5}, 0.1)
+    assert names(compare_with_baseline(report, baseline, {'conversion': 0.5}, 0.1)) \
+        == ['mandatory_tests']
+
+
+def test_threshold_of_total_used_for_documents():
+    baseline = make_report()
+    # one document 30 % slower, the total of both only 15 %
+    report = slower(baseline, 'conversion', 2.8, INPUT_FILES[1])
+
+    assert names(compare_with_baseline(report, baseline, {'conversion': 10, 'total': 0.2}, 0.1)) \
+        == [f'total of {INPUT_FILES[1]}']
+
+
+def test_peak_rss():
+    baseline = make_report()
+
+    assert names(compare_with_baseline(make_report(peak_rss_kb=1200), baseline, {}, 0.1)) \
+        == ['peak_rss_kb']
+    assert not compare_with_baseline(make_report(peak_rss_kb=1200), baseline,
+                                     {'peak_rss_kb': 0.25}, 0.1)
+
+
+def test_missing_baseline_values_skipped():
+    baseline = make_report()
+    del baseline['stages']['parse'], baseline['peak_rss_kb']
+
+    assert names(compare_with_baseline(slower(make_report(peak_rss_kb=5000), 'parse', 2),
+                                       baseline, {}, 0.1)) \
+        == ['total', f'total of {INPUT_FILES[0]}', f'total of {INPUT_FILES[1]}']
+
+
+def test_corpus_difference(tmp_path):
+    baseline = make_report()
+    assert corpus_difference(INPUT_FILES, baseline) is None
+
+    changed = tmp_path / 'changed.xml'
+    changed.write_bytes(b'<cvrfdoc/>')
+    baseline['documents'][0]['path'] = str(changed)
+    changed.write_bytes(b'<cvrfdoc />')
+
+    assert corpus_difference(INPUT_FILES[1:] + [str(changed)], baseline) \
+        == f'1 documents changed since the baseline ({changed})'
+    assert corpus_difference(INPUT_FILES, baseline) \
+        == f'1 documents missing in the baseline ({os.path.abspath(INPUT_FILES[0])});' \
+           f' 1 documents only in the baseline ({changed})'
+
+
+def run_main(monkeypatch, tmp_path, report, baseline, *args):
+    """ Runs cvrf2csaf-bench with the report measured, returns its exit status. """
+    baseline_path = tmp_path / 'baseline.json'
+    baseline_path.write_text(json.dumps(baseline), encoding='utf-8')
+    monkeypatch.setattr(bench, 'run_benchmark', lambda input_files, repeat: {
+        **report, 'docs_per_sec': 1.0, 'mb_per_sec': 1.0})
+    monkeypatch.setattr(sys, 'argv', ['cvrf2csaf-bench', *INPUT_FILES, '--baseline',
+                                      str(baseline_path), *args])
+    try:
+        bench.main()
+    except CriticalExit:
+        raise
+    except SystemExit as e:
+        return e.code
+    return 0
+
+
+def test_main_thresholds(monkeypatch, tmp_path):
+    baseline = make_report()
+    report = slower(baseline, 'parse', 1.3)
+
+    assert run_main(monkeypatch, tmp_path, report, baseline) == 1
+    assert run_main(monkeypatch, tmp_path, report, baseline, '--default-threshold', '0.5') == 0
+    assert run_main(monkeypatch, tmp_path, report, baseline,
+                    '--threshold', 'parse=0.5', '--threshold', 'total=0.5') == 0
+
+
+@pytest.mark.parametrize('threshold', ['unknown=0.5', 'parse=fast', 'parse'])
+def test_main_invalid_threshold(monkeypatch, tmp_path, threshold):
+    assert run_main(monkeypatch, tmp_path, make_report(), make_report(),
+                    '--threshold', threshold) == 2
+
+
+def test_main_refuses_other_corpus(monkeypatch, tmp_path):
+    baseline = make_report(input_files=INPUT_FILES[:1])
+
+    with pytest.raises(CriticalExit) as e:
+        run_main(monkeypatch, tmp_path, make_report(), baseline)
+    assert 'was measured on a different corpus' in e.value.msg
+
+
+def test_run_benchmark():
+    report = run_benchmark(INPUT_FILES, repeat=1)
+
+    assert [document['path'] for document in report['documents']] == INPUT_FILES
+    for document in report['documents']:
+        assert list(document['stages']) == list(STAGES)
+        assert 'conversion' not in document['errors']
+        assert document['output_size'] > 0
+    assert report['total'] == pytest.approx(sum(report['stages'].values()))
@@ -0,0 +1,145 @@
+"""File containing tests of the cache of conversion results."""
+import json
+import logging
+import os
+import time
+
+import pytest
+
+from cvrf2csaf.common.cache import ConversionCache
+from cvrf2csaf.common.utils import get_config_from_file, get_pkg_version
+from cvrf2csaf.document_handler import convert_and_store
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+INPUT_FILE = os.path.join(ROOT_DIR, 'examples', '1.2', 'cvrf_example_e.xml')
+
+# the examples can't be validated offline against the schema, the CVSS schemata are remote
+config = {**get_config_from_file(), 'validate': 'mandatory'}
+PKG_VERSION = get_pkg_version()
+
+
+# pylint: disable=missing-function-docstring
+def csaf_document(date='2017-03-01T10:00:00.000Z'):
+    return {'document': {'tracking': {'generator': {'date': date,
+                                                    'engine': {'name': 'CVRF-CSAF-Converter'}},
+                                      'id': 'acme-2017-42'}},
+            'vulnerabilities': [{'cve': 'CVE-2017-0001'}]}
+
+
+def convert(tmp_path, caplog):
+    """ Returns tuple (output CSAF document, True if it was found in the cache). """
+    caplog.clear()
+    _, output_file, valid, _ = convert_and_store(
+        {**config, 'output_dir': str(tmp_path / 'out'), 'cache_dir': str(tmp_path / 'cache')},
+        PKG_VERSION, INPUT_FILE)
+    assert valid
+    with open(output_file, encoding='utf-8') as f:
+        final_csaf = json.load(f)
+    return final_csaf, any('found in the cache' in message for message in caplog.messages)
+
+
+def test_miss_and_hit(tmp_path, caplog):
+    caplog.set_level(logging.INFO)
+    converted, hit = convert(tmp_path, caplog)
+    assert not hit
+
+    cached, hit = convert(tmp_path, caplog)
+    assert hit
+    generator = cached['document']['tracking']['generator']
+    # a fresh date of the hit, the same document otherwise
+    assert generator['date'] >= converted['document']['tracking']['generator']['date']
+    generator['date'] = converted['document']['tracking']['generator']['date']
+    assert cached == converted
+
+
+@pytest.mark.parametrize('key, value', [
+    ('jobs', 4), ('vulnerability_jobs', 4), ('compact_parser', True), ('input_archive', 'a.tar'),
+    ('output_ndjson', 'out.ndjson'), ('async_pipeline', True), ('max_in_flight', 8),
+    ('split_vulnerabilities', True), ('force', True), ('output_format', 'compact'),
+    ('output_compression', 'gzip'), ('mandatory_tests_jobs', 2), ('cache_max_size', 1),
+    ('unknown_option', 'value'),
+])
+def test_key_ignores_options_not_affecting_result(key, value):
+    cache = ConversionCache('unused')
+    assert cache.key({**config, key: value}, PKG_VERSION, INPUT_FILE) \
+        == cache.key(config, PKG_VERSION, INPUT_FILE)
+
+
+@pytest.mark.parametrize('key, value', [
+    ('validate', 'full'), ('publisher_name', 'Other Publisher'),
+    ('fix_insert_current_version_into_revision_history', True),
+    ('remove_CVSS_values_without_vector', True), ('compute_CVSS_scores', True),
+    ('default_CVSS3_version', '3.1'),
+])
+def test_key_of_options_affecting_result(key, value):
+    cache = ConversionCache('unused')
+    assert cache.key({**config, key: value}, PKG_VERSION, INPUT_FILE) \
+        != cache.key(config, PKG_VERSION, INPUT_FILE)
+
+
+def test_key_of_input_and_version(tmp_path):
+    cache = ConversionCache('unused')
+    changed_input = tmp_path / 'changed.xml'
+    with open(INPUT_FILE, 'rb') as f:
+        changed_input.write_bytes(f.read() + b'\n')
+
+    key = cache.key(config, PKG_VERSION, INPUT_FILE)
+    assert cache.key(config, PKG_VERSION, str(changed_input)) != key
+    assert cache.key(config, '0.0.0', INPUT_FILE) != key
+    assert cache.key(config, PKG_VERSION, str(tmp_path / 'missing.xml')) is None
+
+
+def test_generator_date_regenerated(tmp_path):
+    cache = ConversionCache(str(tmp_path))
+    final_csaf = csaf_document()
+    cache.put('key', final_csaf, True)
+
+    # the stored document is left as it was, the entry has no date
+    assert final_csaf == csaf_document()
+    with open(tmp_path / 'key.json', encoding='utf-8') as f:
+        assert json.load(f) == {'valid': True, 'csaf': csaf_document(date=None)}
+
+    cached, valid = cache.get('key')
+    assert valid
+    generator = cached['document']['tracking']['generator']
+    assert list(generator) == ['date', 'engine']
+    assert generator.pop('date') > '2017-03-01T10:00:00.000Z'
+    assert cached['vulnerabilities'] == csaf_document()['vulnerabilities']
+
+
+def put_entries(cache, names):
+    """ Stores entries used one after another in the order of the names, one second apart. """
+    now = time.time()
+    for age, name in enumerate(reversed(names)):
+        cache.put(name, csaf_document(), True)
+        os.utime(os.path.join(cache.directory, f'{name}.json'), (now - age, now - age))
+
+
+def test_eviction_by_size(tmp_path):
+    cache = ConversionCache(str(tmp_path))
+    put_entries(cache, ['oldest', 'older', 'recent'])
+    cache.max_size = 2 * os.path.getsize(tmp_path / 'recent.json')
+
+    cache.evict()
+
+    assert sorted(os.listdir(tmp_path)) == ['older.json', 'recent.json']
+
+
+def test_eviction_by_age(tmp_path):
+    cache = ConversionCache(str(tmp_path), max_age=60)
+    put_entries(cache, ['recent'])
+    put_entries(cache, ['expired'])
+    os.utime(tmp_path / 'expired.json', (time.time() - 120, time.time() - 120))
+
+    cache.evict()
+
+    assert os.listdir(tmp_path) == ['recent.json']
+
+
+def test_expired_entry_missed(tmp_path):
+    cache = ConversionCache(str(tmp_path), max_age=60)
+    put_entries(cache, ['expired'])
+    os.utime(tmp_path / 'expired.json', (time.time() - 120, time.time() - 120))
+
+    assert cache.get('expired') is None
+    assert not os.listdir(tmp_path)
@@ -0,0 +1,51 @@
+"""File containing tests of the compact parser (--compact-parser)."""
+import glob
+import os
+
+import pytest
+
+from cvrf2csaf.common.utils import get_config_from_file
+from cvrf2csaf.document_handler import DocumentHandler
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+# the well-formed examples of both CVRF versions
+INPUT_FILES = sorted(glob.glob(os.path.join(ROOT_DIR, 'examples', '1.2', '*.xml'))) + [
+    path for path in sorted(glob.glob(os.path.join(ROOT_DIR, 'examples', '1.1', '*.xml')))
+    if not path.endswith('-notwellformed.xml')] + [
+    os.path.join(ROOT_DIR, 'tests', 'test_cvrf_full', 'test_cvrf_full.xml')]
+
+# the 1.1 examples are not valid CVRF 1.2 documents
+config = {**get_config_from_file(), 'validate': 'none'}
+
+
+# pylint: disable=missing-function-docstring
+def convert(input_file, compact):
+    """ Returns tuple (CSAF document without the generator date, errors, warnings). """
+    handler = DocumentHandler({**config, 'compact_parser': compact}, '0.0.0')
+    csaf = handler.convert_file(input_file)
+    csaf['document']['tracking']['generator'].pop('date')
+    return csaf, handler.context.errors, handler.context.warnings
+
+
+@pytest.mark.parametrize('input_file', INPUT_FILES, ids=os.path.basename)
+def test_same_as_objectify(input_file):
+    assert convert(input_file, True) == convert(input_file, False)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_zero_base_score(tmp_path, compact):
+    """ A score of 0.0 is kept, it used to be dropped as a false objectify element. """
+    with open(os.path.join(ROOT_DIR, 'examples', '1.2', 'cvrf_example_e.xml'),
+              encoding='utf-8') as f:
+        document = f.read()
+    input_file = tmp_path / 'zero_score.xml'
+    document = document.replace('<BaseScoreV3>9.8</BaseScoreV3>', '<BaseScoreV3>0.0</BaseScoreV3>')
+    document = document.replace('/C:H/I:H/A:H</VectorV3>', '/C:N/I:N/A:N</VectorV3>')
+    input_file.write_text(document, encoding='utf-8')
+
+    csaf, errors, _ = convert(str(input_file), compact)
+
+    assert not errors
+    cvss_v3 = csaf['vulnerabilities'][0]['scores'][0]['cvss_v3']
+    assert cvss_v3['baseScore'] == 0.0
+    assert cvss_v3['baseSeverity'] == 'NONE'
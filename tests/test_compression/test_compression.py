@@ -0,0 +1,82 @@
+"""File containing tests of the compressed inputs, see open_input."""
+import bz2
+import gzip
+import io
+import lzma
+import os
+
+import pytest
+
+from cvrf2csaf.common.utils import CriticalExit, get_config_from_file, open_input
+from cvrf2csaf.document_handler import DocumentHandler
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+INPUT_FILE = os.path.join(ROOT_DIR, 'examples', '1.2', 'cvrf_example_e.xml')
+
+config = {**get_config_from_file(), 'validate': 'none'}
+
+COMPRESSIONS = pytest.mark.parametrize('module, suffix', [
+    (gzip, '.gz'), (bz2, '.bz2'), (lzma, '.xz')], ids=['gzip', 'bz2', 'xz'])
+
+
+# pylint: disable=missing-function-docstring
+def document():
+    with open(INPUT_FILE, 'rb') as f:
+        return f.read()
+
+
+def convert(path):
+    final_csaf = DocumentHandler(config, '0.0.0').convert_file(path)
+    final_csaf['document']['tracking']['generator'].pop('date')
+    return final_csaf
+
+
+def test_plain_path():
+    with open_input(INPUT_FILE) as source:
+        # lxml reads the plain file by itself
+        assert source == INPUT_FILE
+
+
+@COMPRESSIONS
+def test_compressed_path(tmp_path, module, suffix):
+    path = tmp_path / f'doc.xml{suffix}'
+    path.write_bytes(module.compress(document()))
+
+    with open_input(str(path)) as source:
+        assert source.read() == document()
+
+
+@COMPRESSIONS
+def test_compressed_file_object(module, suffix):
+    # pylint: disable=unused-argument
+    stream = io.BytesIO(module.compress(document()))
+
+    with open_input(stream) as source:
+        assert source.read(10) + source.read() == document()
+    # the file object of the caller is left open
+    assert not stream.closed
+
+
+@COMPRESSIONS
+def test_truncated_input(module, suffix):
+    # pylint: disable=unused-argument
+    with open_input(io.BytesIO(module.compress(document())[:-20])) as source:
+        with pytest.raises(OSError, match='decompression failed'):
+            source.read()
+
+
+@COMPRESSIONS
+def test_converted_as_plain(tmp_path, module, suffix):
+    path = tmp_path / f'doc.xml{suffix}'
+    path.write_bytes(module.compress(document()))
+
+    assert convert(str(path)) == convert(INPUT_FILE)
+
+
+def test_truncated_input_not_converted(tmp_path):
+    path = tmp_path / 'doc.xml.gz'
+    path.write_bytes(gzip.compress(document())[:-20])
+
+    with pytest.raises(CriticalExit) as e:
+        convert(str(path))
+    assert e.value.msg.startswith(f'Failed to open input file {path}: gzip decompression failed')
@@ -0,0 +1,217 @@
+"""File containing tests of the CVSS scores computed from the vectors and of the score sets."""
+import pytest
+from lxml import etree
+
+from cvrf2csaf.common.common import ConversionContext, conversion_context
+from cvrf2csaf.common.cvss import CvssScores, _v3_roundup, score_vector, score_vectors
+from cvrf2csaf.common.utils import get_config_from_file
+from cvrf2csaf.section_handlers.vulnerability import Vulnerability
+
+
+# pylint: disable=missing-function-docstring,protected-access,c-extension-no-member
+@pytest.mark.parametrize('vector, scores', [
+    # examples of the CVSS v2 guide, section 3.3
+    ('AV:N/AC:L/Au:N/C:N/I:N/A:C', (7.8, None, None)),
+    ('AV:N/AC:L/Au:N/C:N/I:N/A:C/E:F/RL:OF/RC:C', (7.8, 6.4, None)),
+    ('AV:N/AC:L/Au:N/C:N/I:N/A:C/E:F/RL:OF/RC:C/CDP:H/TD:H/CR:M/IR:M/AR:H', (7.8, 6.4, 9.2)),
+    ('AV:N/AC:L/Au:N/C:C/I:C/A:C/E:F/RL:OF/RC:C/CDP:H/TD:H/CR:M/IR:M/AR:L', (10.0, 8.3, 9.0)),
+    ('AV:L/AC:H/Au:N/C:C/I:C/A:C/E:POC/RL:OF/RC:C/CDP:H/TD:H/CR:M/IR:M/AR:M', (6.2, 4.9, 7.5)),
+    # the equation is negative without any impact
+    ('AV:N/AC:L/Au:N/C:N/I:N/A:N', (0.0, None, None)),
+])
+def test_v2(vector, scores):
+    assert score_vector(vector) == CvssScores('2.0', *scores)
+
+
+@pytest.mark.parametrize('version', ['3.0', '3.1'])
+@pytest.mark.parametrize('vector, scores', [
+    # examples of the CVSS v3.1 specification, the same in v3.0
+    ('AV:N/AC:L/PR:N/UI:R/S:C/C:L/I:L/A:N', (6.1, None, None)),
+    ('AV:N/AC:L/PR:L/UI:N/S:C/C:L/I:L/A:N', (6.4, None, None)),
+    ('AV:N/AC:H/PR:N/UI:R/S:U/C:L/I:N/A:N', (3.1, None, None)),
+    ('AV:N/AC:L/PR:L/UI:N/S:C/C:H/I:H/A:H', (9.9, None, None)),
+    ('AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:N/A:N', (7.5, None, None)),
+    ('AV:N/AC:L/PR:N/UI:N/S:U/C:N/I:N/A:N', (0.0, None, None)),
+    ('AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:N/A:N/E:F/RL:O/RC:C', (7.5, 7.0, None)),
+    ('AV:N/AC:L/PR:L/UI:N/S:C/C:H/I:H/A:H/E:P/RL:T/RC:R/CR:H/IR:L/AR:M/MAV:L/MPR:H/MS:U',
+     (9.9, 8.6, 5.9)),
+])
+def test_v3(version, vector, scores):
+    assert score_vector(f'CVSS:{version}/{vector}') == CvssScores(version, *scores)
+
+
+@pytest.mark.parametrize('vector, scores_v3_0, scores_v3_1', [
+    # v3.1 changed the modified impact of the changed scope
+    ('AV:L/AC:L/PR:N/UI:N/S:C/C:H/I:H/A:L/RL:U/CR:X/MAC:H/MA:H',
+     (9.2, 9.2, 8.1), (9.2, 9.2, 8.2)),
+    ('AV:A/AC:L/PR:H/UI:N/S:U/C:H/I:H/A:H/RL:W/IR:M/AR:H/MS:C/MI:N/MA:H',
+     (6.8, 6.6, 8.2), (6.8, 6.6, 8.3)),
+])
+def test_v3_versions_differ(vector, scores_v3_0, scores_v3_1):
+    assert score_vector(f'CVSS:3.0/{vector}') == CvssScores('3.0', *scores_v3_0)
+    assert score_vector(f'CVSS:3.1/{vector}') == CvssScores('3.1', *scores_v3_1)
+
+
+@pytest.mark.parametrize('value, rounded_v3_0, rounded_v3_1', [
+    (4.0, 4.0, 4.0),
+    (4.02, 4.1, 4.1),
+    # v3.1 treats the floating point error as 4.0
+    (4.000002, 4.1, 4.0),
+    # 4.6 computed with the floating point error
+    (0.1 + 4.5, 4.6, 4.6),
+])
+def test_roundup(value, rounded_v3_0, rounded_v3_1):
+    assert _v3_roundup(value, '3.0') == rounded_v3_0
+    assert _v3_roundup(value, '3.1') == rounded_v3_1
+
+
+@pytest.mark.parametrize('vector, error', [
+    ('AV:N/AC:L/Au:N/C:N/I:N/A:X', 'invalid metric A:X'),
+    ('AV:N/AC:L/Au:N/C:N/I:N/A:C/XX:N', 'invalid metric XX:N'),
+    ('AV:N/AC:L/Au:N/C:N/I:N/A:C/AV:L', 'duplicate metric AV'),
+    ('AV:N/AC:L/Au:N/C:N/I:N', 'missing base metrics A'),
+    ('CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:N/A:N/E:F/E:U', 'duplicate metric E'),
+    ('CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:X/C:H/I:N/A:N', 'invalid metric S:X'),
+    ('CVSS:3.1/AV:N/AC:L/PR:N/UI:N/C:H/I:N/A:N', 'missing base metrics S'),
+    ('CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:N/A:N/', 'invalid metric '),
+    ('CVSS:4.0/AV:N/AC:L/AT:N/PR:N/UI:N/VC:H/VI:H/VA:H/SC:N/SI:N/SA:N', 'unsupported CVSS version'),
+])
+def test_invalid_vector(vector, error):
+    with pytest.raises(ValueError, match=error):
+        score_vector(vector)
+
+
+def test_score_vectors():
+    scores, errors = score_vectors(['AV:N/AC:L/Au:N/C:N/I:N/A:C', 'AV:N/AC:L/Au:N/C:N/I:N/A:C',
+                                    'AV:N/AC:L/Au:N/C:N/I:N/A:C/AV:L'])
+    assert scores == {'AV:N/AC:L/Au:N/C:N/I:N/A:C': CvssScores('2.0', 7.8, None, None)}
+    assert list(errors) == ['AV:N/AC:L/Au:N/C:N/I:N/A:C/AV:L']
+
+
+V3_VECTOR = 'CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:N/A:N/E:F/RL:O/RC:C'
+
+
+def check_cvss_scores(cvss_score, mapping=None, json_property='cvss_v3'):
+    """ Returns tuple (checked score set, context of the check). """
+    mapping = mapping or Vulnerability.cvss_v3_mapping
+    with conversion_context(ConversionContext()) as context:
+        checked = Vulnerability._check_cvss_scores(
+            cvss_score, mapping, json_property, score_vectors([cvss_score['vectorString']]), 42)
+    return checked, context
+
+
+def test_missing_scores_filled_in():
+    checked, context = check_cvss_scores({'baseScore': 7.5, 'vectorString': V3_VECTOR})
+
+    # in the order of the mapping
+    assert list(checked.items()) == [('baseScore', 7.5), ('temporalScore', 7.0),
+                                     ('vectorString', V3_VECTOR)]
+    assert context.stats['computed_CVSS_scores'] == 1
+    assert not context.warnings and not context.errors
+
+
+def test_matching_scores_kept():
+    cvss_score = {'baseScore': 7.5, 'temporalScore': 7.0, 'vectorString': V3_VECTOR}
+    checked, context = check_cvss_scores(dict(cvss_score))
+
+    assert checked == cvss_score
+    assert context.stats['computed_CVSS_scores'] == 0
+    assert not context.warnings
+
+
+def test_mismatching_score_warned():
+    cvss_score = {'baseScore': 7.5, 'temporalScore': 6.5, 'vectorString': V3_VECTOR}
+    checked, context = check_cvss_scores(dict(cvss_score))
+
+    # the given score is kept
+    assert checked == cvss_score
+    assert context.warnings == [f'Input line 42: temporalScore 6.5 differs from 7.0 computed from'
+                                f' CVSS vector {V3_VECTOR}.']
+    assert not context.errors
+
+
+def test_invalid_vector_not_verified():
+    vector = 'CVSS:3.1/AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:N/A:N/E:F/E:U'
+    checked, context = check_cvss_scores({'baseScore': 1.0, 'vectorString': vector})
+
+    assert checked == {'baseScore': 1.0, 'vectorString': vector}
+    assert context.warnings == [f'Input line 42: duplicate metric E in CVSS vector {vector},'
+                                ' the CVSS scores are not verified.']
+
+
+def test_vector_of_other_version_not_verified():
+    checked, context = check_cvss_scores({'baseScore': 1.0, 'vectorString': V3_VECTOR},
+                                         Vulnerability.cvss_v2_mapping, 'cvss_v2')
+
+    assert checked == {'baseScore': 1.0, 'vectorString': V3_VECTOR}
+    assert context.warnings == [f'Input line 42: CVSS vector {V3_VECTOR} is not a cvss_v2 vector,'
+                                ' the CVSS scores are not verified.']
+
+
+def score_set(version, vector, base_score, products):
+    if version == '2.0':
+        return {'cvss_v2': {'version': '2.0', 'vectorString': vector, 'baseScore': base_score},
+                'products': products}
+    return {'cvss_v3': {'version': version, 'vectorString': f'CVSS:{version}/{vector}',
+                        'baseScore': base_score, 'baseSeverity': 'HIGH'},
+            'products': products}
+
+
+V2 = 'AV:N/AC:L/Au:N/C:N/I:N/A:C'
+V3 = 'AV:N/AC:L/PR:N/UI:N/S:U/C:H/I:N/A:N'
+
+
+def test_v3_0_duplicates_removed():
+    scores = [score_set('3.0', V3, 7.5, ['A', 'B']), score_set('2.0', V2, 7.8, ['A']),
+              score_set('3.0', V3, 7.5, ['C']), score_set('3.1', V3, 7.5, ['A', 'C'])]
+
+    # the products having a v3.1 score set are removed from the v3.0 ones, emptied ones are dropped
+    assert Vulnerability._remove_cvssv3_duplicates(scores) == [
+        score_set('3.0', V3, 7.5, ['B']), score_set('2.0', V2, 7.8, ['A']),
+        score_set('3.1', V3, 7.5, ['A', 'C'])]
+
+
+def test_v3_0_kept_without_v3_1():
+    scores = [score_set('3.0', V3, 7.5, ['A']), score_set('3.0', V3, 7.5, ['A'])]
+
+    assert Vulnerability._remove_cvssv3_duplicates(scores) == scores
+
+
+def test_merge_score_sets():
+    scores = [score_set('3.1', V3, 7.5, ['A', 'B']), score_set('2.0', V2, 7.8, ['A']),
+              score_set('3.1', V3, 7.5, ['B', 'C']), score_set('3.1', V3, 5.0, ['D']),
+              score_set('2.0', V2, 7.8, ['E']), score_set('3.0', V3, 7.5, ['F'])]
+    given = [dict(score, products=list(score['products'])) for score in scores]
+
+    # the identical ones merged into the first of them, the others kept in their order
+    assert Vulnerability._merge_score_sets(scores) == [
+        score_set('3.1', V3, 7.5, ['A', 'B', 'C']), score_set('2.0', V2, 7.8, ['A', 'E']),
+        score_set('3.1', V3, 5.0, ['D']), score_set('3.0', V3, 7.5, ['F'])]
+    assert scores == given
+
+
+CVSS_SCORE_SETS = f'''<CVSSScoreSets xmlns="http://docs.oasis-open.org/csaf/ns/csaf-cvrf/v1.2/vuln">
+  <ScoreSetV3><BaseScoreV3>7.5</BaseScoreV3><VectorV3>CVSS:3.1/{V3}</VectorV3>
+    <ProductID>A</ProductID></ScoreSetV3>
+  <ScoreSetV3><BaseScoreV3>7.5</BaseScoreV3><VectorV3>CVSS:3.0/{V3}</VectorV3>
+    <ProductID>A</ProductID><ProductID>B</ProductID></ScoreSetV3>
+  <ScoreSetV3><BaseScoreV3>7.5</BaseScoreV3><VectorV3>CVSS:3.1/{V3}</VectorV3>
+    <ProductID>C</ProductID><ProductID>A</ProductID></ScoreSetV3>
+</CVSSScoreSets>'''
+
+
+@pytest.mark.parametrize('merge', [False, True])
+def test_handle_scores(merge):
+    vulnerability = Vulnerability({**get_config_from_file(), 'merge_CVSS_score_sets': merge})
+    with conversion_context(ConversionContext()) as context:
+        scores = vulnerability._handle_scores(etree.XML(CVSS_SCORE_SETS), None)
+
+    v3_1 = dict(score_set('3.1', V3, 7.5, []), products=['A'])
+    if merge:
+        assert scores == [dict(v3_1, products=['A', 'C']), score_set('3.0', V3, 7.5, ['B'])]
+        assert context.stats['merged_score_sets'] == 1
+        assert context.stats['merged_score_sets_bytes_saved'] > 0
+    else:
+        assert scores == [v3_1, score_set('3.0', V3, 7.5, ['B']),
+                          score_set('3.1', V3, 7.5, ['C', 'A'])]
+        assert context.stats['merged_score_sets'] == 0
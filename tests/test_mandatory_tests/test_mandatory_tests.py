@@ -0,0 +1,83 @@
+"""File containing tests of the mandatory tests run in processes."""
+import glob
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from cvrf2csaf import document_handler
+from cvrf2csaf.common.utils import get_config_from_file
+from cvrf2csaf.document_handler import DocumentHandler
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+INPUT_FILES = sorted(glob.glob(os.path.join(ROOT_DIR, 'examples', '1.2', '*.xml')))
+
+config = {**get_config_from_file(), 'validate': 'none'}
+
+
+# pylint: disable=missing-function-docstring
+def convert(input_file):
+    return DocumentHandler(config, '0.0.0').convert_file(input_file)
+
+
+@pytest.mark.parametrize('input_file', INPUT_FILES, ids=os.path.basename)
+def test_same_as_serial(input_file, caplog):
+    final_csaf = convert(input_file)
+    handler = DocumentHandler(config, '0.0.0')
+    caplog.clear()
+
+    serial = handler.validate_mandatory_tests(final_csaf, jobs=1)
+    serial_messages = caplog.messages
+    caplog.clear()
+
+    assert handler.validate_mandatory_tests(final_csaf, jobs=3) == serial
+    assert caplog.messages == serial_messages
+
+
+def failing_test(_):
+    return False
+
+
+def hanging_test(_):
+    time.sleep(60)
+    return True
+
+
+def test_fail_fast_terminates_running_tests(monkeypatch):
+    """ The tests still running when one fails are terminated, not left in orphaned workers. """
+    if multiprocessing.get_start_method() != 'fork':
+        pytest.skip('the replaced tests are inherited by forked workers only')
+    monkeypatch.setattr(document_handler, 'get_mandatory_tests',
+                        lambda: {'hanging': hanging_test, 'failing': failing_test})
+    handler = DocumentHandler({**config, 'mandatory_tests_fail_fast': True}, '0.0.0')
+
+    start = time.monotonic()
+    assert not handler.validate_mandatory_tests(convert(INPUT_FILES[0]), jobs=2)
+
+    assert time.monotonic() - start < 30
+    assert not multiprocessing.active_children()
+
+
+def validate_in_worker(final_csaf):
+    """ Runs the mandatory tests in a pool worker, returns tuple (valid, pool started). """
+    started = []
+
+    def run_in_processes(*args):
+        started.append(args)
+        return []
+
+    # pylint: disable=protected-access
+    document_handler._run_mandatory_tests_in_processes = run_in_processes
+    handler = DocumentHandler({**config, 'mandatory_tests_jobs': 4}, '0.0.0')
+    return handler.validate_mandatory_tests(final_csaf), bool(started)
+
+
+def test_serial_inside_worker():
+    """ A worker of a pool, e.g. in the batch mode, does not start a pool of its own. """
+    final_csaf = convert(INPUT_FILES[0])
+    valid = DocumentHandler(config, '0.0.0').validate_mandatory_tests(final_csaf, jobs=1)
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(validate_in_worker, final_csaf).result() == (valid, False)
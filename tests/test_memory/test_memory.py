@@ -0,0 +1,39 @@
+"""File containing tests of the memory usage of the low-memory conversion mode."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from cvrf2csaf.common.profiling import resource
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+MITRE_2018 = os.path.join(ROOT_DIR, 'examples', '1.1', 'mitre-allitems-cvrf-year-2018.xml')
+
+# Kilobytes the conversion may add to the peak RSS of the started converter. The 2.3 MB
+# document adds about 6 MB with --low-memory, about 18 MB when the whole input tree is kept.
+MEMORY_BUDGET_KB = 12 * 1024
+
+
+# pylint: disable=missing-function-docstring
+def run_python(*args):
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, check=True)
+
+
+@pytest.mark.skipif(resource is None, reason='peak RSS is not available on this platform')
+def test_low_memory_ceiling(tmp_path):
+    """ Peak RSS of the MITRE 2018 conversion with --low-memory fits into the budget. """
+    startup_rss_kb = int(run_python(
+        '-c', 'import cvrf2csaf.cvrf2csaf, cvrf2csaf.common.profiling as p;'
+              ' print(p.peak_rss_kb())').stdout)
+
+    profile_path = tmp_path / 'profile.json'
+    # the document is CVRF 1.1, it can't be validated against the 1.2 schema
+    run_python('-m', 'cvrf2csaf', '--input-file', MITRE_2018, '--output-dir', str(tmp_path),
+               '--validate', 'none', '--force', '--low-memory', '--profile', str(profile_path))
+    with open(profile_path, encoding='utf-8') as f:
+        peak_rss_kb = json.load(f)['documents'][0]['peak_rss_kb']
+
+    assert peak_rss_kb - startup_rss_kb < MEMORY_BUDGET_KB, \
+        f'conversion added {peak_rss_kb - startup_rss_kb} kB, budget is {MEMORY_BUDGET_KB} kB'
@@ -0,0 +1,161 @@
+"""File containing tests of the product and group references checked during the conversion."""
+import os
+
+import pytest
+
+from cvrf2csaf import document_handler
+from cvrf2csaf.common.utils import get_config_from_file
+from cvrf2csaf.document_handler import MANDATORY_TESTS_CHECKED_BY_CONVERSION, DocumentHandler
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+# the references are checked when the mandatory tests are run
+config = {**get_config_from_file(), 'validate': 'mandatory', 'force': True}
+
+DOCUMENT = '''<?xml version="1.0" encoding="UTF-8"?>
+<cvrfdoc xmlns="http://docs.oasis-open.org/csaf/ns/csaf-cvrf/v1.2/cvrf">
+  <DocumentTitle>Reference test</DocumentTitle>
+  <DocumentType>Security Advisory</DocumentType>
+  <DocumentPublisher Type="Vendor"/>
+  <DocumentTracking>
+    <Identification><ID>acme-ref-1</ID></Identification>
+    <Status>Final</Status>
+    <Version>1</Version>
+    <RevisionHistory>
+      <Revision>
+        <Number>1</Number>
+        <Date>2017-03-17T12:34:56-06:00</Date>
+        <Description>Initial Distribution</Description>
+      </Revision>
+    </RevisionHistory>
+    <InitialReleaseDate>2017-03-17T12:34:56-06:00</InitialReleaseDate>
+    <CurrentReleaseDate>2017-03-17T12:34:56-06:00</CurrentReleaseDate>
+  </DocumentTracking>
+  <ProductTree xmlns="http://docs.oasis-open.org/csaf/ns/csaf-cvrf/v1.2/prod">
+    <Branch Name="Acme" Type="Vendor">
+      <Branch Name="1.0" Type="Product Version">
+        <FullProductName ProductID="FOO-1.0">Foo 1.0</FullProductName>
+      </Branch>
+    </Branch>
+    <FullProductName ProductID="BAR">Bar</FullProductName>
+    <Relationship ProductReference="{relationship_product}" RelatesToProductReference="{relates_to}" RelationType="Installed On">
+      <FullProductName ProductID="FOO-1.0-on-BAR">Foo 1.0 on Bar</FullProductName>
+    </Relationship>
+    <ProductGroups>
+      <Group GroupID="FOOS">
+        <ProductID>{group_product}</ProductID>
+        <ProductID>FOO-1.0-on-BAR</ProductID>
+      </Group>
+    </ProductGroups>
+  </ProductTree>
+  <Vulnerability Ordinal="1" xmlns="http://docs.oasis-open.org/csaf/ns/csaf-cvrf/v1.2/vuln">
+    <CVE>CVE-2017-0001</CVE>
+    <ProductStatuses>
+      <Status Type="Known Affected">
+        <ProductID>{status_product}</ProductID>
+      </Status>
+    </ProductStatuses>
+    <Threats>
+      <Threat Type="Impact">
+        <Description>Denial of service</Description>
+        <ProductID>{threat_product}</ProductID>
+        <GroupID>{threat_group}</GroupID>
+      </Threat>
+    </Threats>
+    <CVSSScoreSets>
+      <ScoreSetV3>
+        <BaseScoreV3>7.5</BaseScoreV3>
+        <VectorV3>CVSS:3.0/AV:N/AC:L/PR:N/UI:N/S:U/C:N/I:N/A:H</VectorV3>
+        <ProductID>{score_product}</ProductID>
+      </ScoreSetV3>
+    </CVSSScoreSets>
+    <Remediations>
+      <Remediation Type="Vendor Fix">
+        <Description>Update</Description>
+        <ProductID>{remediation_product}</ProductID>
+        <GroupID>{remediation_group}</GroupID>
+      </Remediation>
+    </Remediations>
+  </Vulnerability>
+</cvrfdoc>
+'''
+
+REFERENCES = {
+    'relationship_product': 'FOO-1.0', 'relates_to': 'BAR', 'group_product': 'FOO-1.0',
+    'status_product': 'FOO-1.0', 'threat_product': 'FOO-1.0-on-BAR', 'threat_group': 'FOOS',
+    'score_product': 'BAR', 'remediation_product': 'FOO-1.0', 'remediation_group': 'FOOS',
+}
+
+
+# pylint: disable=missing-function-docstring
+def convert(tmp_path, handler_config=None, **references):
+    """ Returns tuple (handler, input lines) of the converted document with the references. """
+    document = DOCUMENT.format(**{**REFERENCES, **references})
+    input_file = tmp_path / 'references.xml'
+    input_file.write_text(document, encoding='utf-8')
+    handler = DocumentHandler(handler_config or config, '0.0.0')
+    handler.convert_file(str(input_file))
+    return handler, document.splitlines()
+
+
+def test_defined_references(tmp_path):
+    handler, _ = convert(tmp_path)
+
+    assert handler.references_checked
+    assert not handler.context.errors
+
+
+@pytest.mark.parametrize('reference', sorted(REFERENCES))
+def test_dangling_reference(tmp_path, reference):
+    kind = 'GroupID' if reference.endswith('_group') else 'ProductID'
+    handler, lines = convert(tmp_path, **{reference: 'UNDEFINED'})
+
+    line = next(number for number, text in enumerate(lines, 1) if 'UNDEFINED' in text)
+    assert handler.context.errors == [
+        f'Input line {line}: {kind} UNDEFINED is not defined in ProductTree.']
+
+
+def test_products_defined_in_branches():
+    """ Products defined only in branches are defined like the full product names. """
+    handler = DocumentHandler(config, '0.0.0')
+    handler.convert_file(os.path.join(ROOT_DIR, 'examples', '1.2', 'cvrf_example_e.xml'))
+
+    assert handler.references_checked
+    assert not handler.context.errors
+
+
+def run_tests(monkeypatch, handler, final_csaf):
+    """ Returns names of the mandatory tests run by the handler for the document. """
+    run = []
+
+    def recording_test(m_test_str):
+        return lambda _: run.append(m_test_str) is None
+
+    names = ['is_valid_category', *MANDATORY_TESTS_CHECKED_BY_CONVERSION]
+    monkeypatch.setattr(document_handler, 'get_mandatory_tests',
+                        lambda: {name: recording_test(name) for name in names})
+    assert handler.validate_mandatory_tests(final_csaf, jobs=1)
+    return run
+
+
+def test_dangling_reference_not_checked(tmp_path):
+    """ Without the mandatory tests the references are left to them, no errors are reported. """
+    handler, _ = convert(tmp_path, {**config, 'validate': 'none'}, status_product='UNDEFINED')
+
+    assert not handler.references_checked
+    assert not handler.context.errors
+
+
+def test_defined_ids_tests_skipped_if_checked(tmp_path, monkeypatch):
+    handler, _ = convert(tmp_path)
+
+    assert run_tests(monkeypatch, handler, {}) == ['is_valid_category']
+
+
+@pytest.mark.parametrize('validate', ['none', 'input'])
+def test_defined_ids_tests_run_if_not_checked(tmp_path, monkeypatch, validate):
+    handler, _ = convert(tmp_path, {**config, 'validate': validate})
+
+    assert not handler.references_checked
+    assert run_tests(monkeypatch, handler, {}) == [
+        'is_valid_category', *MANDATORY_TESTS_CHECKED_BY_CONVERSION]
@@ -0,0 +1,108 @@
+"""File containing tests of the JSON serialization backends."""
+import glob
+import os
+
+import pytest
+
+from cvrf2csaf.common import serialization
+from cvrf2csaf.common.serialization import BACKENDS
+from cvrf2csaf.common.utils import (OUTPUT_COMPRESSIONS, OUTPUT_FORMATS, get_config_from_file,
+                                    open_output, store_json, store_json_incremental)
+from cvrf2csaf.document_handler import DocumentHandler
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+INPUT_FILES = sorted(glob.glob(os.path.join(ROOT_DIR, 'examples', '1.2', 'cvrf_example_*.xml'))) \
+    + [os.path.join(ROOT_DIR, 'tests', 'test_cvrf_full', 'test_cvrf_full.xml')]
+
+# Strings escaped differently by the encoders if they got it wrong
+TRICKY_STRINGS = ['é ü ß 漢字 😀', '"quoted" \\back\\slash/', '\t\n\r\b\f', '\x00\x1f\x7f',
+                  '  ', '<script>&amp;</script>']
+
+
+# pylint: disable=missing-function-docstring
+def convert(path):
+    config = get_config_from_file()
+    config['validate'] = 'none'
+    return DocumentHandler(config, '0.0.0').convert_file(path)
+
+
+@pytest.fixture(name='orjson_backend')
+def fixture_orjson_backend():
+    pytest.importorskip('orjson')
+    return BACKENDS['orjson']
+
+
+@pytest.mark.parametrize('output_format', OUTPUT_FORMATS)
+@pytest.mark.parametrize('path', INPUT_FILES, ids=os.path.basename)
+def test_identical_output_of_converted_documents(orjson_backend, path, output_format):
+    """ orjson serializes the converted documents byte by byte like the json module. """
+    final_csaf = convert(path)
+    assert orjson_backend(final_csaf, output_format) == BACKENDS['json'](final_csaf,
+                                                                         output_format)
+
+
+def json_calls(monkeypatch):
+    """ Returns list of the objects serialized by the json backend, also as fallback. """
+    calls = []
+
+    def json_dumps(obj, output_format):
+        calls.append(obj)
+        return json_backend(obj, output_format)
+
+    json_backend = BACKENDS['json']
+    monkeypatch.setattr(serialization, '_json_dumps', json_dumps)
+    return calls
+
+
+@pytest.mark.parametrize('output_format', OUTPUT_FORMATS)
+def test_identical_output_of_special_values(orjson_backend, monkeypatch, output_format):
+    document = {'strings': TRICKY_STRINGS, 'scores': [0.0, 0.1, 5.0, 7.5, 9.8, 10.0],
+                'empty': [{}, []], 'flags': [True, False, None], 'large': 2 ** 63 - 1}
+    calls = json_calls(monkeypatch)
+
+    output = orjson_backend(document, output_format)
+
+    # serialized by orjson itself
+    assert not calls
+    assert output == BACKENDS['json'](document, output_format)
+
+
+@pytest.mark.parametrize('output_format', OUTPUT_FORMATS)
+def test_fallback_to_json(orjson_backend, monkeypatch, output_format):
+    """ Integers over 64 bits, which orjson refuses, are serialized by the json module. """
+    document = {'scores': [7.5], 'large': 2 ** 64}
+    calls = json_calls(monkeypatch)
+
+    output = orjson_backend(document, output_format)
+
+    assert calls == [document]
+    assert output == BACKENDS['json'](document, output_format)
+
+
+def read_output(fpath, compression):
+    with open_output(fpath, compression, 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('compression', OUTPUT_COMPRESSIONS)
+@pytest.mark.parametrize('output_format', OUTPUT_FORMATS)
+@pytest.mark.parametrize('items', [0, 1, 3])
+def test_incremental_output(tmp_path, items, output_format, compression):
+    """ The vulnerabilities written one by one are serialized like the whole document. """
+    final_csaf = convert(os.path.join(ROOT_DIR, 'tests', 'test_cvrf_full', 'test_cvrf_full.xml'))
+    vulnerabilities = final_csaf.pop('vulnerabilities')
+    vulnerabilities = (vulnerabilities * items)[:items]
+    vulnerabilities[1:] = [{**vulnerability, 'notes': [{'text': text}]}
+                           for vulnerability, text in zip(vulnerabilities[1:], TRICKY_STRINGS)]
+    expected = {**final_csaf, 'vulnerabilities': vulnerabilities} if vulnerabilities \
+        else final_csaf
+    suffix = OUTPUT_COMPRESSIONS[compression][0]
+
+    store_json(expected, str(tmp_path / f'whole.json{suffix}'), output_format, compression)
+    store_json_incremental(final_csaf, 'vulnerabilities', iter(vulnerabilities),
+                           str(tmp_path / f'incremental.json{suffix}'), output_format,
+                           compression)
+
+    assert read_output(tmp_path / f'incremental.json{suffix}', compression) \
+        == read_output(tmp_path / f'whole.json{suffix}', compression)
@@ -0,0 +1,89 @@
+"""File containing tests of the conversion server's handling of the request size."""
+import http.client
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cvrf2csaf.common.utils import get_config_from_file
+from cvrf2csaf.server import _HTTPServer, _init_worker, _RequestHandler
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+INPUT_FILE = os.path.join(ROOT_DIR, 'examples', '1.2', 'cvrf_example_a.xml')
+
+MAX_REQUEST_SIZE = 1000
+
+
+# pylint: disable=missing-function-docstring,redefined-outer-name
+@pytest.fixture(scope='module')
+def server():
+    config = {**get_config_from_file(), 'validate': 'none'}
+    server = _HTTPServer(('127.0.0.1', 0), _RequestHandler)
+    server.max_request_size = MAX_REQUEST_SIZE
+    # the workers are threads here, the server converts in the same way in processes
+    with ThreadPoolExecutor(max_workers=1, initializer=_init_worker,
+                            initargs=(config, '0.0.0')) as server.executor:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+
+
+def post(server, body, content_length):
+    """ Sends POST / with the body and Content-Length header (omitted if None). """
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=30)
+    try:
+        connection.putrequest('POST', '/', skip_accept_encoding=True)
+        if content_length is not None:
+            connection.putheader('Content-Length', content_length)
+        connection.endheaders()
+        connection.send(body)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_missing_content_length(server):
+    status, response = post(server, b'', None)
+    assert status == 411
+    assert response == {'error': 'Content-Length is required.'}
+
+
+@pytest.mark.parametrize('content_length', ['-1', '-5000'])
+def test_negative_content_length(server, content_length):
+    """ Negative length is rejected instead of reading the body past the size limit. """
+    status, response = post(server, b'x' * (5 * MAX_REQUEST_SIZE), content_length)
+    assert status == 400
+    assert response == {'error': 'Invalid Content-Length.'}
+
+
+def test_request_too_large(server):
+    body = b'x' * (MAX_REQUEST_SIZE + 1)
+    status, response = post(server, body, str(len(body)))
+    assert status == 413
+    assert response == {'error': f'Request exceeds {MAX_REQUEST_SIZE} bytes.'}
+
+
+def test_request_within_limit(server):
+    """ A request of the maximum size is read and converted, an invalid one is rejected. """
+    body = b'<' + b'x' * (MAX_REQUEST_SIZE - 1)
+    status, response = post(server, body, str(len(body)))
+    assert status == 422
+    assert response['csaf'] is None
+
+
+def test_conversion(server):
+    server.max_request_size = os.path.getsize(INPUT_FILE)
+    try:
+        with open(INPUT_FILE, 'rb') as f:
+            body = f.read()
+        status, response = post(server, body, str(len(body)))
+    finally:
+        server.max_request_size = MAX_REQUEST_SIZE
+    assert status == 200
+    assert response['csaf']['document']['tracking']['id'] == 'vendorix-sa-20170301-abc'
+    assert response['validation'] == []
@@ -0,0 +1,130 @@
+"""File containing tests of splitting a CSAF document by vulnerability (--split-vulnerabilities)."""
+import os
+
+from cvrf2csaf.common.split import ProductTreeIndex, split_document
+from cvrf2csaf.common.utils import get_config_from_file, get_pkg_version
+from cvrf2csaf.document_handler import convert_and_store_split
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+# the examples can't be validated offline against the schema, the CVSS schemata are remote
+config = {**get_config_from_file(), 'validate': 'mandatory', 'force': True, 'jobs': 1}
+PKG_VERSION = get_pkg_version()
+
+
+# pylint: disable=missing-function-docstring
+def product(product_id):
+    return {'name': product_id, 'product_id': product_id}
+
+
+def branch(name, branches=None, product_id=None):
+    if product_id is not None:
+        return {'category': 'product_version', 'name': name, 'product': product(product_id)}
+    return {'category': 'vendor', 'name': name, 'branches': branches}
+
+
+def relationship(product_id, product_reference, relates_to_product_reference):
+    return {'category': 'installed_on', 'full_product_name': product(product_id),
+            'product_reference': product_reference,
+            'relates_to_product_reference': relates_to_product_reference}
+
+
+PRODUCT_TREE = {
+    'branches': [
+        branch('vendor-a', [branch('1.0', product_id='A1'), branch('2.0', product_id='A2')]),
+        branch('vendor-b', [branch('product-b', [branch('1.0', product_id='B1')]),
+                            branch('3.0', product_id='B3')]),
+    ],
+    'full_product_names': [product('F1'), product('F2')],
+    'relationships': [
+        relationship('A1-on-F1', 'A1', 'F1'),
+        # a relationship of a relationship
+        relationship('A1-on-F1-on-B3', 'A1-on-F1', 'B3'),
+        relationship('A2-on-F2', 'A2', 'F2'),
+    ],
+    'product_groups': [
+        {'group_id': 'G1', 'product_ids': ['B1', 'F2']},
+        {'group_id': 'G2', 'product_ids': ['A2', 'B3']},
+    ],
+}
+
+
+def test_prune_branches():
+    pruned = ProductTreeIndex(PRODUCT_TREE).prune({'B1', 'A2'}, set())
+
+    # the branches leading to the products, in the original order
+    assert pruned == {'branches': [
+        branch('vendor-a', [branch('2.0', product_id='A2')]),
+        branch('vendor-b', [branch('product-b', [branch('1.0', product_id='B1')])]),
+    ]}
+
+
+def test_prune_relationship_closure():
+    pruned = ProductTreeIndex(PRODUCT_TREE).prune({'A1-on-F1-on-B3'}, set())
+
+    # the products the relationships refer to, transitively
+    assert pruned == {
+        'branches': [branch('vendor-a', [branch('1.0', product_id='A1')]),
+                     branch('vendor-b', [branch('3.0', product_id='B3')])],
+        'full_product_names': [product('F1')],
+        'relationships': PRODUCT_TREE['relationships'][:2],
+    }
+
+
+def test_prune_product_groups():
+    pruned = ProductTreeIndex(PRODUCT_TREE).prune({'F1'}, {'G1'})
+
+    # the products of the group
+    assert pruned == {
+        'branches': [branch('vendor-b', [branch('product-b', [branch('1.0', product_id='B1')])])],
+        'full_product_names': [product('F1'), product('F2')],
+        'product_groups': PRODUCT_TREE['product_groups'][:1],
+    }
+
+
+def test_prune_undefined_ids_skipped():
+    assert not ProductTreeIndex(PRODUCT_TREE).prune({'UNDEFINED'}, {'UNDEFINED'})
+    assert ProductTreeIndex(PRODUCT_TREE).prune({'F2', 'UNDEFINED'}, set()) \
+        == {'full_product_names': [product('F2')]}
+
+
+def test_product_tree_left_unchanged():
+    product_tree = {**PRODUCT_TREE, 'branches': list(PRODUCT_TREE['branches'])}
+    index = ProductTreeIndex(product_tree)
+    for product_ids in ({'A1'}, {'B1'}, {'A1-on-F1-on-B3'}):
+        index.prune(product_ids, {'G2'})
+
+    assert product_tree == PRODUCT_TREE
+
+
+def split_ids(tracking_id, vulnerabilities):
+    final_csaf = {'document': {'tracking': {'id': tracking_id}},
+                  'vulnerabilities': vulnerabilities}
+    return [split_csaf['document']['tracking']['id'] for split_csaf in split_document(final_csaf)]
+
+
+def test_derived_tracking_ids():
+    assert split_ids('acme-1', [{'cve': 'CVE-2017-0001'}, {}, {'cve': 'CVE-2017-0002'}]) == [
+        'acme-1-CVE-2017-0001', 'acme-1-vulnerability-2', 'acme-1-CVE-2017-0002']
+    assert split_ids(None, [{'cve': 'CVE-2017-0001'}, {}]) == [
+        'CVE-2017-0001', 'vulnerability-2']
+
+
+def test_derived_tracking_ids_unique():
+    # the same CVE twice, once more as the suffix of the duplicate and in other letter case
+    assert split_ids('acme-1', [{'cve': 'CVE-2017-0001'}, {'cve': 'CVE-2017-0001-3'},
+                                {'cve': 'CVE-2017-0001'}, {'cve': 'cve-2017-0001'}]) == [
+        'acme-1-CVE-2017-0001', 'acme-1-CVE-2017-0001-3', 'acme-1-CVE-2017-0001-4',
+        'acme-1-cve-2017-0001-5']
+
+
+def test_split_example(tmp_path):
+    results = convert_and_store_split(
+        {**config, 'output_dir': str(tmp_path)}, PKG_VERSION,
+        os.path.join(ROOT_DIR, 'examples', '1.2', 'cvrf_example_vulnerabilities.xml'))
+
+    assert sorted(os.path.basename(file_path) for file_path, _ in results) == [
+        'vendorix-sa-20170301-abc-cve-2017-3826_invalid.json',
+        'vendorix-sa-20170301-abc-cve-2017-3827_invalid.json']
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(file_path)
+                                                  for file_path, _ in results)
@@ -0,0 +1,37 @@
+"""File containing tests of the startup time of the converter."""
+import subprocess
+import sys
+import time
+
+ROUNDS = 3
+
+# Seconds, generous enough for slow CI machines. Before the validation dependencies were
+# imported lazily, --version took several times longer than the conversion of a small document.
+VERSION_BUDGET = 1.0
+
+HEAVY_MODULES = ('pkg_resources', 'jsonschema', 'turvallisuusneuvonta', 'http.server')
+
+
+# pylint: disable=missing-function-docstring
+def run_python(*args):
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, check=True)
+
+
+def test_no_heavy_imports():
+    """ Importing the converter does not import the dependencies of the validation stages. """
+    result = run_python('-c', 'import sys, cvrf2csaf.cvrf2csaf;'
+                              f' print([m for m in {HEAVY_MODULES!r} if m in sys.modules])')
+    assert result.stdout.strip() == '[]'
+
+
+def test_version_startup_time():
+    """ cvrf2csaf --version fits into the budget, the best of ROUNDS runs is taken. """
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = run_python('-m', 'cvrf2csaf', '--version')
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    assert result.stdout.strip()
+    assert best < VERSION_BUDGET, f'--version took {best:.3f} s, budget is {VERSION_BUDGET} s'
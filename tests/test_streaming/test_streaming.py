@@ -0,0 +1,60 @@
+"""File containing tests of the streamed conversion (--streaming)."""
+import glob
+import json
+import logging
+import os
+
+import pytest
+
+from cvrf2csaf.common.utils import get_config_from_file, get_pkg_version
+from cvrf2csaf.document_handler import convert_and_store
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+INPUT_FILES = sorted(glob.glob(os.path.join(ROOT_DIR, 'examples', '1.2', '*.xml')))
+
+# the examples can't be validated offline against the schema, the CVSS schemata are remote
+config = {**get_config_from_file(), 'validate': 'mandatory', 'force': True}
+PKG_VERSION = get_pkg_version()
+
+
+# pylint: disable=missing-function-docstring
+def convert(tmp_path, input_file, streaming):
+    """ Returns tuple (CSAF document without the generator date, validity). """
+    output_dir = tmp_path / ('streamed' if streaming else 'whole')
+    _, output_file, valid, _ = convert_and_store(
+        {**config, 'streaming': streaming, 'output_dir': str(output_dir)}, PKG_VERSION,
+        input_file)
+    with open(output_file, encoding='utf-8') as f:
+        csaf = json.load(f)
+    csaf['document']['tracking']['generator'].pop('date')
+    return csaf, valid
+
+
+@pytest.mark.parametrize('input_file', INPUT_FILES, ids=os.path.basename)
+def test_same_as_whole_document(tmp_path, input_file):
+    assert convert(tmp_path, input_file, True) == convert(tmp_path, input_file, False)
+
+
+def test_document_tests_run_once(tmp_path, caplog):
+    """ The tests of the document are not repeated for each of its vulnerabilities. """
+    caplog.set_level(logging.INFO)
+    _, valid = convert(tmp_path, os.path.join(ROOT_DIR, 'examples', '1.2',
+                                              'cvrf_example_vulnerabilities.xml'), True)
+
+    assert not valid
+    assert caplog.messages.count('Mandatory test is_valid_category failed.') == 1
+    assert 'Mandatory tests of the vulnerabilities are skipped when streaming, only their' \
+           ' product and group references are checked by the conversion.' in caplog.messages
+
+
+def test_undefined_product_in_vulnerability(tmp_path):
+    with open(os.path.join(ROOT_DIR, 'examples', '1.2', 'cvrf_example_e.xml'),
+              encoding='utf-8') as f:
+        document = f.read()
+    input_file = tmp_path / 'undefined_product.xml'
+    input_file.write_text(document.replace('<ProductID>AC-FOO-2.1-on-bar</ProductID>',
+                                           '<ProductID>UNDEFINED</ProductID>'), encoding='utf-8')
+
+    _, valid = convert(tmp_path, str(input_file), True)
+
+    assert not valid
@@ -0,0 +1,128 @@
+"""File containing stress test of concurrent conversions in threads."""
+import glob
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from lxml import etree
+
+from cvrf2csaf.common.common import SectionHandler, current_context
+from cvrf2csaf.common.schemas import CompiledXMLSchema, get_cvrf_schema
+from cvrf2csaf.common.utils import get_config_from_file
+from cvrf2csaf.document_handler import DocumentHandler
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+INPUT_FILES = sorted(glob.glob(os.path.join(ROOT_DIR, 'examples', '1.2', '*.xml'))) + [
+    os.path.join(ROOT_DIR, 'tests', 'test_cvrf_full', 'test_cvrf_full.xml')]
+
+ROUNDS = 8
+THREADS = 8
+
+config = get_config_from_file()
+
+
+# pylint: disable=missing-function-docstring,c-extension-no-member
+def convert(handler, input_file):
+    csaf = handler.convert_file(input_file)
+    # generator date is the time of the conversion
+    csaf['document']['tracking']['generator'].pop('date')
+    return csaf, handler.context.errors, handler.context.warnings
+
+
+def convert_serially():
+    return [convert(DocumentHandler(config, '0.0.0'), input_file) for input_file in INPUT_FILES]
+
+
+def test_reused_handler():
+    """ One DocumentHandler converting all the documents gives the same results as fresh ones. """
+    expected = convert_serially()
+
+    handler = DocumentHandler(config, '0.0.0')
+    for _ in range(2):
+        assert [convert(handler, input_file) for input_file in INPUT_FILES] == expected
+
+
+def test_concurrent_conversions():
+    """ Documents converted concurrently in threads don't see each other's state. """
+    expected = convert_serially()
+    assert any(errors for _, errors, _ in expected)
+    assert any(not errors for _, errors, _ in expected)
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(lambda input_file: convert(DocumentHandler(config, '0.0.0'),
+                                                                input_file),
+                                    INPUT_FILES * ROUNDS))
+
+    assert results == expected * ROUNDS
+
+
+def test_concurrent_schema_validation():
+    """ Each thread validates with its own schema, the errors of the documents are kept apart. """
+    schema = get_cvrf_schema()
+    documents = [etree.parse(input_file) for input_file in INPUT_FILES]
+
+    def validate(document):
+        # pylint: disable=protected-access
+        errors = [error.message for error in schema.validate(document)]
+        return errors, id(getattr(schema._local, 'schema', None))
+
+    expected = [errors for errors, _ in map(validate, documents)]
+    assert any(errors for errors in expected)
+    assert any(not errors for errors in expected)
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(validate, documents * ROUNDS))
+
+    assert [errors for errors, _ in results] == expected * ROUNDS
+    assert len({schema_id for _, schema_id in results}) > 1
+
+
+XSD = b'''<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">
+  <xs:element name="score" type="xs:decimal"/>
+</xs:schema>'''
+
+
+def counted_schema(fail_after=None):
+    """ Returns tuple (CompiledXMLSchema, list of the threads compiling it, in order). """
+    compiled = []
+
+    def compile_schema():
+        compiled.append(threading.get_ident())
+        if fail_after is not None and len(compiled) > fail_after:
+            raise etree.XMLSchemaParseError('QName value does not resolve')
+        return etree.XMLSchema(etree.XML(XSD))
+
+    return CompiledXMLSchema(compile_schema), compiled
+
+
+def errors_found(schema):
+    return [bool(schema.validate(etree.XML(xml))) for xml in (b'<score>7.5</score>',
+                                                             b'<score>high</score>')]
+
+
+def test_schema_compiled_once_per_thread():
+    """ The thread creating the schema validates with the shared one, other ones compile. """
+    schema, compiled = counted_schema()
+    assert errors_found(schema) == [False, True]
+    assert compiled == [threading.get_ident()]
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(errors_found, schema).result() == [False, True]
+    assert len(compiled) == 2 and compiled[1] != threading.get_ident()
+
+
+def test_failed_compilation_not_retried():
+    """ A thread whose compilation failed keeps validating with the shared schema. """
+    schema, compiled = counted_schema(fail_after=1)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(errors_found, schema).result() == [False, True]
+        assert executor.submit(errors_found, schema).result() == [False, True]
+    assert len(compiled) == 2
+
+
+def test_no_context_outside_conversion():
+    """ Errors reported outside any conversion are not recorded in a lasting context. """
+    SectionHandler.report_error('Reported outside of a conversion.')
+    assert current_context() is not current_context()
+    assert not current_context().errors
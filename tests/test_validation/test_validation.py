@@ -0,0 +1,103 @@
+"""File containing tests of the validation levels (--validate)."""
+import logging
+import os
+
+import pytest
+
+from cvrf2csaf import batch, document_handler, server
+from cvrf2csaf.common.utils import CriticalExit, get_config_from_file
+from cvrf2csaf.document_handler import VALIDATION_LEVELS, DocumentHandler, convert_and_store, \
+    convert_and_validate
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+INPUT_FILE = os.path.join(ROOT_DIR, 'examples', '1.2', 'cvrf_example_e.xml')
+
+config = get_config_from_file()
+
+
+# pylint: disable=missing-function-docstring
+def replace_checks(monkeypatch, failing=()):
+    """ Replaces the checks by ones passing unless failing, returns list of the performed ones. """
+    performed = []
+
+    def check(name):
+        def replaced(*_args, **_kwargs):
+            performed.append(name)
+            return name not in failing
+        return replaced
+
+    monkeypatch.setattr(DocumentHandler, '_validate_input_against_schema',
+                        classmethod(check('input')))
+    monkeypatch.setattr(DocumentHandler, 'validate_output_against_schema', check('output'))
+    monkeypatch.setattr(DocumentHandler, 'validate_mandatory_tests', check('mandatory_tests'))
+    return performed
+
+
+@pytest.mark.parametrize('level', VALIDATION_LEVELS)
+def test_checks_of_level(monkeypatch, level):
+    performed = replace_checks(monkeypatch)
+
+    _, valid = convert_and_validate({**config, 'validate': level}, '0.0.0', INPUT_FILE)
+
+    assert valid
+    assert performed == list(VALIDATION_LEVELS[level])
+
+
+@pytest.mark.parametrize('level', VALIDATION_LEVELS)
+def test_skipped_checks_passed(monkeypatch, level):
+    replace_checks(monkeypatch, failing=('output', 'mandatory_tests'))
+
+    _, valid = convert_and_validate({**config, 'validate': level, 'force': True}, '0.0.0',
+                                    INPUT_FILE)
+
+    # only the performed checks fail
+    assert valid == (not {'output', 'mandatory_tests'} & set(VALIDATION_LEVELS[level]))
+
+
+@pytest.mark.parametrize('level', VALIDATION_LEVELS)
+def test_invalid_input_rejected_if_checked(monkeypatch, level):
+    replace_checks(monkeypatch, failing=('input',))
+    level_config = {**config, 'validate': level, 'force': True}
+
+    if 'input' in VALIDATION_LEVELS[level]:
+        with pytest.raises(CriticalExit):
+            convert_and_validate(level_config, '0.0.0', INPUT_FILE)
+    else:
+        assert convert_and_validate(level_config, '0.0.0', INPUT_FILE)[1]
+
+
+def test_conversion_errors_need_force(tmp_path):
+    # the current version is missing in the revision history
+    input_file = os.path.join(ROOT_DIR, 'examples', '1.2', 'cvrf_example_d.xml')
+    level_config = {**config, 'validate': 'none', 'output_dir': str(tmp_path)}
+
+    with pytest.raises(CriticalExit):
+        convert_and_store(level_config, '0.0.0', input_file)
+    assert not os.listdir(tmp_path)
+
+    _, output_file, valid, _ = convert_and_store({**level_config, 'force': True}, '0.0.0',
+                                                 input_file)
+    assert not valid
+    assert os.path.basename(output_file) == 'id0_invalid.json'
+
+
+def init_server_worker(worker_config, pkg_version):
+    # pylint: disable=protected-access
+    server._init_worker(worker_config, pkg_version)
+    logging.getLogger().removeHandler(server._worker_log)
+
+
+@pytest.mark.parametrize('init_worker', [batch.init_worker, init_server_worker],
+                         ids=['batch', 'server'])
+@pytest.mark.parametrize('level', VALIDATION_LEVELS)
+def test_workers_warm_up_checks_of_level(monkeypatch, init_worker, level):
+    """ The workers don't compile the schemata and load the tests the level skips. """
+    loaded = []
+    for name, check in (('get_cvrf_schema', 'input'), ('get_csaf_validator', 'output'),
+                        ('get_mandatory_tests', 'mandatory_tests')):
+        monkeypatch.setattr(document_handler, name,
+                            lambda *_args, check=check: loaded.append(check))
+
+    init_worker({**config, 'validate': level}, '0.0.0')
+
+    assert loaded == list(VALIDATION_LEVELS[level])
@@ -0,0 +1,59 @@
+"""File containing tests of the vulnerabilities converted in processes (--vulnerability-jobs)."""
+import os
+
+import pytest
+
+from cvrf2csaf.common.utils import get_config_from_file
+from cvrf2csaf.document_handler import MIN_PARALLEL_VULNERABILITIES, DocumentHandler
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+INPUT_FILE = os.path.join(ROOT_DIR, 'examples', '1.1', 'mitre-allitems-cvrf-year-2018.xml')
+
+# the example is not a valid CVRF 1.2 document
+config = {**get_config_from_file(), 'validate': 'none'}
+
+
+# pylint: disable=missing-function-docstring
+def convert(input_file, vulnerability_jobs, compact=False):
+    """ Returns tuple (CSAF document without the generator date, errors, warnings). """
+    handler = DocumentHandler({**config, 'vulnerability_jobs': vulnerability_jobs,
+                               'compact_parser': compact}, '0.0.0')
+    csaf = handler.convert_file(input_file)
+    csaf['document']['tracking']['generator'].pop('date')
+    return csaf, handler.context.errors, handler.context.warnings
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_same_as_serial(compact):
+    serial = convert(INPUT_FILE, 1, compact)
+    assert len(serial[0]['vulnerabilities']) >= MIN_PARALLEL_VULNERABILITIES
+
+    assert convert(INPUT_FILE, 3, compact) == serial
+
+
+def cwe_elements(count):
+    return ''.join(f'<CWE ID="CWE-{number}">Weakness {number}</CWE>' for number in range(count))
+
+
+REMEDIATION = '<Remediations><Remediation Type="Vendor Fix"><Description>Fix</Description>' \
+              '</Remediation></Remediations>'
+
+
+def test_errors_and_warnings_of_workers(tmp_path):
+    """ Errors and warnings of the workers come back in the order of the vulnerabilities. """
+    with open(INPUT_FILE, encoding='utf-8') as f:
+        document = f.read()
+    # vulnerabilities in different chunks, in reverse order of the numbers of CWE elements
+    for cve, count in (('CVE-2018-0001', 4), ('CVE-2018-2000', 3), ('CVE-2018-5000', 2)):
+        document = document.replace(f'<CVE>{cve}</CVE>',
+                                    f'<CVE>{cve}</CVE>{cwe_elements(count)}{REMEDIATION}')
+    input_file = tmp_path / 'errors.xml'
+    input_file.write_text(document, encoding='utf-8')
+
+    serial = convert(str(input_file), 1)
+    _, errors, warnings = serial
+    assert errors.count('No product_ids or group_ids entries for remediation.') == 3
+    assert warnings == [f'{count} CWE elements found, using only the first one.'
+                        for count in (4, 3, 2)]
+
+    assert convert(str(input_file), 3) == serial